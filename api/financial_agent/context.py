@@ -0,0 +1,272 @@
+import logging
+
+from models.conversations import get_conversation_store
+from models.financial_goals import Conversation
+from config.settings import (
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_MAX_TURNS,
+    CONTEXT_SUMMARY_ENABLED,
+    CONTEXT_SUMMARY_MAX_TOKENS
+)
+from utils.llm_client import get_llm_client
+from utils.metrics import LLMCall
+from utils.resilience import get_llm_policy
+from utils.prompt_templates import CONVERSATION_SUMMARY_PROMPT, SUMMARY_UPDATE_PROMPT
+from .post_processing import register_handler, submit_task
+
+logger = logging.getLogger(__name__)
+
+# Aproximación de caracteres por token para texto en español
+CHARS_PER_TOKEN = 4
+# Tokens que añade el formato de cada mensaje (rol, separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class ConversationContext:
+    """
+    Keeps the prompt sent to the LLM within a token budget
+
+    The prompt is built from the system prompt, a running summary of the
+    older part of the conversation and the most recent turns verbatim.
+    The summary is stored on the Conversation document ("summary" and
+    "summarized_count", the number of leading messages it covers) and is
+    updated incrementally: only messages that leave the window are folded
+    into it.
+    """
+
+    @staticmethod
+    def estimate_tokens(text):
+        """
+        Estimate the number of tokens of a text
+
+        Args:
+            text (str): Text
+
+        Returns:
+            int: Estimated tokens
+        """
+        return len(text or '') // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+    @staticmethod
+    def select_messages(conversation, system_prompt, user_message):
+        """
+        Select the history that fits in the prompt budget
+
+        Args:
+            conversation (dict): Conversation document
+            system_prompt (str): Rendered system prompt
+            user_message (str): Current user message
+
+        Returns:
+            list: Messages in OpenAI chat format, without the system prompt
+                and the current user message
+        """
+        summary = conversation.get('summary')
+        summarized_count = conversation.get('summarized_count') or 0
+        messages = conversation.get('messages', [])
+        # messages puede ser solo la ventana final de la conversación
+        offset = ConversationContext.message_count(conversation) - len(messages)
+        history = [
+            message for message in messages[max(0, summarized_count - offset):]
+            if 'role' in message and 'content' in message
+        ]
+
+        selected = []
+        budget = (
+            CONTEXT_MAX_TOKENS
+            - ConversationContext.estimate_tokens(system_prompt)
+            - ConversationContext.estimate_tokens(user_message)
+        )
+
+        if summary:
+            summary_message = {
+                "role": "system",
+                "content": CONVERSATION_SUMMARY_PROMPT.format(summary=summary)
+            }
+            budget -= ConversationContext.estimate_tokens(summary_message['content'])
+        else:
+            summary_message = None
+
+        # Recorrer desde el mensaje más reciente hasta agotar turnos o presupuesto
+        for message in reversed(history[-ConversationContext.history_window():]):
+            tokens = ConversationContext.estimate_tokens(message['content'])
+            if tokens > budget:
+                break
+            budget -= tokens
+            selected.append({"role": message['role'], "content": message['content']})
+
+        selected.reverse()
+        if summary_message:
+            selected.insert(0, summary_message)
+
+        return selected
+
+    @staticmethod
+    def history_window():
+        """
+        Number of trailing messages the prompt can use
+
+        Conversations are loaded with only this window of messages; older
+        ones are covered by the summary.
+
+        Returns:
+            int: Messages to load
+        """
+        return CONTEXT_MAX_TURNS * 2
+
+    @staticmethod
+    def message_count(conversation):
+        """
+        Total messages stored in a conversation
+
+        Args:
+            conversation (dict): Conversation document, possibly loaded with
+                only the trailing window of messages and a message_count
+
+        Returns:
+            int: Number of messages
+        """
+        if 'message_count' in conversation:
+            return conversation['message_count']
+        return len(conversation.get('messages', []))
+
+    @staticmethod
+    def needs_fold(message_count, summarized_count):
+        """
+        Check whether the unsummarized history has outgrown the window
+
+        Args:
+            message_count (int): Total messages stored in the conversation
+            summarized_count (int): Messages already covered by the summary
+
+        Returns:
+            bool: True if older messages should be folded into the summary
+        """
+        return CONTEXT_SUMMARY_ENABLED and message_count - summarized_count > ConversationContext.history_window()
+
+    @staticmethod
+    def fold_history(session_id, user_id):
+        """
+        Fold the oldest unsummarized messages into the running summary
+
+        Only half of the window is kept verbatim after folding, so the
+        summary is refreshed once every CONTEXT_MAX_TURNS / 2 turns rather
+        than on every turn.
+
+        Args:
+            session_id (str): Session ID
+            user_id (str): User ID
+
+        Returns:
+            bool: True if the summary was updated
+        """
+        try:
+            store = get_conversation_store()
+            conversation = store.load_header(session_id, user_id)
+            if not conversation:
+                return False
+
+            message_count = conversation['message_count']
+            summarized_count = conversation.get('summarized_count') or 0
+            if not ConversationContext.needs_fold(message_count, summarized_count):
+                return False
+
+            keep = max(2, (CONTEXT_MAX_TURNS // 2) * 2)
+            new_count = message_count - keep
+            to_fold = store.load_messages(session_id, user_id, summarized_count, new_count)
+
+            summary = ConversationContext._summarize(conversation.get('summary'), to_fold)
+
+            # Solo actualizar si nadie más lo hizo mientras tanto
+            # (las conversaciones antiguas no tienen summarized_count)
+            count_filter = {"$in": [0, None]} if summarized_count == 0 else summarized_count
+            result = Conversation.update_one(
+                {"session_id": session_id, "user_id": user_id, "summarized_count": count_filter},
+                {"$set": {"summary": summary, "summarized_count": new_count}}
+            )
+            if result.modified_count == 0:
+                return False
+
+            logger.info(f"Resumen de la sesión {session_id} actualizado hasta el mensaje {new_count}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error updating conversation summary: {str(e)}")
+            return False
+
+    @staticmethod
+    def _summarize(previous_summary, messages):
+        """
+        Ask the LLM to merge new messages into the previous summary
+
+        Args:
+            previous_summary (str): Current summary (may be empty)
+            messages (list): Messages to incorporate
+
+        Returns:
+            str: Updated summary
+        """
+        transcript = "\n".join(
+            f"{message.get('role')}: {message.get('content')}" for message in messages
+        )
+        prompt = SUMMARY_UPDATE_PROMPT.format(
+            summary=previous_summary or "(sin resumen previo)",
+            messages=transcript
+        )
+
+        route = ConversationContext._summary_route()
+        client = get_llm_client()
+        with LLMCall(route.model, "sync", route) as call:
+            # Same deadline, retries and circuit breaker as chat turns; no
+            # hedging, nobody is waiting for the summary
+            response = get_llm_policy().call(
+                lambda timeout: client.with_options(timeout=timeout, max_retries=0).chat.completions.create(
+                    model=route.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=route.temperature,
+                    max_tokens=route.max_tokens
+                ),
+                hedge=False,
+                latency_key=f"{route.name}:completion"
+            )
+            call.record_usage(response.usage)
+        return response.choices[0].message.content.strip()
+
+    @staticmethod
+    def _summary_route():
+        """
+        Model and prices used for summaries (the strong route's model)
+
+        Returns:
+            Route: Route labelled "summary" in the metrics
+        """
+        # Import local: routing importa este módulo
+        from .routing import STRONG_ROUTE, Route, get_route
+
+        strong = get_route(STRONG_ROUTE)
+        return Route(
+            "summary",
+            strong.model,
+            CONTEXT_SUMMARY_MAX_TOKENS,
+            0.2,
+            strong.input_cost,
+            strong.output_cost
+        )
+
+
+def schedule_fold(session_id, user_id):
+    """
+    Fold older messages into the summary without blocking the response
+
+    Args:
+        session_id (str): Session ID
+        user_id (str): User ID
+    """
+    # Slow LLM call: chat turns must not wait for it
+    submit_task("fold_history", {"session_id": session_id, "user_id": user_id}, user_id, barrier=False)
+
+
+register_handler(
+    "fold_history",
+    lambda payload: ConversationContext.fold_history(payload['session_id'], payload['user_id'])
+)
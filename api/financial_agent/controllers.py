@@ -1,6 +1,6 @@
 import traceback
 
-from flask import jsonify, request
+from flask import Response, jsonify, request, stream_with_context
 from flask.views import MethodView
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from flask_smorest import abort
@@ -10,6 +10,8 @@ from .routes import financial_agent_bp
 from .services import FinancialAgentService
 from .schemas import (
     ChatMessageSchema, 
+    ChatBatchRequestSchema,
+    ChatBatchResponseSchema,
     ChatResponseSchema, 
     ChatErrorResponseSchema,
     GoalSchema,
@@ -20,6 +22,9 @@ from .schemas import (
     ConversationHistoryResponseSchema,
     ConversationHistoryErrorResponseSchema
 )
+from utils.sse import sse_stream
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
 
 
 @financial_agent_bp.route("/chat")
@@ -29,13 +34,29 @@ class ChatController(MethodView):
     @financial_agent_bp.response(500, ChatErrorResponseSchema)
     @jwt_required()
     def post(self, request_body):
-        """Process a chat message with the financial agent"""
+        """Process a chat message with the financial agent
+        
+        Send an Idempotency-Key header to make retries safe: a repeated key
+        returns the stored response without calling the model again.
+        """
         try:
             user_id = get_jwt_identity()
-            data, status_code = FinancialAgentService.process_message(request_body, user_id)# En el controlador, antes de jsonify
+            idempotency_key = request.headers.get('Idempotency-Key')
+            replayed = False
+            if idempotency_key:
+                if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                    raise ValueError("Idempotency-Key is too long")
+                data, status_code, replayed = FinancialAgentService.process_message_idempotent(
+                    request_body, user_id, idempotency_key
+                )
+            else:
+                data, status_code = FinancialAgentService.process_message(request_body, user_id)# En el controlador, antes de jsonify
             if 'goal' in data and '_id' in data['goal']:
                 del data['goal']['_id']
-            return jsonify(data), status_code
+            response = jsonify(data)
+            if replayed:
+                response.headers['Idempotent-Replayed'] = 'true'
+            return response, status_code
         except ValueError as e:
             print(traceback.format_exc(), flush=True)
             raise BadRequest(description=f"Error: {str(e)}")
@@ -44,10 +65,60 @@ class ChatController(MethodView):
             return abort(500, message="An unexpected error occurred.", details=str(e))
 
 
+@financial_agent_bp.route("/chat/stream")
+class ChatStreamController(MethodView):
+    @financial_agent_bp.arguments(ChatMessageSchema)
+    @financial_agent_bp.response(
+        200,
+        content_type="text/event-stream",
+        description="Server-Sent Events: 'token' events with partial content, then a final 'done' event with the chat response (or 'error')"
+    )
+    @jwt_required()
+    def post(self, request_body):
+        """Process a chat message streaming the financial agent response"""
+        try:
+            user_id = get_jwt_identity()
+            events = FinancialAgentService.stream_message(request_body, user_id)
+            return Response(
+                stream_with_context(sse_stream(events)),
+                mimetype="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    # Evitar que proxies (nginx) acumulen la respuesta
+                    "X-Accel-Buffering": "no"
+                }
+            )
+        except Exception as e:
+            print(traceback.format_exc(), flush=True)
+            return abort(500, message="An unexpected error occurred.", details=str(e))
+
+
+@financial_agent_bp.route("/chat/batch")
+class ChatBatchController(MethodView):
+    @financial_agent_bp.arguments(ChatBatchRequestSchema)
+    @financial_agent_bp.response(200, ChatBatchResponseSchema)
+    @financial_agent_bp.response(500, ChatErrorResponseSchema)
+    @jwt_required()
+    def post(self, request_body):
+        """Process several chat messages in one request
+        
+        Distinct sessions are processed concurrently and messages of the
+        same session in order. Each item carries its own status_code.
+        """
+        try:
+            user_id = get_jwt_identity()
+            data, status_code = FinancialAgentService.process_batch(request_body['items'], user_id)
+            return jsonify(data), status_code
+        except Exception as e:
+            print(traceback.format_exc(), flush=True)
+            return abort(500, message="An unexpected error occurred.", details=str(e))
+
+
 @financial_agent_bp.route("/goals")
 class FinancialGoalsController(MethodView):
     @financial_agent_bp.arguments(GoalListQueryParamsSchema, location="query")
     @financial_agent_bp.response(200, GoalListResponseSchema)
+    @financial_agent_bp.response(400, GoalListErrorResponseSchema)
     @financial_agent_bp.response(404, GoalListErrorResponseSchema)
     @financial_agent_bp.response(500, GoalListErrorResponseSchema)
     @jwt_required()
@@ -57,7 +128,15 @@ class FinancialGoalsController(MethodView):
             user_id = get_jwt_identity()
             page = args.get('page', 1)
             per_page = args.get('rows', 10)
-            data, status_code = FinancialAgentService.get_financial_goals(user_id, page, per_page)
+            data, status_code = FinancialAgentService.get_financial_goals(
+                user_id,
+                page,
+                per_page,
+                filters={key: args.get(key) for key in ('category', 'status', 'search')},
+                use_cursor=args.get('paginate') == 'cursor' or 'cursor' in args,
+                cursor=args.get('cursor'),
+                include_total=args.get('include_total')
+            )
             return jsonify(data), status_code
         except Exception as e:
             print(traceback.format_exc(), flush=True)
@@ -0,0 +1,119 @@
+import logging
+import threading
+
+from config.settings import (
+    POST_PROCESSING_MODE,
+    POST_PROCESSING_WORKERS,
+    POST_PROCESSING_MAX_ATTEMPTS,
+    POST_PROCESSING_RETRY_DELAY,
+    POST_PROCESSING_WAIT_TIMEOUT,
+    OUTBOX_LEASE,
+    OUTBOX_RETRY_AFTER,
+    OUTBOX_SWEEP_INTERVAL,
+    OUTBOX_MAX_DELIVERIES
+)
+from models import outbox
+from utils.task_queue import OutboxQueue, TaskQueue
+
+logger = logging.getLogger(__name__)
+
+# Tipos de cola según POST_PROCESSING_MODE
+POST_PROCESSING_QUEUES = {
+    "memory": lambda handlers: TaskQueue(
+        handlers=handlers,
+        workers=POST_PROCESSING_WORKERS,
+        max_attempts=POST_PROCESSING_MAX_ATTEMPTS,
+        retry_delay=POST_PROCESSING_RETRY_DELAY,
+        name="post-processing"
+    ),
+    "outbox": lambda handlers: OutboxQueue(
+        outbox,
+        handlers=handlers,
+        lease=OUTBOX_LEASE,
+        retry_after=OUTBOX_RETRY_AFTER,
+        sweep_interval=OUTBOX_SWEEP_INTERVAL,
+        max_deliveries=OUTBOX_MAX_DELIVERIES,
+        workers=POST_PROCESSING_WORKERS,
+        max_attempts=POST_PROCESSING_MAX_ATTEMPTS,
+        retry_delay=POST_PROCESSING_RETRY_DELAY,
+        name="post-processing"
+    )
+}
+
+_handlers = {}
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def register_handler(kind, handler):
+    """
+    Registra el handler de un tipo de tarea de post-procesamiento
+
+    Args:
+        kind (str): Tipo de tarea
+        handler (callable): handler(payload); debe ser idempotente, ya que
+            una tarea puede ejecutarse más de una vez
+    """
+    _handlers[kind] = handler
+    if _queue is not None:
+        _queue.register(kind, handler)
+
+
+def get_post_processing_queue():
+    """
+    Obtiene la cola de post-procesamiento configurada con POST_PROCESSING_MODE
+
+    Returns:
+        Cola de tareas del proceso
+    """
+    global _queue
+
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                if POST_PROCESSING_MODE not in POST_PROCESSING_QUEUES:
+                    raise ValueError(f"Modo de post-procesamiento desconocido: {POST_PROCESSING_MODE}")
+                _queue = POST_PROCESSING_QUEUES[POST_PROCESSING_MODE](_handlers)
+    return _queue
+
+
+def submit_task(kind, payload, user_id, barrier=True):
+    """
+    Encola una tarea de un usuario
+
+    Las tareas de un mismo usuario se aplican en orden.
+
+    Args:
+        kind (str): Tipo de tarea registrado
+        payload (dict): Datos de la tarea
+        user_id (str): ID del usuario
+        barrier (bool): Si es False la tarea va en una clave aparte y
+            wait_for_user no la espera (p. ej. enriquecimientos lentos)
+    """
+    key = str(user_id) if barrier else f"{user_id}:background"
+    get_post_processing_queue().submit(kind, payload, key)
+
+
+def wait_for_user(user_id):
+    """
+    Espera a que se apliquen las escrituras pendientes de un usuario
+
+    Se llama antes de leer conversaciones o metas para que el usuario vea
+    siempre sus propios turnos anteriores.
+
+    Args:
+        user_id (str): ID del usuario
+    """
+    if not get_post_processing_queue().wait(str(user_id), POST_PROCESSING_WAIT_TIMEOUT):
+        logger.warning(f"Escrituras pendientes del usuario {user_id} tras {POST_PROCESSING_WAIT_TIMEOUT}s")
+
+
+def shutdown_post_processing(timeout=None):
+    """
+    Drena la cola antes de que termine el proceso
+
+    Args:
+        timeout (float): Segundos máximos de espera
+    """
+    if _queue is not None:
+        _queue.shutdown(timeout)
@@ -0,0 +1,155 @@
+import logging
+
+from config.settings import (
+    MODEL_ROUTING_ENABLED,
+    ROUTING_FAST_MODEL,
+    ROUTING_FAST_MAX_TOKENS,
+    ROUTING_FAST_TEMPERATURE,
+    ROUTING_FAST_INPUT_COST,
+    ROUTING_FAST_OUTPUT_COST,
+    ROUTING_STRONG_MODEL,
+    ROUTING_STRONG_MAX_TOKENS,
+    ROUTING_STRONG_TEMPERATURE,
+    ROUTING_STRONG_INPUT_COST,
+    ROUTING_STRONG_OUTPUT_COST,
+    ROUTING_STRONG_AFTER_TURNS,
+    ROUTING_CONFIRMATION_WORDS
+)
+from utils.llm_backends import get_llm_backend
+from .context import ConversationContext
+
+logger = logging.getLogger(__name__)
+
+FAST_ROUTE = "fast"
+STRONG_ROUTE = "strong"
+
+# Señales de que el asistente pidió confirmar la meta en el turno anterior
+_CONFIRMATION_REQUESTS = ("confirm", "correct", "¿te parece", "¿está bien", "¿esta bien")
+
+
+class Route:
+    """Modelo y parámetros de generación de un tipo de turno"""
+
+    def __init__(self, name, model, max_tokens, temperature, input_cost=0.0, output_cost=0.0):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        # USD por millón de tokens
+        self.input_cost = input_cost
+        self.output_cost = output_cost
+
+    def cost(self, usage):
+        """
+        Coste estimado de una llamada
+
+        Args:
+            usage: response.usage del SDK (puede ser None)
+
+        Returns:
+            float: Coste en USD
+        """
+        if usage is None:
+            return 0.0
+        return (
+            (usage.prompt_tokens or 0) * self.input_cost
+            + (usage.completion_tokens or 0) * self.output_cost
+        ) / 1_000_000
+
+    def __repr__(self):
+        return f"Route(name={self.name!r}, model={self.model!r}, max_tokens={self.max_tokens})"
+
+
+def get_route(name):
+    """
+    Obtiene una ruta por nombre
+
+    Los modelos no configurados usan el modelo del backend LLM.
+
+    Args:
+        name (str): FAST_ROUTE o STRONG_ROUTE
+
+    Returns:
+        Route: Ruta configurada
+    """
+    if name == FAST_ROUTE:
+        return Route(
+            FAST_ROUTE,
+            ROUTING_FAST_MODEL or get_llm_backend().model,
+            ROUTING_FAST_MAX_TOKENS,
+            ROUTING_FAST_TEMPERATURE,
+            ROUTING_FAST_INPUT_COST,
+            ROUTING_FAST_OUTPUT_COST
+        )
+    if name == STRONG_ROUTE:
+        return Route(
+            STRONG_ROUTE,
+            ROUTING_STRONG_MODEL or get_llm_backend().model,
+            ROUTING_STRONG_MAX_TOKENS,
+            ROUTING_STRONG_TEMPERATURE,
+            ROUTING_STRONG_INPUT_COST,
+            ROUTING_STRONG_OUTPUT_COST
+        )
+    raise ValueError(f"Ruta desconocida: {name}")
+
+
+def choose_route(user_message, conversation):
+    """
+    Elige la ruta de un turno
+
+    Los primeros turnos, en los que el asistente solo recopila información,
+    van al modelo rápido con un límite de tokens ajustado. Los turnos que
+    probablemente cierren la meta (el usuario confirma, el asistente pidió
+    confirmación o la conversación ya es larga) van al modelo fuerte.
+
+    Args:
+        user_message (str): Mensaje actual del usuario
+        conversation (dict): Documento de la conversación
+
+    Returns:
+        Route: Ruta elegida
+    """
+    if not MODEL_ROUTING_ENABLED:
+        return get_route(STRONG_ROUTE)
+
+    messages = conversation.get('messages', [])
+    text = (user_message or '').lower()
+    if any(word in text for word in ROUTING_CONFIRMATION_WORDS):
+        return get_route(STRONG_ROUTE)
+
+    # Cada turno guarda dos mensajes (usuario y asistente)
+    user_turns = ConversationContext.message_count(conversation) // 2 + 1
+    if user_turns >= ROUTING_STRONG_AFTER_TURNS:
+        return get_route(STRONG_ROUTE)
+
+    last_reply = next(
+        (message.get('content') or '' for message in reversed(messages) if message.get('role') == 'assistant'),
+        ''
+    ).lower()
+    if any(signal in last_reply for signal in _CONFIRMATION_REQUESTS):
+        return get_route(STRONG_ROUTE)
+
+    return get_route(FAST_ROUTE)
+
+
+def should_escalate(route, finish_reason, outcome):
+    """
+    Indica si una respuesta del modelo rápido debe repetirse con el fuerte
+
+    Se repite cuando la respuesta se cortó por el límite de tokens o cuando
+    el modelo intentó registrar la meta pero el JSON no es válido.
+
+    Args:
+        route (Route): Ruta usada
+        finish_reason (str): finish_reason de la respuesta
+        outcome (str): Resultado de la llamada (ver LLMCall)
+
+    Returns:
+        bool: True si hay que repetir el turno con STRONG_ROUTE
+    """
+    if route.name != FAST_ROUTE:
+        return False
+    if finish_reason == "length" or outcome == "parse_failure":
+        logger.info(f"Turno escalado al modelo fuerte (finish_reason={finish_reason}, outcome={outcome})")
+        return True
+    return False
@@ -1,6 +1,8 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 from datetime import datetime
 
+from config.settings import CHAT_BATCH_MAX_ITEMS
+
 
 class ChatMessageSchema(Schema):
     """Schema for chat message requests"""
@@ -36,6 +38,34 @@ class ChatErrorResponseSchema(Schema):
     details = fields.String(required=False, allow_none=True, description="Detailed error information")
 
 
+class ChatBatchRequestSchema(Schema):
+    """Schema for batch chat requests"""
+    items = fields.List(
+        fields.Nested(ChatMessageSchema),
+        required=True,
+        validate=validate.Length(min=1, max=CHAT_BATCH_MAX_ITEMS),
+        description="Messages to process; items with the same session_id are processed in order"
+    )
+
+
+class ChatBatchItemResponseSchema(Schema):
+    """Schema for the result of one batch item"""
+    index = fields.Integer(required=True, description="Position of the item in the request")
+    session_id = fields.String(required=True, description="Session identifier")
+    status_code = fields.Integer(required=True, description="Status the item would get from POST /chat")
+    success = fields.Boolean(required=True, description="Status of the item")
+    message = fields.String(required=True, description="AI assistant response or error message")
+    goal_complete = fields.Boolean(required=False, description="Whether the goal information is complete")
+    goal = fields.Nested(GoalSchema, required=False, allow_none=True, description="Financial goal data if complete")
+    goal_id = fields.String(required=False, allow_none=True, description="ID of the created goal if complete")
+
+
+class ChatBatchResponseSchema(Schema):
+    """Schema for batch chat responses"""
+    success = fields.Boolean(required=True, description="Whether every item succeeded", example=True)
+    results = fields.List(fields.Nested(ChatBatchItemResponseSchema), required=True, description="Per-item results in request order")
+
+
 class GoalListQueryParamsSchema(Schema):
     """Schema for goal list query parameters"""
     page = fields.Integer(required=False, description="Page number", default=1)
@@ -43,12 +73,21 @@ class GoalListQueryParamsSchema(Schema):
     category = fields.String(required=False, description="Filter by category")
     status = fields.String(required=False, description="Filter by status")
     search = fields.String(required=False, description="Search text in goal name or description")
+    paginate = fields.String(
+        required=False,
+        validate=validate.OneOf(["page", "cursor"]),
+        description="'page' (page/rows) or 'cursor' (newest first, continue with next_cursor)",
+        default="page"
+    )
+    cursor = fields.String(required=False, description="next_cursor of the previous page (implies paginate=cursor)")
+    include_total = fields.Boolean(required=False, description="Count all matching goals (default: true with pages, false with cursors)")
 
 
 class GoalListDataSchema(Schema):
     """Schema for paginated goal list data"""
-    total = fields.Integer(required=True, description="Total number of goals")
+    total = fields.Integer(required=False, allow_none=True, description="Total number of goals (null if not requested)")
     data = fields.List(fields.Nested(GoalSchema), required=True, description="List of goals")
+    next_cursor = fields.String(required=False, allow_none=True, description="Cursor of the next page (cursor mode; null on the last page)")
 
 
 class GoalListResponseSchema(Schema):
@@ -75,6 +114,8 @@ class ConversationHistorySchema(Schema):
     session_id = fields.String(required=True, description="Session identifier")
     user_id = fields.Integer(required=True, description="User identifier")
     messages = fields.List(fields.Nested(MessageSchema), required=True, description="Message history")
+    summary = fields.String(required=False, allow_none=True, description="Running summary of the older messages")
+    summarized_count = fields.Integer(required=False, description="Number of leading messages covered by the summary")
     created_at = fields.DateTime(required=True, description="When conversation started")
     updated_at = fields.DateTime(required=True, description="When conversation was last updated")
 
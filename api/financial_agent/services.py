@@ -1,15 +1,70 @@
+import asyncio
+import hashlib
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from bson.objectid import ObjectId
-from openai import OpenAI
 
-from models.financial_goals import FinancialGoal, Conversation
-from config.settings import DEEPSEEK_API_KEY, DEEPSEEK_MODEL
-from utils.prompt_templates import SYSTEM_PROMPT
+from models.conversations import get_conversation_store
+from models.financial_goals import FinancialGoal
+from models.idempotency import (
+    COMPLETED,
+    IN_PROGRESS,
+    begin_request,
+    complete_request,
+    get_request,
+    release_request
+)
+from config.settings import (
+    AGENT_GOAL_MODE,
+    CHAT_BATCH_MAX_WORKERS,
+    IDEMPOTENCY_WAIT_TIMEOUT,
+    IDEMPOTENCY_POLL_INTERVAL
+)
+from .context import ConversationContext, schedule_fold
+from .post_processing import register_handler, submit_task, wait_for_user
+from .routing import STRONG_ROUTE, choose_route, get_route, should_escalate
+from .session_lock import SessionBusyError, async_session_turn, session_turn
+from .tools import (
+    GOAL_TOOL,
+    accumulate_tool_call_deltas,
+    find_goal_arguments,
+    find_streamed_goal_arguments,
+    parse_goal_arguments
+)
+from utils.async_db import run_db
+from utils.concurrency import AsyncSingleFlight, SingleFlight
+from utils.goal_extractor import GOAL_MARKER, GoalStreamExtractor
+from utils.llm_client import get_async_llm_client, get_llm_client
+from utils.metrics import LLMCall
+from utils.pagination import decode_cursor, encode_cursor, keyset_filter
+from utils.resilience import CircuitOpenError, get_llm_policy
+from utils.response_cache import get_cached_response, store_response
+from utils.goal_cache import build_list_key, cached_goal_read, invalidate_user_goals
+from utils.prompt_templates import (
+    GOAL_COMPLETION_PROMPT,
+    GOAL_INVALID_PROMPT,
+    render_date_context,
+    render_system_prompt
+)
 
 logger = logging.getLogger(__name__)
 
+# Order of GET /goals, newest first (served by the (user_id, _id) indexes).
+# fecha_creacion may come from the model, so the ObjectId's creation time is
+# the reliable key
+GOALS_SORT = [("_id", -1)]
+
+# Responses that are not stored for an Idempotency-Key because a retry may
+# succeed (session busy, rate limited...); server errors are never stored
+IDEMPOTENCY_RETRYABLE_STATUS = {408, 409, 423, 425, 429}
+
+# Coalesce identical chat turns that are in flight at the same time
+_single_flight = SingleFlight()
+_async_single_flight = AsyncSingleFlight()
+
 class FinancialAgentService:
     @staticmethod
     def process_message(request_data, user_id):
@@ -27,101 +82,601 @@ class FinancialAgentService:
             user_message = request_data.get('message')
             session_id = request_data.get('session_id')
             
+            # Identical messages in flight for the same session share one LLM call
+            return _single_flight.do(
+                (user_id, session_id, user_message),
+                lambda: FinancialAgentService._process_turn(session_id, user_id, user_message)
+            )
+            
+        except SessionBusyError as e:
+            return {"success": False, "message": str(e)}, 409
+        except CircuitOpenError as e:
+            return {"success": False, "message": str(e)}, 503
+        except Exception as e:
+            logger.error(f"Error processing message: {str(e)}")
+            return {"success": False, "message": str(e)}, 500
+    
+    @staticmethod
+    def _process_turn(session_id, user_id, user_message):
+        """
+        Run one chat turn while holding the session turn lock
+        
+        Args:
+            session_id (str): Session ID
+            user_id (str): User ID
+            user_message (str): User message
+            
+        Returns:
+            tuple: (response_data, status_code)
+        """
+        with session_turn(user_id, session_id):
+            # Previous turns may still be queued for writing
+            wait_for_user(user_id)
+            
             # Get conversation history
             conversation = FinancialAgentService._get_or_create_conversation(session_id, user_id)
             
             # Process message with Deepseek
             ai_response, is_goal_complete, financial_goal = FinancialAgentService._call_deepseek(
                 user_message, 
-                conversation.get('messages', [])
+                conversation
             )
             
-            # Save messages to conversation history
-            FinancialAgentService._save_conversation_messages(
-                session_id, 
-                user_id, 
-                user_message, 
-                ai_response
+            response_data = FinancialAgentService._complete_turn(
+                conversation,
+                user_message,
+                ai_response,
+                is_goal_complete,
+                financial_goal
             )
+        
+        return response_data, 200
+    
+    @staticmethod
+    def process_message_idempotent(request_data, user_id, idempotency_key):
+        """
+        Process a user message at most once per Idempotency-Key
+        
+        The first request with a key is processed and its response stored.
+        Retries get the stored response without calling the LLM; duplicates
+        that arrive while the first one is still running wait for it.
+        
+        Args:
+            request_data (dict): Request data containing message and session_id
+            user_id (str): User ID from JWT token
+            idempotency_key (str): Value of the Idempotency-Key header
             
-            # Prepare response
-            response_data = {
-                "success": True,
-                "message": ai_response,
-                "goal_complete": is_goal_complete
-            }
+        Returns:
+            tuple: (response_data, status_code, replayed)
+        """
+        request_hash = FinancialAgentService._request_hash(request_data)
+        started, record = begin_request(user_id, idempotency_key, request_hash)
+        
+        if started:
+            try:
+                data, status_code = FinancialAgentService.process_message(request_data, user_id)
+            except Exception:
+                release_request(user_id, idempotency_key)
+                raise
             
-            # If goal is complete, save it to database
-            if is_goal_complete and financial_goal:
-                # Add session_id and user_id to goal data
-                financial_goal['session_id'] = session_id
-                financial_goal['user_id'] = user_id
-                
-                # Save to database
-                goal_id = FinancialAgentService._save_financial_goal(financial_goal)
-                response_data["goal_id"] = str(goal_id)
-                response_data["goal"] = financial_goal
+            FinancialAgentService._finish_idempotent(user_id, idempotency_key, data, status_code)
+            return data, status_code, False
+        
+        if record and record.get('request_hash') != request_hash:
+            return FinancialAgentService._idempotency_key_reused()
+        
+        # Esperar a que termine la primera petición
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+        while record and record.get('status') == IN_PROGRESS and time.monotonic() < deadline:
+            time.sleep(IDEMPOTENCY_POLL_INTERVAL)
+            record = get_request(user_id, idempotency_key)
+        
+        if record is None:
+            # La primera petición falló y liberó la clave
+            return FinancialAgentService.process_message_idempotent(request_data, user_id, idempotency_key)
+        
+        return FinancialAgentService._idempotent_replay(record, idempotency_key)
+    
+    @staticmethod
+    async def process_message_idempotent_async(request_data, user_id, idempotency_key):
+        """
+        Async variant of process_message_idempotent used by the ASGI entry point
+        
+        Args:
+            request_data (dict): Request data containing message and session_id
+            user_id (str): User ID from JWT token
+            idempotency_key (str): Value of the Idempotency-Key header
+            
+        Returns:
+            tuple: (response_data, status_code, replayed)
+        """
+        request_hash = FinancialAgentService._request_hash(request_data)
+        started, record = await run_db(begin_request, user_id, idempotency_key, request_hash)
+        
+        if started:
+            try:
+                data, status_code = await FinancialAgentService.process_message_async(request_data, user_id)
+            except BaseException:
+                await run_db(release_request, user_id, idempotency_key)
+                raise
+            
+            await run_db(FinancialAgentService._finish_idempotent, user_id, idempotency_key, data, status_code)
+            return data, status_code, False
+        
+        if record and record.get('request_hash') != request_hash:
+            return FinancialAgentService._idempotency_key_reused()
+        
+        # Esperar a que termine la primera petición
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+        while record and record.get('status') == IN_PROGRESS and time.monotonic() < deadline:
+            await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+            record = await run_db(get_request, user_id, idempotency_key)
+        
+        if record is None:
+            # La primera petición falló y liberó la clave
+            return await FinancialAgentService.process_message_idempotent_async(
+                request_data, user_id, idempotency_key
+            )
+        
+        return FinancialAgentService._idempotent_replay(record, idempotency_key)
+    
+    @staticmethod
+    def _finish_idempotent(user_id, idempotency_key, data, status_code):
+        """
+        Store the response of a processed Idempotency-Key, or release the key
+        
+        Only final responses are stored: successes and client errors that a
+        retry would repeat. Server errors and temporary conflicts (e.g. 409
+        while the session is busy) release the key so the client can retry.
+        
+        Args:
+            user_id (str): User ID
+            idempotency_key (str): Value of the Idempotency-Key header
+            data (dict): Response body
+            status_code (int): Response status code
+        """
+        if status_code < 500 and status_code not in IDEMPOTENCY_RETRYABLE_STATUS:
+            complete_request(user_id, idempotency_key, data, status_code)
+        else:
+            # Permitir que el cliente reintente
+            release_request(user_id, idempotency_key)
+    
+    @staticmethod
+    def _idempotency_key_reused():
+        """Response for a key already used with another request body"""
+        return {
+            "success": False,
+            "message": "Idempotency-Key already used with a different request"
+        }, 422, False
+    
+    @staticmethod
+    def _idempotent_replay(record, idempotency_key):
+        """
+        Response for a duplicate once the wait for the first request is over
+        
+        Args:
+            record (dict): Idempotency record
+            idempotency_key (str): Value of the Idempotency-Key header
+            
+        Returns:
+            tuple: (response_data, status_code, replayed)
+        """
+        if record.get('status') == COMPLETED:
+            logger.info(f"Respuesta repetida para Idempotency-Key {idempotency_key}")
+            return record['response'], record['status_code'], True
+        
+        return {
+            "success": False,
+            "message": "A request with this Idempotency-Key is still being processed"
+        }, 409, False
+    
+    @staticmethod
+    def process_batch(items, user_id):
+        """
+        Process several chat messages of one user in a single request
+        
+        Items of different sessions run concurrently on a bounded pool;
+        items of the same session run one after another in request order,
+        so each turn sees the previous one. Every item gets the result
+        process_message would return for it.
+        
+        Args:
+            items (list): Dicts with message and session_id
+            user_id (str): User ID from JWT token
+            
+        Returns:
+            tuple: (response_data, status_code)
+        """
+        sessions = {}
+        for index, item in enumerate(items):
+            sessions.setdefault(item.get('session_id'), []).append((index, item))
+        
+        results = [None] * len(items)
+        
+        def run_session(session_items):
+            for index, item in session_items:
+                data, status_code = FinancialAgentService.process_message(item, user_id)
+                if 'goal' in data and '_id' in data['goal']:
+                    del data['goal']['_id']
+                results[index] = {
+                    "index": index,
+                    "session_id": item.get('session_id'),
+                    "status_code": status_code,
+                    **data
+                }
+        
+        workers = min(CHAT_BATCH_MAX_WORKERS, len(sessions))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-batch") as executor:
+            for future in [executor.submit(run_session, session_items) for session_items in sessions.values()]:
+                future.result()
+        
+        return {
+            "success": all(result["success"] for result in results),
+            "results": results
+        }, 200
+    
+    @staticmethod
+    async def process_message_async(request_data, user_id):
+        """
+        Async variant of process_message used by the ASGI entry point
+        
+        The LLM call is awaited on the shared async client, so a single
+        worker can keep many conversations in flight. MongoDB access runs
+        in the async DB thread pool.
+        
+        Args:
+            request_data (dict): Request data containing message and session_id
+            user_id (str): User ID from JWT token
+            
+        Returns:
+            tuple: (response_data, status_code)
+        """
+        try:
+            user_message = request_data.get('message')
+            session_id = request_data.get('session_id')
             
-            return response_data, 200
+            # Identical messages in flight for the same session share one LLM call
+            return await _async_single_flight.do(
+                (user_id, session_id, user_message),
+                lambda: FinancialAgentService._process_turn_async(session_id, user_id, user_message)
+            )
             
+        except SessionBusyError as e:
+            return {"success": False, "message": str(e)}, 409
+        except CircuitOpenError as e:
+            return {"success": False, "message": str(e)}, 503
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             return {"success": False, "message": str(e)}, 500
     
     @staticmethod
-    def get_financial_goals(user_id, page=1, per_page=10, filters=None):
+    async def _process_turn_async(session_id, user_id, user_message):
+        """
+        Async variant of _process_turn
+        
+        Args:
+            session_id (str): Session ID
+            user_id (str): User ID
+            user_message (str): User message
+            
+        Returns:
+            tuple: (response_data, status_code)
+        """
+        async with async_session_turn(user_id, session_id):
+            # Previous turns may still be queued for writing
+            await run_db(wait_for_user, user_id)
+            
+            # Get conversation history
+            conversation = await run_db(FinancialAgentService._get_or_create_conversation, session_id, user_id)
+            
+            # Process message with Deepseek
+            ai_response, is_goal_complete, financial_goal = await FinancialAgentService._call_deepseek_async(
+                user_message,
+                conversation
+            )
+            
+            response_data = await run_db(
+                FinancialAgentService._complete_turn,
+                conversation,
+                user_message,
+                ai_response,
+                is_goal_complete,
+                financial_goal
+            )
+        
+        return response_data, 200
+    
+    @staticmethod
+    def stream_message(request_data, user_id):
+        """
+        Process a user message streaming the AI response as it is generated
+        
+        The META_FINANCIERA_JSON block is never forwarded as tokens: it is
+        detected once the stream finishes. The conversation and goal writes
+        are then queued for post-processing, like in process_message; they
+        may not have landed when "done" is emitted, but later reads of the
+        same user wait for them (wait_for_user).
+        
+        Args:
+            request_data (dict): Request data containing message and session_id
+            user_id (str): User ID from JWT token
+            
+        Yields:
+            tuple: (event, data) with events "token", "done" or "error"
+        """
+        try:
+            user_message = request_data.get('message')
+            session_id = request_data.get('session_id')
+            
+            # Turns of the same session are processed one at a time
+            with session_turn(user_id, session_id):
+                # Previous turns may still be queued for writing
+                wait_for_user(user_id)
+                
+                # Get conversation history
+                conversation = FinancialAgentService._get_or_create_conversation(session_id, user_id)
+                
+                # Tokens already sent cannot be taken back, so a truncated
+                # or broken fast reply could not be escalated: streamed
+                # turns always use the strong route
+                route = get_route(STRONG_ROUTE)
+                formatted_messages = FinancialAgentService._build_messages(user_message, conversation)
+                params = FinancialAgentService._completion_params(formatted_messages, route)
+                
+                cached = get_cached_response(params)
+                if cached is not None:
+                    ai_response, is_goal_complete, financial_goal = cached
+                    yield "token", {"content": ai_response}
+                else:
+                    ai_response, is_goal_complete, financial_goal = yield from FinancialAgentService._stream_reply(
+                        params,
+                        route
+                    )
+                    store_response(params, (ai_response, is_goal_complete, financial_goal))
+                
+                response_data = FinancialAgentService._complete_turn(
+                    conversation,
+                    user_message,
+                    ai_response,
+                    is_goal_complete,
+                    financial_goal
+                )
+                if 'goal' in response_data and '_id' in response_data['goal']:
+                    del response_data['goal']['_id']
+                
+            yield "done", response_data
+            
+        except SessionBusyError as e:
+            yield "error", {"success": False, "message": str(e)}
+        except Exception as e:
+            logger.error(f"Error streaming message: {str(e)}")
+            yield "error", {"success": False, "message": str(e)}
+    
+    @staticmethod
+    def _stream_reply(params, route=None):
+        """
+        Stream a reply from Deepseek forwarding the visible tokens
+        
+        Args:
+            params (dict): Completion parameters (see _completion_params)
+            route (Route): Route the parameters were built for
+            
+        Yields:
+            tuple: ("token", data) events
+            
+        Returns:
+            tuple: (ai_response, is_goal_complete, financial_goal)
+        """
+        # Detecta el JSON de la meta mientras llega el stream para no enviarlo al cliente
+        extractor = GoalStreamExtractor()
+        tool_calls = {}
+        streamed = False
+        
+        with LLMCall(params['model'], "stream", route) as call:
+            for delta in FinancialAgentService._stream_deepseek(params, tool_calls, call):
+                visible = extractor.feed(delta)
+                if visible:
+                    streamed = True
+                    yield "token", {"content": visible}
+            
+            visible = extractor.finish()
+            if visible:
+                streamed = True
+                yield "token", {"content": visible}
+            
+            if AGENT_GOAL_MODE != 'tool':
+                result = FinancialAgentService._goal_result(extractor)
+                parse_failed = extractor.marker_found
+            else:
+                arguments = find_streamed_goal_arguments(tool_calls)
+                result = FinancialAgentService._tool_result(extractor.cleaned_text, arguments)
+                parse_failed = arguments is not None
+            call.outcome = "goal" if result[1] else "parse_failure" if parse_failed else "reply"
+        
+        if AGENT_GOAL_MODE == 'tool' and not streamed and result[0]:
+            # La respuesta se generó a partir de la llamada a función
+            yield "token", {"content": result[0]}
+        return result
+    
+    @staticmethod
+    def get_financial_goals(user_id, page=1, per_page=10, filters=None, use_cursor=False, cursor=None, include_total=None):
         """
         Get all financial goals for a user with pagination
         
+        With use_cursor the goals are returned newest first and each page
+        continues from the cursor of the previous one (next_cursor), so
+        deep pages cost the same as the first one.
+        
+        Pages are served from the per-user goal cache when it is enabled
+        (utils/goal_cache.py); saving a goal invalidates it.
+        
         Args:
             user_id (int): User ID 
-            page (int): Page number
+            page (int): Page number (page mode)
             per_page (int): Items per page
             filters (dict): Optional filters
+            use_cursor (bool): Use cursor (keyset) pagination instead of pages
+            cursor (str): next_cursor of the previous page (cursor mode)
+            include_total (bool): Count all matching goals; defaults to True
+                in page mode and False in cursor mode
             
         Returns:
             tuple: (response_data, status_code)
         """
         try:
-            # Build query
-            query = {"user_id": user_id}
-            
-            # Apply filters if provided
-            if filters:
-                if 'category' in filters and filters['category']:
-                    query['categoria'] = filters['category']
-                if 'status' in filters and filters['status']:
-                    query['estado'] = filters['status']
-                if 'search' in filters and filters['search']:
-                    search_text = filters['search']
-                    query['$or'] = [
-                        {"nombre": {"$regex": search_text, "$options": "i"}},
-                        {"descripcion": {"$regex": search_text, "$options": "i"}}
-                    ]
+            # Include goals registered by turns still being written
+            wait_for_user(user_id)
             
-            # Get total count
-            total = FinancialGoal.count_documents(query)
+            if include_total is None:
+                include_total = not use_cursor
             
-            # Get paginated data
-            skip = (page - 1) * per_page
-            goals = list(FinancialGoal.find(query).skip(skip).limit(per_page))
-            
-            # Convert ObjectId to string
-            for goal in goals:
-                goal['id'] = str(goal.pop('_id'))
+            params = {
+                "page": page,
+                "per_page": per_page,
+                "filters": filters,
+                "use_cursor": use_cursor,
+                "cursor": cursor,
+                "include_total": include_total
+            }
+            result = cached_goal_read(
+                "list", user_id, build_list_key(params),
+                lambda: FinancialAgentService._load_financial_goals(
+                    user_id, page, per_page, filters, use_cursor, cursor, include_total
+                )
+            )
             
             return {
                 "success": True,
-                "message": {
-                    "total": total,
-                    "data": goals
-                }
+                "message": result
             }, 200
             
+        except ValueError as e:
+            return {"success": False, "message": str(e)}, 400
         except Exception as e:
             logger.error(f"Error retrieving financial goals: {str(e)}")
             return {"success": False, "message": str(e)}, 500
     
+    @staticmethod
+    def _load_financial_goals(user_id, page, per_page, filters, use_cursor, cursor, include_total):
+        """
+        Query a page of goals from MongoDB (see get_financial_goals)
+        
+        Returns:
+            dict: total, data and, in cursor mode, next_cursor
+        """
+        query, sort, projection, ids_query = FinancialAgentService._goals_find(user_id, filters, use_cursor)
+        if ids_query is not None:
+            matching = [goal['_id'] for goal in FinancialGoal.find(ids_query, {"_id": 1})]
+            query = dict(query, _id={"$in": matching})
+        
+        result = {
+            # Get total count
+            "total": FinancialGoal.count_documents(query) if include_total else None
+        }
+        
+        if use_cursor:
+            page_query = query
+            if cursor:
+                page_query = dict(query, **keyset_filter(sort, decode_cursor(cursor, len(sort))))
+            
+            # One extra goal tells whether there is a next page
+            goals = list(FinancialGoal.find(page_query, projection).sort(sort).limit(per_page + 1))
+            has_more = len(goals) > per_page
+            goals = goals[:per_page]
+            result["next_cursor"] = (
+                encode_cursor([goals[-1].get(field) for field, _ in sort]) if has_more else None
+            )
+        else:
+            # Get paginated data
+            skip = (page - 1) * per_page
+            goals = list(FinancialGoal.find(query, projection).sort(sort).skip(skip).limit(per_page))
+        
+        # Convert ObjectId to string
+        for goal in goals:
+            goal['id'] = str(goal.pop('_id'))
+            goal.pop('score', None)
+        result["data"] = goals
+        
+        return result
+    
+    @staticmethod
+    def _goals_find(user_id, filters=None, use_cursor=False):
+        """
+        Build the find() of a GET /goals page
+        
+        The text index cannot return a search in _id order, so in cursor
+        mode a search would sort every match in memory. Instead the matching
+        _ids are resolved first with ids_query (no sort) and the page is read
+        in _id order from the listing indexes, restricted to those _ids.
+        
+        Args:
+            user_id (str): User ID
+            filters (dict): Optional category, status and search
+            use_cursor (bool): Cursor (keyset) pagination
+            
+        Returns:
+            tuple: (query, sort, projection, ids_query); when ids_query is
+                not None the caller adds {"_id": {"$in": <its _ids>}} to query
+        """
+        query = FinancialAgentService._goals_query(user_id, filters)
+        sort = FinancialAgentService._goals_sort(query, use_cursor)
+        if '$text' not in query:
+            return query, sort, None, None
+        if use_cursor:
+            ids_query = query
+            query = {field: value for field, value in query.items() if field != '$text'}
+            return query, sort, None, ids_query
+        # La relevancia de $text solo está disponible como metadato
+        return query, sort, {"score": {"$meta": "textScore"}}, None
+    
+    @staticmethod
+    def _goals_query(user_id, filters=None):
+        """
+        Build the GET /goals query
+        
+        Every query starts with user_id, so it is served by the compound
+        indexes that lead with it (see models/financial_goals.py).
+        
+        Args:
+            user_id (str): User ID
+            filters (dict): Optional category, status and search
+            
+        Returns:
+            dict: MongoDB query
+        """
+        query = {"user_id": user_id}
+        
+        # Apply filters if provided
+        if filters:
+            if filters.get('category'):
+                query['categoria'] = filters['category']
+            if filters.get('status'):
+                query['estado'] = filters['status']
+            if filters.get('search'):
+                # Text index on nombre/descripcion (words, not substrings)
+                query['$text'] = {"$search": filters['search']}
+        
+        return query
+    
+    @staticmethod
+    def _goals_sort(query, use_cursor=False):
+        """
+        Sort of the GET /goals query
+        
+        Searches are ordered by relevance, except in cursor mode, which
+        needs the stable _id key.
+        
+        Args:
+            query (dict): Query built by _goals_query
+            use_cursor (bool): Cursor (keyset) pagination
+            
+        Returns:
+            list: Sort specification
+        """
+        if '$text' in query and not use_cursor:
+            return [("score", {"$meta": "textScore"}), ("_id", -1)]
+        return GOALS_SORT
+    
     @staticmethod
     def get_financial_goal(goal_id, user_id):
         """
@@ -135,21 +690,43 @@ class FinancialAgentService:
             tuple: (response_data, status_code)
         """
         try:
-            # Find goal in database
-            goal = FinancialGoal.find_one({"_id": ObjectId(goal_id), "user_id": user_id})
+            wait_for_user(user_id)
+            
+            goal = cached_goal_read(
+                "detail", user_id, goal_id,
+                lambda: FinancialAgentService._load_financial_goal(goal_id, user_id)
+            )
             
             if not goal:
                 return {"success": False, "message": "Financial goal not found"}, 404
             
-            # Convert ObjectId to string
-            goal['id'] = str(goal.pop('_id'))
-            
             return {"success": True, "message": goal}, 200
             
         except Exception as e:
             logger.error(f"Error retrieving financial goal: {str(e)}")
             return {"success": False, "message": str(e)}, 500
     
+    @staticmethod
+    def _load_financial_goal(goal_id, user_id):
+        """
+        Query a goal from MongoDB
+        
+        Args:
+            goal_id (str): Goal ID
+            user_id (int): User ID for verification
+            
+        Returns:
+            dict: Goal with its id as a string, or None if not found
+        """
+        # Find goal in database
+        goal = FinancialGoal.find_one({"_id": ObjectId(goal_id), "user_id": user_id})
+        
+        if goal:
+            # Convert ObjectId to string
+            goal['id'] = str(goal.pop('_id'))
+        
+        return goal
+    
     @staticmethod
     def get_conversation_history(session_id, user_id):
         """
@@ -163,14 +740,18 @@ class FinancialAgentService:
             tuple: (response_data, status_code)
         """
         try:
+            wait_for_user(user_id)
+            
             # Find conversation in database
-            conversation = Conversation.find_one({"session_id": session_id, "user_id": user_id})
+            conversation = get_conversation_store().load_conversation(session_id, user_id)
             
             if not conversation:
                 return {"success": False, "message": "Conversation not found"}, 404
             
             # Convert ObjectId to string
             conversation['id'] = str(conversation.pop('_id'))
+            for message in conversation.get('messages', []):
+                message.pop('turn_id', None)
             
             return {"success": True, "message": conversation}, 200
             
@@ -181,204 +762,472 @@ class FinancialAgentService:
     # Método ajustado de _call_deepseek()
 
     @staticmethod
-    def _call_deepseek(user_message, conversation_history):
+    def _call_deepseek(user_message, conversation):
         """
         Call Deepseek API to process user message using the OpenAI SDK
         
         Args:
             user_message (str): User message
-            conversation_history (list): List of previous messages
+            conversation (dict): Conversation document
             
         Returns:
             tuple: (ai_response, is_goal_complete, financial_goal)
         """
         try:
-            # Initialize the OpenAI client with Deepseek configuration
-            client = OpenAI(
-                api_key=DEEPSEEK_API_KEY,
-                base_url="https://api.deepseek.com"
-            )
+            # Shared client: reuses pooled connections across chat turns
+            client = get_llm_client()
             
-            # Obtener fecha actual para el prompt
-            current_date = datetime.now().strftime("%d/%m/%Y")
-            system_prompt_with_date = SYSTEM_PROMPT.replace("{{CURRENT_DATE}}", current_date)
+            route = choose_route(user_message, conversation)
+            formatted_messages = FinancialAgentService._build_messages(user_message, conversation)
             
-            # Format conversation history
-            formatted_messages = [{"role": "system", "content": system_prompt_with_date}]
+            while True:
+                params = FinancialAgentService._completion_params(formatted_messages, route)
+                
+                cached = get_cached_response(params)
+                if cached is not None:
+                    return cached
+                
+                # Log para depuración
+                logger.info(f"Enviando solicitud a Deepseek ({route.name}) con {len(formatted_messages)} mensajes")
+                
+                with LLMCall(params['model'], "sync", route) as call:
+                    # Make the API call (deadline, retries, hedging and circuit breaker)
+                    response = get_llm_policy().call(
+                        lambda timeout: client.with_options(timeout=timeout, max_retries=0)
+                        .chat.completions.create(**params),
+                        latency_key=f"{route.name}:completion"
+                    )
+                    call.record_usage(response.usage)
+                
+                    # Extract the response
+                    logger.info(f"Respuesta recibida de Deepseek. Buscando meta financiera...")
+                    
+                    message = response.choices[0].message
+                    result = FinancialAgentService._parse_completion(message)
+                    call.outcome = FinancialAgentService._completion_outcome(message, result)
+                
+                # Truncated or broken replies from the fast model are retried on the strong one
+                if should_escalate(route, response.choices[0].finish_reason, call.outcome):
+                    route = get_route(STRONG_ROUTE)
+                    continue
+                
+                store_response(params, result)
+                return result
+            
+        except Exception as e:
+            logger.error(f"Error calling Deepseek API: {str(e)}")
+            raise
+    
+    @staticmethod
+    async def _call_deepseek_async(user_message, conversation):
+        """
+        Async variant of _call_deepseek
+        
+        Args:
+            user_message (str): User message
+            conversation (dict): Conversation document
             
-            # Add conversation history
-            for message in conversation_history:
-                if 'role' in message and 'content' in message:
-                    formatted_messages.append({
-                        "role": message['role'],
-                        "content": message['content']
-                    })
+        Returns:
+            tuple: (ai_response, is_goal_complete, financial_goal)
+        """
+        try:
+            client = get_async_llm_client()
             
-            # Add current user message
-            formatted_messages.append({"role": "user", "content": user_message})
+            route = choose_route(user_message, conversation)
+            formatted_messages = FinancialAgentService._build_messages(user_message, conversation)
             
-            # Log para depuración
-            logger.info(f"Enviando solicitud a Deepseek con {len(formatted_messages)} mensajes")
-            
-            # Make the API call
-            response = client.chat.completions.create(
-                model=DEEPSEEK_MODEL,
-                messages=formatted_messages,
-                temperature=0.7,
-                max_tokens=1500,
-                top_p=0.9
-            )
-        
-            # Extract the response
-            assistant_response = response.choices[0].message.content
-            logger.info(f"Respuesta recibida de Deepseek. Buscando meta financiera...")
-            
-            # Check if response contains financial goal JSON
-            is_goal_complete = False
-            financial_goal = None
-            
-            # Usar expresión regular para extraer JSON después de META_FINANCIERA_JSON:
-            import re
-            
-            # Patrones a buscar
-            patterns = [
-                # Patrón para META_FINANCIERA_JSON: seguido de ```json y luego el JSON
-                r'META_FINANCIERA_JSON:\s*```json\s*(\{.*?\})\s*```',
-                # Patrón para META_FINANCIERA_JSON: seguido directamente del JSON
-                r'META_FINANCIERA_JSON:\s*(\{.*?\})',
-                # Patrón para cuando hay otros caracteres entre la etiqueta y el JSON
-                r'META_FINANCIERA_JSON:.*?(\{.*?\})',
-                # Patrón para capturar JSON con comillas simples
-                r'META_FINANCIERA_JSON:.*?(\{[^}]*\})'
-            ]
-            
-            # Intentar cada patrón
-            json_str = None
-            for pattern in patterns:
-                # Usar DOTALL para que . coincida también con saltos de línea
-                match = re.search(pattern, assistant_response, re.DOTALL)
-                if match:
-                    json_str = match.group(1)
-                    logger.info(f"Patrón coincidente encontrado: {pattern}")
-                    break
-            
-            if json_str:
-                try:
-                    # Limpiar posibles caracteres no JSON
-                    json_str = json_str.strip()
-                    
-                    # Intentar limpiar malformaciones comunes
-                    if not json_str.endswith('}'):
-                        # Buscar la última llave de cierre
-                        last_brace = json_str.rfind('}')
-                        if last_brace > 0:
-                            json_str = json_str[:last_brace+1]
-                    
-                    financial_goal = json.loads(json_str)
-                    is_goal_complete = True
-                    logger.info(f"Meta financiera extraída correctamente: {financial_goal}")
+            while True:
+                params = FinancialAgentService._completion_params(formatted_messages, route)
+                
+                # The cache backend may be remote (Redis): keep it off the event loop
+                cached = await run_db(get_cached_response, params)
+                if cached is not None:
+                    return cached
+                
+                # Log para depuración
+                logger.info(f"Enviando solicitud asíncrona a Deepseek ({route.name}) con {len(formatted_messages)} mensajes")
+                
+                with LLMCall(params['model'], "async", route) as call:
+                    response = await get_llm_policy().call_async(
+                        lambda timeout: client.with_options(timeout=timeout, max_retries=0)
+                        .chat.completions.create(**params),
+                        latency_key=f"{route.name}:completion"
+                    )
+                    call.record_usage(response.usage)
                     
-                    # Limpiar el JSON de la respuesta para el usuario
-                    # Usar el mismo patrón que coincidió para eliminarlo
-                    for pattern in patterns:
-                        assistant_response = re.sub(pattern, '', assistant_response, flags=re.DOTALL)
-                        
-                    # Limpiar líneas vacías extras que puedan haber quedado
-                    assistant_response = re.sub(r'\n\s*\n', '\n\n', assistant_response)
-                    assistant_response = assistant_response.strip()
+                    logger.info(f"Respuesta recibida de Deepseek. Buscando meta financiera...")
                     
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error parsing financial goal JSON: {e}")
-                    logger.error(f"JSON intentado parsear: {json_str}")
+                    message = response.choices[0].message
+                    result = FinancialAgentService._parse_completion(message)
+                    call.outcome = FinancialAgentService._completion_outcome(message, result)
+                
+                if should_escalate(route, response.choices[0].finish_reason, call.outcome):
+                    route = get_route(STRONG_ROUTE)
+                    continue
+                
+                await run_db(store_response, params, result)
+                return result
+            
+        except Exception as e:
+            logger.error(f"Error calling Deepseek API: {str(e)}")
+            raise
+    
+    @staticmethod
+    def _stream_deepseek(params, tool_calls=None, call=None):
+        """
+        Call Deepseek API in streaming mode
+        
+        Args:
+            params (dict): Completion parameters (see _completion_params)
+            tool_calls (dict): Optional accumulator for streamed tool calls
+            call (LLMCall): Optional metrics of the call (first token, usage)
+            
+        Yields:
+            str: Text fragments of the assistant response as they arrive
+        """
+        try:
+            # Shared client: reuses pooled connections across chat turns
+            client = get_llm_client()
             
-            return assistant_response, is_goal_complete, financial_goal
+            # Log para depuración
+            logger.info(f"Enviando solicitud en streaming a Deepseek con {len(params['messages'])} mensajes")
+            
+            # Only opening the stream is retried: once tokens have been sent
+            # to the client a retry would duplicate them
+            stream = get_llm_policy().call(
+                lambda timeout: client.with_options(timeout=timeout, max_retries=0)
+                .chat.completions.create(
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **params
+                ),
+                hedge=False,
+                # Only measures the time until the stream opens
+                latency_key=f"{call.route_name if call is not None else 'default'}:stream_open"
+            )
+            
+            for chunk in stream:
+                if call is not None:
+                    call.first_token()
+                    if chunk.usage:
+                        call.record_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if tool_calls is not None and delta.tool_calls:
+                    accumulate_tool_call_deltas(tool_calls, delta.tool_calls)
+                if delta.content:
+                    yield delta.content
             
         except Exception as e:
             logger.error(f"Error calling Deepseek API: {str(e)}")
             raise
     
     @staticmethod
-    def _get_or_create_conversation(session_id, user_id):
+    def _request_hash(request_data):
         """
-        Get or create a conversation for the given session_id and user_id
+        Hash of the fields that identify a chat request
         
         Args:
-            session_id (str): Session ID
-            user_id (int): User ID
+            request_data (dict): Request data containing message and session_id
             
         Returns:
-            dict: Conversation document
-        """
-        # Try to find existing conversation
-        conversation = Conversation.find_one({"session_id": session_id, "user_id": user_id})
-        
-        # Create new conversation if not found
-        if not conversation:
-            now = datetime.now()
-            conversation = {
-                "session_id": session_id,
-                "user_id": user_id,
-                "messages": [],
-                "created_at": now,
-                "updated_at": now
-            }
-            Conversation.insert_one(conversation)
+            str: SHA-256 hex digest
+        """
+        payload = json.dumps(
+            {"message": request_data.get('message'), "session_id": request_data.get('session_id')},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _completion_params(formatted_messages, route=None):
+        """
+        Build the parameters of a chat completion request
+        
+        Args:
+            formatted_messages (list): Messages in OpenAI chat format
+            route (Route): Model and generation limits of the turn
+                (defaults to the strong route)
             
-        return conversation
+        Returns:
+            dict: Keyword arguments for client.chat.completions.create
+        """
+        route = route or get_route(STRONG_ROUTE)
+        params = {
+            "model": route.model,
+            "messages": formatted_messages,
+            "temperature": route.temperature,
+            "max_tokens": route.max_tokens,
+            "top_p": 0.9
+        }
+        if AGENT_GOAL_MODE == 'tool':
+            params["tools"] = [GOAL_TOOL]
+        return params
     
     @staticmethod
-    def _save_conversation_messages(session_id, user_id, user_message, ai_response):
+    def _build_messages(user_message, conversation):
         """
-        Save user message and AI response to conversation history
+        Build the message list sent to Deepseek
+        
+        Only the running summary and the most recent turns that fit in the
+        context budget are replayed (see ConversationContext). The static
+        system prompt comes first and the date right before the user
+        message, so consecutive requests share the longest possible prefix.
         
         Args:
-            session_id (str): Session ID
-            user_id (int): User ID
             user_message (str): User message
-            ai_response (str): AI response
+            conversation (dict): Conversation document
+            
+        Returns:
+            list: Messages in OpenAI chat format
         """
-        now = datetime.now()
+        # Static prefix shared by every request (provider prompt caching)
+        system_prompt = render_system_prompt(AGENT_GOAL_MODE)
+        formatted_messages = [{"role": "system", "content": system_prompt}]
         
-        # Add user message
-        Conversation.update_one(
-            {"session_id": session_id, "user_id": user_id},
-            {
-                "$push": {
-                    "messages": {
-                        "role": "user",
-                        "content": user_message,
-                        "timestamp": now
-                    }
-                },
-                "$set": {"updated_at": now}
-            }
+        # Add summary and recent conversation history
+        formatted_messages.extend(
+            ConversationContext.select_messages(conversation, system_prompt, user_message)
         )
         
-        # Add assistant response
-        Conversation.update_one(
-            {"session_id": session_id, "user_id": user_id},
-            {
-                "$push": {
-                    "messages": {
-                        "role": "assistant",
-                        "content": ai_response,
-                        "timestamp": now
-                    }
-                },
-                "$set": {"updated_at": now}
-            }
+        # Volatile data goes last so it does not break the cached prefix
+        current_date = datetime.now().strftime("%d/%m/%Y")
+        formatted_messages.append({"role": "system", "content": render_date_context(current_date)})
+        
+        # Add current user message
+        formatted_messages.append({"role": "user", "content": user_message})
+        
+        return formatted_messages
+    
+    @staticmethod
+    def _parse_completion(message):
+        """
+        Get the reply and the goal (if any) from a completion message
+        
+        Args:
+            message: Completion message (choices[0].message)
+            
+        Returns:
+            tuple: (ai_response, is_goal_complete, financial_goal)
+        """
+        if AGENT_GOAL_MODE == 'tool':
+            return FinancialAgentService._tool_result(
+                message.content,
+                find_goal_arguments(message.tool_calls)
+            )
+        return FinancialAgentService._extract_financial_goal(message.content)
+    
+    @staticmethod
+    def _completion_outcome(message, result):
+        """
+        Classify a completion for the LLM metrics
+        
+        Args:
+            message: Completion message (choices[0].message)
+            result (tuple): Result of _parse_completion
+            
+        Returns:
+            str: "goal", "parse_failure" (goal sent but invalid) or "reply"
+        """
+        if result[1]:
+            return "goal"
+        if AGENT_GOAL_MODE == 'tool':
+            parse_failed = find_goal_arguments(message.tool_calls) is not None
+        else:
+            parse_failed = GOAL_MARKER in (message.content or '')
+        return "parse_failure" if parse_failed else "reply"
+    
+    @staticmethod
+    def _tool_result(content, arguments):
+        """
+        Build the goal detection result in tool mode
+        
+        Args:
+            content (str): Text content of the reply (may be empty)
+            arguments (str): Arguments of the goal tool call, None if not called
+            
+        Returns:
+            tuple: (ai_response, is_goal_complete, financial_goal)
+        """
+        content = (content or '').strip()
+        if arguments is None:
+            return content, False, None
+        
+        financial_goal = parse_goal_arguments(arguments)
+        if financial_goal is None:
+            return content or GOAL_INVALID_PROMPT.strip(), False, None
+        
+        logger.info(f"Meta financiera recibida por llamada a función: {financial_goal}")
+        ai_response = content or GOAL_COMPLETION_PROMPT.format(
+            nombre=financial_goal['nombre'],
+            valor=financial_goal['valor'],
+            tiempo=financial_goal['tiempo']
+        ).strip()
+        return ai_response, True, financial_goal
+    
+    @staticmethod
+    def _extract_financial_goal(assistant_response):
+        """
+        Detect the META_FINANCIERA_JSON block in an assistant response
+        
+        Args:
+            assistant_response (str): Full assistant response
+            
+        Returns:
+            tuple: (ai_response, is_goal_complete, financial_goal) where
+                ai_response has the JSON block removed if a goal was found
+        """
+        extractor = GoalStreamExtractor()
+        extractor.feed(assistant_response or '')
+        extractor.finish()
+        return FinancialAgentService._goal_result(extractor)
+    
+    @staticmethod
+    def _goal_result(extractor):
+        """
+        Build the goal detection result from a finished extractor
+        
+        Args:
+            extractor (GoalStreamExtractor): Extractor after finish()
+            
+        Returns:
+            tuple: (ai_response, is_goal_complete, financial_goal)
+        """
+        if extractor.goal is not None:
+            logger.info(f"Meta financiera extraída correctamente: {extractor.goal}")
+            return extractor.cleaned_text, True, extractor.goal
+        
+        if extractor.marker_found:
+            logger.error("Error parsing financial goal JSON: marcador sin JSON válido")
+        return extractor.cleaned_text, False, None
+    
+    @staticmethod
+    def _complete_turn(conversation, user_message, ai_response, is_goal_complete, financial_goal):
+        """
+        Queue the writes of a finished chat turn and build the response payload
+        
+        The conversation messages and the goal are written by the
+        post-processing queue, so the reply does not wait for them. The goal
+        gets its ObjectId here, which makes the insert idempotent and lets
+        the response include goal_id right away.
+        
+        Args:
+            conversation (dict): Conversation document the turn belongs to
+            user_message (str): User message
+            ai_response (str): AI response (without the goal JSON)
+            is_goal_complete (bool): Whether a goal was detected
+            financial_goal (dict): Detected goal data
+            
+        Returns:
+            dict: Response data
+        """
+        session_id = conversation['session_id']
+        user_id = conversation['user_id']
+        now = datetime.now()
+        
+        # Fold older turns into the running summary once the window is full
+        message_count = ConversationContext.message_count(conversation) + 2
+        
+        turn = {
+            "turn_id": ObjectId(),
+            "session_id": session_id,
+            "user_id": user_id,
+            "messages": [
+                {"role": "user", "content": user_message, "timestamp": now},
+                {"role": "assistant", "content": ai_response, "timestamp": now}
+            ],
+            "fold": ConversationContext.needs_fold(message_count, conversation.get('summarized_count') or 0),
+            "goal": None
+        }
+        
+        # Prepare response
+        response_data = {
+            "success": True,
+            "message": ai_response,
+            "goal_complete": is_goal_complete
+        }
+        
+        # If goal is complete, save it to database
+        if is_goal_complete and financial_goal:
+            # Add session_id and user_id to goal data
+            financial_goal['session_id'] = session_id
+            financial_goal['user_id'] = user_id
+            FinancialAgentService._prepare_financial_goal(financial_goal)
+            
+            # The response may be modified before the write runs
+            turn['goal'] = dict(financial_goal)
+            response_data["goal_id"] = str(financial_goal['_id'])
+            response_data["goal"] = financial_goal
+        
+        submit_task("save_turn", turn, user_id)
+        
+        return response_data
+    
+    @staticmethod
+    def _save_turn(turn):
+        """
+        Write a chat turn queued by _complete_turn
+        
+        Every step is idempotent because a task may be delivered more than once.
+        
+        Args:
+            turn (dict): Turn data (see _complete_turn)
+        """
+        FinancialAgentService._save_conversation_messages(
+            turn['session_id'],
+            turn['user_id'],
+            turn['turn_id'],
+            turn['messages']
         )
+        
+        if turn.get('goal'):
+            FinancialAgentService._save_financial_goal(turn['goal'])
+        
+        if turn.get('fold'):
+            schedule_fold(turn['session_id'], turn['user_id'])
     
     @staticmethod
-    def _save_financial_goal(goal_data):
+    def _get_or_create_conversation(session_id, user_id):
         """
-        Save financial goal to database
+        Get or create a conversation for the given session_id and user_id
+        
+        Only what the prompt needs is loaded: the summary and the trailing
+        window of messages, plus message_count with the total number of
+        messages.
         
         Args:
-            goal_data (dict): Financial goal data
+            session_id (str): Session ID
+            user_id (int): User ID
             
         Returns:
-            ObjectId: ID of inserted document
+            dict: Conversation document (messages limited to the window)
+        """
+        return get_conversation_store().load_window(session_id, user_id, ConversationContext.history_window())
+    
+    @staticmethod
+    def _save_conversation_messages(session_id, user_id, turn_id, messages):
+        """
+        Append the messages of a turn to the conversation history
+        
+        Idempotent: a redelivered turn is not appended twice.
+        
+        Args:
+            session_id (str): Session ID
+            user_id (int): User ID
+            turn_id (ObjectId): Turn identifier
+            messages (list): User message and AI response
+        """
+        get_conversation_store().append_messages(session_id, user_id, turn_id, messages)
+    
+    @staticmethod
+    def _prepare_financial_goal(goal_data):
+        """
+        Complete the goal fields set by the service
+        
+        Args:
+            goal_data (dict): Financial goal data
         """
         # Ensure required fields
         if 'fecha_creacion' not in goal_data:
@@ -387,6 +1236,29 @@ class FinancialAgentService:
         if 'estado' not in goal_data:
             goal_data['estado'] = 'pendiente'
         
-        # Insert into database
-        result = FinancialGoal.insert_one(goal_data)
-        return str(result.inserted_id)
\ No newline at end of file
+        # Client-generated id: retried inserts target the same document
+        if '_id' not in goal_data:
+            goal_data['_id'] = ObjectId()
+    
+    @staticmethod
+    def _save_financial_goal(goal_data):
+        """
+        Save financial goal to database
+        
+        Args:
+            goal_data (dict): Financial goal data with its _id
+            
+        Returns:
+            str: ID of the goal
+        """
+        goal = dict(goal_data)
+        goal_id = goal.pop('_id')
+        
+        # Insert into database (no-op if it was already inserted)
+        FinancialGoal.update_one({"_id": goal_id}, {"$setOnInsert": goal}, upsert=True)
+        # Also on redelivery: the first attempt may have stopped before this
+        invalidate_user_goals(goal['user_id'])
+        return str(goal_id)
+
+
+register_handler("save_turn", FinancialAgentService._save_turn)
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from models.session_leases import acquire_lease, release_lease, renew_lease
+from config.settings import (
+    POST_PROCESSING_MODE,
+    SESSION_LEASE_ENABLED,
+    SESSION_LEASE_TTL,
+    SESSION_LEASE_WAIT_TIMEOUT,
+    SESSION_LEASE_POLL_INTERVAL
+)
+from utils.async_db import run_db
+from utils.concurrency import AsyncKeyedLock, KeyedLock
+from .post_processing import register_handler, submit_task
+
+logger = logging.getLogger(__name__)
+
+_local_locks = KeyedLock()
+_async_local_locks = AsyncKeyedLock()
+
+# Leases waiting for the writes of their turn (memory post-processing mode)
+_releasing = {}
+_releasing_lock = threading.Lock()
+
+
+class SessionBusyError(Exception):
+    """Another turn of the same session did not finish in time"""
+
+
+class LeaseHeartbeat:
+    """
+    Renew a session lease in a background thread while its holder works
+
+    A turn can outlast SESSION_LEASE_TTL (retries, hedging, escalation to
+    the strong route, summaries, long streams); without renewal another
+    worker would take the lease mid-turn.
+    """
+
+    def __init__(self, lease_id, owner, ttl=SESSION_LEASE_TTL):
+        self.lease_id = lease_id
+        self.owner = owner
+        self.ttl = ttl
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{lease_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop renewing (the caller releases the lease)"""
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.ttl / 3):
+            try:
+                held = renew_lease(self.lease_id, self.owner, self.ttl)
+            except Exception as e:
+                # The lease is still valid until it expires; try again next tick
+                logger.warning(f"Could not renew the lease of {self.lease_id}: {str(e)}")
+                continue
+            if not held:
+                if not self._stopped.is_set():
+                    logger.error(f"Lease of {self.lease_id} was lost while its turn was still running")
+                return
+
+
+def _lease_id(user_id, session_id):
+    """Identifier of the lease of a session"""
+    return f"{user_id}:{session_id}"
+
+
+def _end_turn(user_id, lease_id, owner, heartbeat):
+    """
+    Release the lease of a turn once its writes are visible to every worker
+
+    In outbox mode the pending writes are already in MongoDB, where
+    wait_for_user in any worker sees them, so the lease is released now.
+    In memory mode they are only in this process's queue: the release is
+    queued behind them (tasks of a user run in order) and the heartbeat
+    keeps the lease alive until then.
+    """
+    if POST_PROCESSING_MODE == "memory":
+        with _releasing_lock:
+            _releasing[owner] = heartbeat
+        try:
+            submit_task("release_session_lease", {"lease_id": lease_id, "owner": owner}, user_id)
+            return
+        except Exception as e:
+            logger.error(f"Could not queue the release of the lease of {lease_id}: {str(e)}")
+            with _releasing_lock:
+                _releasing.pop(owner, None)
+
+    heartbeat.stop()
+    release_lease(lease_id, owner)
+
+
+def _release_session_lease(payload):
+    """Post-processing task that releases a lease after its turn's writes"""
+    with _releasing_lock:
+        heartbeat = _releasing.pop(payload["owner"], None)
+    if heartbeat is not None:
+        heartbeat.stop()
+    release_lease(payload["lease_id"], payload["owner"])
+
+
+register_handler("release_session_lease", _release_session_lease)
+
+
+@contextmanager
+def session_turn(user_id, session_id):
+    """
+    Serialize the chat turns of a session
+
+    Turns of the same session run one at a time and in arrival order
+    inside the process; with SESSION_LEASE_ENABLED a MongoDB lease extends
+    this to every worker. The lease is renewed while the turn runs and is
+    held until the turn's writes are visible to the other workers.
+
+    Args:
+        user_id (str): User ID
+        session_id (str): Session ID
+
+    Raises:
+        SessionBusyError: If the lease could not be acquired in time
+    """
+    lease_id = _lease_id(user_id, session_id)
+    with _local_locks.hold(lease_id):
+        if not SESSION_LEASE_ENABLED:
+            yield
+            return
+
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + SESSION_LEASE_WAIT_TIMEOUT
+        while not acquire_lease(lease_id, owner, SESSION_LEASE_TTL):
+            if time.monotonic() >= deadline:
+                raise SessionBusyError("Another message of this session is still being processed")
+            time.sleep(SESSION_LEASE_POLL_INTERVAL)
+
+        heartbeat = LeaseHeartbeat(lease_id, owner)
+        try:
+            yield
+        finally:
+            _end_turn(user_id, lease_id, owner, heartbeat)
+
+
+@asynccontextmanager
+async def async_session_turn(user_id, session_id):
+    """
+    Async variant of session_turn
+
+    Args:
+        user_id (str): User ID
+        session_id (str): Session ID
+
+    Raises:
+        SessionBusyError: If the lease could not be acquired in time
+    """
+    lease_id = _lease_id(user_id, session_id)
+    async with _async_local_locks.hold(lease_id):
+        if not SESSION_LEASE_ENABLED:
+            yield
+            return
+
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + SESSION_LEASE_WAIT_TIMEOUT
+        while not await run_db(acquire_lease, lease_id, owner, SESSION_LEASE_TTL):
+            if time.monotonic() >= deadline:
+                raise SessionBusyError("Another message of this session is still being processed")
+            await asyncio.sleep(SESSION_LEASE_POLL_INTERVAL)
+
+        heartbeat = LeaseHeartbeat(lease_id, owner)
+        try:
+            yield
+        finally:
+            await run_db(_end_turn, user_id, lease_id, owner, heartbeat)
@@ -0,0 +1,99 @@
+import json
+import logging
+
+from marshmallow import EXCLUDE, ValidationError
+
+from .schemas import GoalSchema
+
+logger = logging.getLogger(__name__)
+
+GOAL_TOOL_NAME = "registrar_meta_financiera"
+
+# Fields the model fills in; id, fecha_creacion and estado are set on save
+GOAL_TOOL_FIELDS = ("nombre", "valor", "tiempo", "descripcion", "categoria")
+
+GOAL_TOOL = {
+    "type": "function",
+    "function": {
+        "name": GOAL_TOOL_NAME,
+        "description": "Registra la meta financiera del usuario cuando la información está completa o el usuario la confirma.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "nombre": {"type": "string", "description": "Nombre de la meta"},
+                "valor": {"type": "number", "description": "Valor objetivo"},
+                "tiempo": {"type": "string", "description": "Plazo para alcanzar la meta, p. ej. '6 meses'"},
+                "descripcion": {"type": "string", "description": "Descripción detallada de la meta"},
+                "categoria": {"type": "string", "description": "Categoría: ahorro, inversión, deuda, vivienda, etc."}
+            },
+            "required": ["nombre", "valor", "tiempo", "descripcion"]
+        }
+    }
+}
+
+
+def parse_goal_arguments(arguments):
+    """
+    Validate the arguments of a registrar_meta_financiera call
+
+    Args:
+        arguments (str): JSON arguments produced by the model
+
+    Returns:
+        dict: Validated goal data, or None if the arguments are invalid
+    """
+    try:
+        data = json.loads(arguments or '{}')
+        return GoalSchema(only=GOAL_TOOL_FIELDS, unknown=EXCLUDE).load(data)
+    except (json.JSONDecodeError, ValidationError, TypeError) as e:
+        logger.error(f"Argumentos inválidos en {GOAL_TOOL_NAME}: {str(e)}")
+        return None
+
+
+def find_goal_arguments(tool_calls):
+    """
+    Get the arguments of the goal tool call from a completion message
+
+    Args:
+        tool_calls (list): tool_calls of the completion message (may be None)
+
+    Returns:
+        str: JSON arguments, or None if the goal tool was not called
+    """
+    for tool_call in tool_calls or []:
+        if tool_call.function and tool_call.function.name == GOAL_TOOL_NAME:
+            return tool_call.function.arguments
+    return None
+
+
+def accumulate_tool_call_deltas(accumulator, tool_call_deltas):
+    """
+    Merge streamed tool call fragments
+
+    Args:
+        accumulator (dict): index -> {"name": str, "arguments": str}
+        tool_call_deltas (list): delta.tool_calls of a streamed chunk
+    """
+    for tool_call in tool_call_deltas or []:
+        entry = accumulator.setdefault(tool_call.index, {"name": "", "arguments": ""})
+        if tool_call.function:
+            if tool_call.function.name:
+                entry["name"] += tool_call.function.name
+            if tool_call.function.arguments:
+                entry["arguments"] += tool_call.function.arguments
+
+
+def find_streamed_goal_arguments(accumulator):
+    """
+    Get the arguments of the goal tool call from accumulated stream fragments
+
+    Args:
+        accumulator (dict): Result of accumulate_tool_call_deltas
+
+    Returns:
+        str: JSON arguments, or None if the goal tool was not called
+    """
+    for entry in accumulator.values():
+        if entry["name"] == GOAL_TOOL_NAME:
+            return entry["arguments"]
+    return None
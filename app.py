@@ -1,5 +1,6 @@
 import logging
-from flask import Flask, jsonify
+import time
+from flask import Flask, Response, g, jsonify, request
 from flask_smorest import Api
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
@@ -8,6 +9,7 @@ from config.settings import FLASK_HOST, FLASK_PORT, FLASK_DEBUG, JWT_SECRET_KEY
 # Después de registrar los blueprints
 from api.financial_agent.controllers import financial_agent_bp
 from api.auth.controllers import auth_bp
+from utils.metrics import observe_http_request, render_metrics
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +44,24 @@ CORS(app)
 def health_check():
     return {"status": "ok"}, 200
 
+# Prometheus metrics
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    payload, content_type = render_metrics()
+    return Response(payload, mimetype=content_type)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    # En respuestas en streaming mide el tiempo hasta enviar las cabeceras
+    started = g.get("request_started")
+    if started is not None:
+        observe_http_request(request.endpoint, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
 api.register_blueprint(financial_agent_bp)
 api.register_blueprint(auth_bp)
 
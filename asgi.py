@@ -0,0 +1,383 @@
+"""
+Punto de entrada ASGI
+
+POST /api/financial-agent/chat se atiende de forma nativa con asyncio, de
+modo que un solo proceso puede mantener cientos de llamadas al LLM en curso.
+El chat por WebSocket (/api/financial-agent/ws/chat) también es nativo:
+el token se valida una vez por conexión y la revocación se comprueba cada
+WS_AUTH_RECHECK_INTERVAL segundos. El resto de rutas se delegan a la
+aplicación Flask (WSGI) a través de asgiref.
+
+Ejecución:
+    gunicorn --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError
+from marshmallow import ValidationError
+
+from app import app
+from config.settings import WS_AUTH_RECHECK_INTERVAL, WS_IDLE_TIMEOUT, WS_STREAM_WORKERS
+from api.financial_agent.controllers import MAX_IDEMPOTENCY_KEY_LENGTH
+from api.financial_agent.post_processing import shutdown_post_processing
+from api.financial_agent.schemas import ChatMessageSchema
+from api.financial_agent.services import FinancialAgentService
+from models.blacklist import is_token_blacklisted
+from models.database import close_client
+from utils.async_db import run_db
+from utils.llm_client import close_async_llm_client
+from utils.metrics import observe_http_request
+
+logger = logging.getLogger(__name__)
+
+CHAT_PATH = "/api/financial-agent/chat"
+WS_CHAT_PATH = "/api/financial-agent/ws/chat"
+# Etiqueta del endpoint en las métricas HTTP
+CHAT_ENDPOINT = "asgi.chat"
+# Códigos de cierre del WebSocket
+WS_CLOSE_NORMAL = 1000
+WS_CLOSE_GOING_AWAY = 1001
+WS_CLOSE_UNAUTHORIZED = 4401
+# Segundos para drenar la cola de post-procesamiento al parar
+POST_PROCESSING_SHUTDOWN_TIMEOUT = 25
+
+wsgi_application = WsgiToAsgi(app)
+
+# Hilos que ejecutan los turnos en streaming del WebSocket
+_stream_executor = None
+_stream_executor_lock = threading.Lock()
+
+
+async def application(scope, receive, send):
+    """Aplicación ASGI principal"""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http" and scope["method"] == "POST" and scope["path"].rstrip("/") == CHAT_PATH:
+        started = time.perf_counter()
+        status_code = await _chat(scope, receive, send)
+        observe_http_request(CHAT_ENDPOINT, "POST", status_code, time.perf_counter() - started)
+    elif scope["type"] == "websocket" and scope["path"].rstrip("/") == WS_CHAT_PATH:
+        await _ws_chat(scope, receive, send)
+    elif scope["type"] == "websocket":
+        await receive()
+        await send({"type": "websocket.close", "code": WS_CLOSE_NORMAL})
+    else:
+        await wsgi_application(scope, receive, send)
+
+
+async def _lifespan(receive, send):
+    """Gestiona los eventos de arranque y parada del servidor"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await run_db(shutdown_post_processing, POST_PROCESSING_SHUTDOWN_TIMEOUT)
+            await close_async_llm_client()
+            if _stream_executor is not None:
+                _stream_executor.shutdown(wait=False)
+            await run_db(close_client)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _chat(scope, receive, send):
+    """
+    Equivalente asíncrono de ChatController.post
+
+    Returns:
+        int: Código de estado enviado
+    """
+    user_id, error = await _authenticate(scope)
+    if error:
+        await _send_json(send, 401, {"success": False, "message": error})
+        return 401
+
+    try:
+        body = await _read_body(receive)
+        request_body = ChatMessageSchema().load(json.loads(body or b"{}"))
+    except ValidationError as e:
+        await _send_json(send, 422, {
+            "code": 422,
+            "status": "Unprocessable Entity",
+            "errors": {"json": e.messages}
+        })
+        return 422
+    except ValueError as e:
+        await _send_json(send, 400, {"success": False, "message": f"Error: {str(e)}"})
+        return 400
+
+    headers = dict(scope.get("headers", []))
+    idempotency_key = headers.get(b"idempotency-key", b"").decode("latin-1")
+    replayed = False
+    if idempotency_key:
+        if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            # Mismo error que ChatController.post
+            await _send_json(send, 400, {"success": False, "message": "Error: Idempotency-Key is too long"})
+            return 400
+        data, status_code, replayed = await FinancialAgentService.process_message_idempotent_async(
+            request_body, user_id, idempotency_key
+        )
+    else:
+        data, status_code = await FinancialAgentService.process_message_async(request_body, user_id)
+    if 'goal' in data and '_id' in data['goal']:
+        del data['goal']['_id']
+    extra_headers = [(b"idempotent-replayed", b"true")] if replayed else []
+    await _send_json(send, status_code, data, extra_headers)
+    return status_code
+
+
+async def _authenticate(scope):
+    """
+    Valida el token JWT de la petición
+
+    Returns:
+        tuple: (user_id, error_message)
+    """
+    headers = dict(scope.get("headers", []))
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if not authorization.startswith("Bearer "):
+        return None, "Token de acceso requerido"
+
+    payload, error = await _verify_token(authorization[len("Bearer "):])
+    if error:
+        return None, error
+    return _identity(payload), None
+
+
+async def _verify_token(token):
+    """
+    Decodifica un token de acceso y comprueba que no esté revocado
+
+    Returns:
+        tuple: (payload, error_message)
+    """
+    try:
+        with app.app_context():
+            payload = decode_token(token)
+    except ExpiredSignatureError:
+        return None, "El token ha expirado"
+    except Exception:
+        return None, "Firma del token inválida"
+
+    if payload.get("type") != "access":
+        return None, "Firma del token inválida"
+
+    if await _is_revoked(payload):
+        return None, "El token ha sido revocado"
+
+    return payload, None
+
+
+async def _is_revoked(payload):
+    """Consulta la lista negra de tokens"""
+    try:
+        return await run_db(is_token_blacklisted, payload["jti"])
+    except Exception as e:
+        # Mismo criterio que check_if_token_in_blacklist en app.py
+        logger.error(f"Error verificando la lista negra: {str(e)}")
+        return False
+
+
+def _identity(payload):
+    """Obtiene el user_id de un token decodificado"""
+    return payload[app.config.get("JWT_IDENTITY_CLAIM", "sub")]
+
+
+async def _read_body(receive):
+    """Lee el cuerpo completo de la petición"""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def _send_json(send, status_code, data, extra_headers=()):
+    """Envía una respuesta JSON"""
+    payload = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            # Equivalente a CORS(app) para esta ruta
+            (b"access-control-allow-origin", b"*"),
+            *extra_headers
+        ]
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+def _get_stream_executor():
+    """Obtiene (o crea) el pool de hilos de los turnos en streaming"""
+    global _stream_executor
+
+    if _stream_executor is None:
+        with _stream_executor_lock:
+            if _stream_executor is None:
+                _stream_executor = ThreadPoolExecutor(
+                    max_workers=WS_STREAM_WORKERS,
+                    thread_name_prefix="ws-chat"
+                )
+    return _stream_executor
+
+
+async def _ws_chat(scope, receive, send):
+    """
+    Chat por WebSocket
+
+    El cliente envía mensajes JSON con el formato de POST /chat
+    ({"session_id": ..., "message": ...}) y recibe los mismos eventos que
+    /chat/stream como {"event": "token" | "done" | "error", "data": {...}}.
+    Los mensajes se procesan de uno en uno en el orden de llegada.
+
+    El token se envía en la cabecera Authorization o, desde navegadores,
+    en el parámetro access_token de la URL. Se valida al conectar; después
+    solo se comprueba la expiración en cada turno y la lista negra cada
+    WS_AUTH_RECHECK_INTERVAL segundos. Un token revocado o expirado cierra
+    la conexión con el código 4401.
+    """
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+
+    payload, error = await _verify_token(_ws_token(scope))
+    if error:
+        await _ws_close(send, WS_CLOSE_UNAUTHORIZED, error)
+        return
+    user_id = _identity(payload)
+    checked_at = time.monotonic()
+    last_message_at = checked_at
+
+    # Lector en segundo plano: permite detectar la desconexión del cliente
+    # mientras se genera una respuesta
+    inbox = asyncio.Queue()
+    disconnected = threading.Event()
+    reader = asyncio.ensure_future(_ws_reader(receive, inbox, disconnected))
+
+    try:
+        while not disconnected.is_set():
+            try:
+                text = await asyncio.wait_for(inbox.get(), timeout=WS_AUTH_RECHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                text = None
+
+            now = time.monotonic()
+            if text is None and now - last_message_at >= WS_IDLE_TIMEOUT:
+                await _ws_close(send, WS_CLOSE_GOING_AWAY, "Conexión inactiva")
+                return
+
+            if payload.get("exp") is not None and time.time() >= payload["exp"]:
+                await _ws_close(send, WS_CLOSE_UNAUTHORIZED, "El token ha expirado")
+                return
+            if now - checked_at >= WS_AUTH_RECHECK_INTERVAL:
+                if await _is_revoked(payload):
+                    await _ws_close(send, WS_CLOSE_UNAUTHORIZED, "El token ha sido revocado")
+                    return
+                checked_at = now
+
+            if text is None:
+                continue
+            last_message_at = now
+
+            try:
+                request_body = ChatMessageSchema().load(json.loads(text))
+            except ValidationError as e:
+                await _ws_send(send, "error", {"success": False, "message": "Invalid message", "errors": e.messages})
+                continue
+            except ValueError as e:
+                await _ws_send(send, "error", {"success": False, "message": f"Error: {str(e)}"})
+                continue
+
+            await _ws_turn(send, request_body, user_id, disconnected)
+    finally:
+        reader.cancel()
+
+
+def _ws_token(scope):
+    """Obtiene el token de la cabecera Authorization o del parámetro access_token"""
+    headers = dict(scope.get("headers", []))
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("access_token", [""])[0]
+
+
+async def _ws_reader(receive, inbox, disconnected):
+    """Lee los mensajes del cliente hasta que se desconecta"""
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message["type"] == "websocket.receive":
+                text = message.get("text")
+                if text is None and message.get("bytes") is not None:
+                    text = message["bytes"].decode("utf-8", errors="replace")
+                await inbox.put(text)
+    finally:
+        disconnected.set()
+        # Despierta al bucle principal si está esperando mensajes
+        inbox.put_nowait(None)
+
+
+async def _ws_turn(send, request_body, user_id, disconnected):
+    """
+    Ejecuta un turno con FinancialAgentService.stream_message y reenvía sus eventos
+
+    stream_message es bloqueante, así que se ejecuta en un hilo que pasa
+    los eventos al event loop. Si el cliente se desconecta, el generador se
+    cierra tras el siguiente evento (la llamada al LLM queda "cancelled").
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def produce():
+        generator = FinancialAgentService.stream_message(request_body, user_id)
+        try:
+            for item in generator:
+                loop.call_soon_threadsafe(events.put_nowait, item)
+                if disconnected.is_set():
+                    break
+        finally:
+            generator.close()
+            loop.call_soon_threadsafe(events.put_nowait, None)
+
+    producer = loop.run_in_executor(_get_stream_executor(), produce)
+    try:
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            if not disconnected.is_set():
+                await _ws_send(send, *item)
+    finally:
+        await producer
+
+
+async def _ws_send(send, event, data):
+    """Envía un evento al cliente"""
+    await send({
+        "type": "websocket.send",
+        "text": json.dumps({"event": event, "data": data}, ensure_ascii=False, default=str)
+    })
+
+
+async def _ws_close(send, code, reason):
+    """Envía un evento de error y cierra la conexión"""
+    await _ws_send(send, "error", {"success": False, "message": reason})
+    await send({"type": "websocket.close", "code": code, "reason": reason})
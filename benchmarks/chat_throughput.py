@@ -0,0 +1,115 @@
+"""
+Benchmark de throughput concurrente de POST /chat
+
+Lanza N conversaciones simultáneas contra una o varias instancias del
+servicio y reporta throughput y latencias. Para comparar el modo síncrono
+(gunicorn + Flask) con el modo ASGI se levantan ambos con el mismo
+backend LLM (p. ej. LLM_BACKEND=fake con benchmarks/fake_llm_server.py,
+para resultados reproducibles y sin coste) y se pasan las dos URLs:
+
+    gunicorn --config gunicorn.conf.py --bind 0.0.0.0:4000 --workers 1 app:app
+    gunicorn --config gunicorn.conf.py --bind 0.0.0.0:4001 --workers 1 \\
+        -k uvicorn.workers.UvicornWorker asgi:application
+
+    python -m benchmarks.chat_throughput --token $TOKEN \\
+        --url sync=http://localhost:4000 --url asgi=http://localhost:4001 \\
+        --concurrency 100 --requests 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+CHAT_PATH = "/api/financial-agent/chat"
+
+
+def _percentile(values, percent):
+    """Percentil por el método del rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, int(round(percent / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+async def _run_target(base_url, token, concurrency, total_requests, message, timeout):
+    """
+    Ejecuta el benchmark contra una instancia
+
+    Returns:
+        dict: Resultados del benchmark
+    """
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        async def one_request():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        CHAT_PATH,
+                        json={"message": message, "session_id": f"bench-{uuid.uuid4().hex}"},
+                        headers={"Authorization": f"Bearer {token}"}
+                    )
+                    if response.status_code != 200:
+                        errors += 1
+                        return
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "mean": statistics.mean(latencies) if latencies else 0.0
+    }
+
+
+def _parse_target(value):
+    """Convierte 'nombre=url' (o solo 'url') en una tupla (nombre, url)"""
+    if "=" in value:
+        name, url = value.split("=", 1)
+        return name, url
+    return value, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput concurrente de POST /chat")
+    parser.add_argument("--url", action="append", required=True, type=_parse_target,
+                        help="Instancia a medir, como nombre=url (se puede repetir)")
+    parser.add_argument("--token", required=True, help="Token JWT de acceso")
+    parser.add_argument("--concurrency", type=int, default=50, help="Peticiones simultáneas")
+    parser.add_argument("--requests", type=int, default=200, help="Total de peticiones por instancia")
+    parser.add_argument("--message", default="Hola, quiero ahorrar para un viaje")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Timeout por petición (s)")
+    args = parser.parse_args()
+
+    print(f"{'instancia':<12} {'ok':>6} {'errores':>8} {'req/s':>8} {'p50 (s)':>9} {'p95 (s)':>9}")
+    for name, url in args.url:
+        result = asyncio.run(_run_target(
+            url, args.token, args.concurrency, args.requests, args.message, args.timeout
+        ))
+        print(
+            f"{name:<12} {result['ok']:>6} {result['errors']:>8} {result['throughput']:>8.2f} "
+            f"{result['p50']:>9.3f} {result['p95']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark de los formatos de almacenamiento de conversaciones
+
+Mide, para sesiones de distinta longitud, el coste de las operaciones de un
+turno con CONVERSATION_STORAGE=embedded y bucketed: cargar la ventana del
+prompt, añadir un turno y leer el historial completo. Además del tiempo
+muestra los bytes BSON devueltos por la lectura de la ventana.
+
+Necesita un MongoDB real (MONGODB_URI); usa una base de datos temporal
+que se elimina al terminar.
+
+    python -m benchmarks.conversation_storage
+    python -m benchmarks.conversation_storage --lengths 20 200 2000 --repeat 50
+"""
+import argparse
+import statistics
+import time
+
+import bson
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+
+from config.settings import CONTEXT_MAX_TURNS, MESSAGE_BUCKET_SIZE
+from models.conversations import BucketedConversationStore, EmbeddedConversationStore
+from models.database import get_client
+
+USER_ID = "benchmark-user"
+MESSAGE = "Quiero ahorrar para un viaje a Cancún de unos 6 millones en 8 meses. " * 3
+
+
+def build_turn():
+    """Mensajes de un turno con el tamaño habitual"""
+    return [
+        {"role": "user", "content": MESSAGE},
+        {"role": "assistant", "content": MESSAGE * 2}
+    ]
+
+
+def seed(store, session_id, length):
+    """Crea una sesión con length mensajes"""
+    for _ in range(length // 2):
+        store.append_messages(session_id, USER_ID, ObjectId(), build_turn())
+
+
+def time_ms(func, repeat):
+    """Mediana en milisegundos de repeat ejecuciones"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de almacenamiento de conversaciones")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[20, 100, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por medición")
+    parser.add_argument("--bucket-size", type=int, default=MESSAGE_BUCKET_SIZE)
+    parser.add_argument("--database", default="financial_agent_benchmark")
+    args = parser.parse_args()
+
+    client = get_client()
+    database = client[args.database]
+    conversations = database["conversations"]
+    buckets = database["conversation_messages"]
+    conversations.create_index([("session_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
+    buckets.create_index([("user_id", ASCENDING), ("session_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+
+    stores = {
+        "embedded": EmbeddedConversationStore(conversations),
+        "bucketed": BucketedConversationStore(conversations, buckets, args.bucket_size)
+    }
+    window = CONTEXT_MAX_TURNS * 2
+
+    print(f"{'formato':<10} {'mensajes':>9} {'ventana (ms)':>13} {'ventana (KB)':>13} "
+          f"{'append (ms)':>12} {'historial (ms)':>15}")
+    try:
+        for length in args.lengths:
+            for name, store in stores.items():
+                session_id = f"{name}-{length}"
+                seed(store, session_id, length)
+
+                load = lambda: store.load_window(session_id, USER_ID, window)
+                window_kb = len(bson.encode(load())) / 1024
+                load_ms = time_ms(load, args.repeat)
+                append_ms = time_ms(
+                    lambda: store.append_messages(session_id, USER_ID, ObjectId(), build_turn()),
+                    args.repeat
+                )
+                history_ms = time_ms(lambda: store.load_conversation(session_id, USER_ID), args.repeat)
+
+                print(f"{name:<10} {length:>9} {load_ms:>13.2f} {window_kb:>13.1f} "
+                      f"{append_ms:>12.2f} {history_ms:>15.2f}")
+    finally:
+        client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    main()
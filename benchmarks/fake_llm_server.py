@@ -0,0 +1,346 @@
+"""
+Servidor LLM falso compatible con la API de OpenAI
+
+Permite medir el throughput del servicio sin llamar al proveedor real.
+Simula la latencia hasta el primer token con una distribución configurable,
+genera tokens a un ritmo fijo (también en streaming) y, a partir de cierto
+número de turnos del usuario o cuando este confirma, responde con la meta
+financiera: como bloque META_FINANCIERA_JSON o, si la petición incluye
+tools, como llamada a función.
+
+    python -m benchmarks.fake_llm_server --port 8001 --latency lognormal \\
+        --latency-ms 400 --tokens-per-sec 60 --goal-after 3 --seed 42
+
+    LLM_BACKEND=fake FAKE_LLM_BASE_URL=http://127.0.0.1:8001/v1 python app.py
+
+Solo usa la librería estándar.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GOAL_MARKER = "META_FINANCIERA_JSON:"
+
+# Palabras clave con las que el usuario confirma la meta
+CONFIRMATION_WORDS = ("confirmo", "correcto", "eso es todo", "me parece bien", "gracias")
+
+REPLY_WORDS = (
+    "Entiendo", "tu", "objetivo.", "Para", "ayudarte", "a", "definir", "una", "meta",
+    "financiera", "clara", "necesito", "saber", "cuánto", "quieres", "ahorrar,", "en",
+    "qué", "plazo", "te", "gustaría", "lograrlo", "y", "para", "qué", "lo", "usarás."
+)
+
+SCRIPTED_GOAL = {
+    "nombre": "Fondo de emergencia",
+    "valor": 5000.0,
+    "tiempo": "12 meses",
+    "descripcion": "Ahorrar un fondo de emergencia equivalente a seis meses de gastos",
+    "categoria": "ahorro"
+}
+
+
+class LatencyModel:
+    """Distribución de la latencia hasta el primer token"""
+
+    def __init__(self, distribution, latency_ms, spread, seed=None):
+        self.distribution = distribution
+        self.latency = latency_ms / 1000
+        self.spread = spread
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """
+        Returns:
+            float: Latencia en segundos
+        """
+        with self._lock:
+            if self.distribution == "fixed":
+                value = self.latency
+            elif self.distribution == "uniform":
+                value = self._random.uniform(self.latency * (1 - self.spread), self.latency * (1 + self.spread))
+            elif self.distribution == "normal":
+                value = self._random.gauss(self.latency, self.latency * self.spread)
+            elif self.distribution == "exponential":
+                value = self._random.expovariate(1 / self.latency) if self.latency else 0.0
+            else:
+                # lognormal: latency es la mediana y spread la sigma
+                value = self._random.lognormvariate(math.log(self.latency or 1e-6), self.spread)
+        return max(0.0, value)
+
+    def chance(self, probability):
+        """True con la probabilidad indicada"""
+        with self._lock:
+            return self._random.random() < probability
+
+
+class FakeLLM:
+    """Genera las respuestas guionizadas"""
+
+    def __init__(self, latency, tokens_per_sec, reply_tokens, goal_after, error_rate):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.goal_after = goal_after
+        self.error_rate = error_rate
+
+    def token_delay(self):
+        """Segundos entre tokens"""
+        return 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def wants_goal(self, messages):
+        """Decide si el turno debe completar la meta"""
+        user_messages = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+        if not user_messages:
+            return False
+        last = user_messages[-1].lower()
+        return len(user_messages) >= self.goal_after or any(word in last for word in CONFIRMATION_WORDS)
+
+    def reply(self, body):
+        """
+        Construye la respuesta de un turno
+
+        Returns:
+            tuple: (tokens, tool_call) donde tool_call es None o (nombre, argumentos)
+        """
+        messages = body.get("messages", [])
+        tools = body.get("tools") or []
+
+        if self.wants_goal(messages):
+            if tools:
+                name = tools[0].get("function", {}).get("name", "registrar_meta_financiera")
+                return [], (name, json.dumps(SCRIPTED_GOAL, ensure_ascii=False))
+            text = (
+                "¡Perfecto! He registrado tu meta.\n\n"
+                f"{GOAL_MARKER}\n{json.dumps(SCRIPTED_GOAL, ensure_ascii=False, indent=2)}\n\n"
+                "¡Mucho ánimo, vas por buen camino!"
+            )
+            return _split_tokens(text), None
+
+        words = [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(self.reply_tokens)]
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)], None
+
+
+def _split_tokens(text):
+    """Divide el texto en tokens aproximados (palabras con su separador)"""
+    tokens = []
+    current = ""
+    for char in text:
+        if char in " \n" and current.strip():
+            tokens.append(current)
+            current = ""
+        current += char
+    if current:
+        tokens.append(current)
+    return tokens
+
+
+def _estimate_tokens(messages):
+    return sum(len(m.get("content") or "") for m in messages) // 4
+
+
+def make_handler(llm):
+    """Crea el handler HTTP asociado a un FakeLLM"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "fake-chat", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            time.sleep(llm.latency.sample())
+            if llm.error_rate and llm.latency.chance(llm.error_rate):
+                self._send_json(500, {"error": {"message": "Fallo simulado", "type": "server_error"}})
+                return
+
+            tokens, tool_call = llm.reply(body)
+            finish_reason = "tool_calls" if tool_call else "stop"
+            # Respetar max_tokens como el proveedor real
+            max_tokens = body.get("max_tokens")
+            if max_tokens and len(tokens) > max_tokens:
+                tokens = tokens[:max_tokens]
+                finish_reason = "length"
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = body.get("model", "fake-chat")
+            usage = {
+                "prompt_tokens": _estimate_tokens(body.get("messages", [])),
+                "completion_tokens": len(tokens) + (1 if tool_call else 0)
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+            if body.get("stream"):
+                include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+                self._stream(completion_id, model, tokens, tool_call, finish_reason, usage if include_usage else None)
+            else:
+                time.sleep(llm.token_delay() * len(tokens))
+                self._send_json(200, _completion(completion_id, model, tokens, tool_call, finish_reason, usage))
+
+        def _stream(self, completion_id, model, tokens, tool_call, finish_reason, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            delay = llm.token_delay()
+            self._chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for index, token in enumerate(tokens):
+                if index and delay:
+                    time.sleep(delay)
+                self._chunk(completion_id, model, {"content": token})
+
+            if tool_call:
+                name, arguments = tool_call
+                self._chunk(completion_id, model, {"tool_calls": [{
+                    "index": 0, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                    "function": {"name": name, "arguments": ""}
+                }]})
+                # Los argumentos llegan fragmentados, como con el proveedor real
+                for start in range(0, len(arguments), 16):
+                    self._chunk(completion_id, model, {"tool_calls": [{
+                        "index": 0, "function": {"arguments": arguments[start:start + 16]}
+                    }]})
+
+            self._chunk(completion_id, model, {}, finish_reason)
+            if usage:
+                self._write_event({
+                    "id": completion_id, "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": model, "choices": [], "usage": usage
+                })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _chunk(self, completion_id, model, delta, finish_reason=None):
+            self._write_event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            })
+
+        def _write_event(self, data):
+            self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def _send_json(self, status_code, data):
+            payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def _completion(completion_id, model, tokens, tool_call, finish_reason, usage):
+    """Respuesta completa (no streaming) en formato OpenAI"""
+    message = {"role": "assistant", "content": "".join(tokens) or None}
+    if tool_call:
+        name, arguments = tool_call
+        message["tool_calls"] = [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": arguments}
+        }]
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": finish_reason
+        }],
+        "usage": usage
+    }
+
+
+def create_server(host="127.0.0.1", port=8001, latency="lognormal", latency_ms=300.0, latency_spread=0.5,
+                  tokens_per_sec=50.0, reply_tokens=40, goal_after=3, error_rate=0.0, seed=None):
+    """
+    Crea el servidor falso (sin arrancarlo)
+
+    Returns:
+        ThreadingHTTPServer: Servidor listo para serve_forever()
+    """
+    llm = FakeLLM(
+        latency=LatencyModel(latency, latency_ms, latency_spread, seed),
+        tokens_per_sec=tokens_per_sec,
+        reply_tokens=reply_tokens,
+        goal_after=goal_after,
+        error_rate=error_rate
+    )
+    server = ThreadingHTTPServer((host, port), make_handler(llm))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor LLM falso compatible con OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal",
+                        choices=["fixed", "uniform", "normal", "lognormal", "exponential"],
+                        help="Distribución de la latencia hasta el primer token")
+    parser.add_argument("--latency-ms", type=float, default=300.0,
+                        help="Mediana (lognormal) o media de la latencia en ms")
+    parser.add_argument("--latency-spread", type=float, default=0.5,
+                        help="Sigma (lognormal) o dispersión relativa (uniform, normal)")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0,
+                        help="Ritmo de generación de tokens (0 = instantáneo)")
+    parser.add_argument("--reply-tokens", type=int, default=40,
+                        help="Tokens de las respuestas que no completan la meta")
+    parser.add_argument("--goal-after", type=int, default=3,
+                        help="Turnos del usuario tras los que se responde con la meta")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Proporción de peticiones que fallan con 500")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Semilla para que las latencias sean reproducibles")
+    args = parser.parse_args()
+
+    server = create_server(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread=args.latency_spread,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        goal_after=args.goal_after,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    print(f"Servidor LLM falso escuchando en http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
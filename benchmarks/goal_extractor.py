@@ -0,0 +1,113 @@
+"""
+Micro-benchmark del extractor de META_FINANCIERA_JSON
+
+Compara utils.goal_extractor con la detección anterior basada en cuatro
+expresiones regulares sobre respuestas normales y adversariales (respuestas
+largas sin llave de cierre o con muchas llaves abiertas), donde las
+expresiones con '.*?' se vuelven cuadráticas.
+
+    python -m benchmarks.goal_extractor
+    python -m benchmarks.goal_extractor --sizes 1000 10000 50000
+"""
+import argparse
+import json
+import re
+import time
+
+from utils.goal_extractor import GoalStreamExtractor, extract_financial_goal
+
+# Patrones usados anteriormente en FinancialAgentService._call_deepseek
+LEGACY_PATTERNS = [
+    r'META_FINANCIERA_JSON:\s*```json\s*(\{.*?\})\s*```',
+    r'META_FINANCIERA_JSON:\s*(\{.*?\})',
+    r'META_FINANCIERA_JSON:.*?(\{.*?\})',
+    r'META_FINANCIERA_JSON:.*?(\{[^}]*\})'
+]
+
+GOAL = {
+    "nombre": "Viaje a Cancún",
+    "valor": 6000000.0,
+    "tiempo": "8 meses",
+    "descripcion": "Ahorro para vuelos, hotel, comidas y actividades",
+    "categoria": "viajes",
+    "fecha_creacion": "2025-04-04T00:00:00"
+}
+
+
+def legacy_extract(text):
+    """Réplica de la detección anterior basada en expresiones regulares"""
+    json_str = None
+    for pattern in LEGACY_PATTERNS:
+        match = re.search(pattern, text, re.DOTALL)
+        if match:
+            json_str = match.group(1)
+            break
+
+    if not json_str:
+        return None, text
+
+    try:
+        goal = json.loads(json_str.strip())
+    except json.JSONDecodeError:
+        return None, text
+
+    for pattern in LEGACY_PATTERNS:
+        text = re.sub(pattern, '', text, flags=re.DOTALL)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    return goal, text.strip()
+
+
+def streaming_extract(text, chunk_size=4):
+    """Extractor incremental alimentado con fragmentos de tamaño fijo"""
+    extractor = GoalStreamExtractor()
+    for index in range(0, len(text), chunk_size):
+        extractor.feed(text[index:index + chunk_size])
+    extractor.finish()
+    return extractor.goal, extractor.cleaned_text
+
+
+def build_cases(size):
+    """Genera las respuestas de prueba para un tamaño dado"""
+    filler = ("Ahorrar de forma constante te ayudará a lograr tu meta. " * (size // 56 + 1))[:size]
+    goal_json = json.dumps(GOAL, ensure_ascii=False, indent=2)
+    return {
+        "sin_meta": filler,
+        "meta_al_final": f"{filler}\n\nMETA_FINANCIERA_JSON:\n{goal_json}\n\n¡Meta registrada!",
+        "sin_llave_cierre": "META_FINANCIERA_JSON: {" + filler,
+        "muchas_llaves_abiertas": "META_FINANCIERA_JSON: " + "{ a" * (size // 3),
+    }
+
+
+def time_call(func, text, min_time):
+    """Tiempo medio por llamada en milisegundos"""
+    runs = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        func(text)
+        runs += 1
+        elapsed = time.perf_counter() - started
+    return elapsed / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del extractor de metas")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--min-time", type=float, default=0.2, help="Segundos mínimos por medición")
+    args = parser.parse_args()
+
+    implementations = [
+        ("regex", legacy_extract),
+        ("extractor", extract_financial_goal),
+        ("stream", streaming_extract),
+    ]
+
+    print(f"{'caso':<24} {'tamaño':>8} " + " ".join(f"{name + ' (ms)':>15}" for name, _ in implementations))
+    for size in args.sizes:
+        for case, text in build_cases(size).items():
+            timings = [time_call(func, text, args.min_time) for _, func in implementations]
+            print(f"{case:<24} {len(text):>8} " + " ".join(f"{timing:>15.3f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,10 +12,167 @@ FLASK_DEBUG = os.getenv('APP_DEBUG', 'False').lower() == 'true'
 # Deepseek API
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
 DEEPSEEK_MODEL = os.getenv('DEEPSEEK_MODEL', 'deepseek-r1/deepseek-r1-lite-chat')
+DEEPSEEK_BASE_URL = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
+
+# LLM backend: 'deepseek', 'fake' (benchmarks/fake_llm_server.py, for load
+# testing) or 'openai_compatible' (any OpenAI-compatible server)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'deepseek').lower()
+FAKE_LLM_BASE_URL = os.getenv('FAKE_LLM_BASE_URL', 'http://127.0.0.1:8001/v1')
+FAKE_LLM_MODEL = os.getenv('FAKE_LLM_MODEL', 'fake-chat')
+LLM_BASE_URL = os.getenv('LLM_BASE_URL')
+LLM_API_KEY = os.getenv('LLM_API_KEY')
+LLM_MODEL = os.getenv('LLM_MODEL')
+
+# How the agent reports a completed goal: 'text' (META_FINANCIERA_JSON block
+# in the reply) or 'tool' (function call validated against GoalSchema)
+AGENT_GOAL_MODE = os.getenv('AGENT_GOAL_MODE', 'text').lower()
+
+# LLM HTTP client (one shared pool per worker)
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 20))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', 10))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', 60))  # seconds
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))  # seconds
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))  # seconds
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_WARMUP_ON_BOOT = os.getenv('LLM_WARMUP_ON_BOOT', 'False').lower() == 'true'
+
+# Model routing: early information-gathering turns go to a fast model with
+# a tight token cap; turns likely to produce the goal go to the strong one.
+# Unset models default to the backend model. Costs are USD per 1M tokens.
+MODEL_ROUTING_ENABLED = os.getenv('MODEL_ROUTING_ENABLED', 'False').lower() == 'true'
+ROUTING_FAST_MODEL = os.getenv('ROUTING_FAST_MODEL')
+ROUTING_FAST_MAX_TOKENS = int(os.getenv('ROUTING_FAST_MAX_TOKENS', 400))
+ROUTING_FAST_TEMPERATURE = float(os.getenv('ROUTING_FAST_TEMPERATURE', 0.7))
+ROUTING_FAST_INPUT_COST = float(os.getenv('ROUTING_FAST_INPUT_COST', 0))
+ROUTING_FAST_OUTPUT_COST = float(os.getenv('ROUTING_FAST_OUTPUT_COST', 0))
+ROUTING_STRONG_MODEL = os.getenv('ROUTING_STRONG_MODEL')
+ROUTING_STRONG_MAX_TOKENS = int(os.getenv('ROUTING_STRONG_MAX_TOKENS', 1500))
+ROUTING_STRONG_TEMPERATURE = float(os.getenv('ROUTING_STRONG_TEMPERATURE', 0.7))
+ROUTING_STRONG_INPUT_COST = float(os.getenv('ROUTING_STRONG_INPUT_COST', 0))
+ROUTING_STRONG_OUTPUT_COST = float(os.getenv('ROUTING_STRONG_OUTPUT_COST', 0))
+ROUTING_STRONG_AFTER_TURNS = int(os.getenv('ROUTING_STRONG_AFTER_TURNS', 4))  # user turns
+ROUTING_CONFIRMATION_WORDS = [
+    word.strip().lower()
+    for word in os.getenv(
+        'ROUTING_CONFIRMATION_WORDS',
+        'confirmo,correcto,eso es todo,me parece bien,gracias,de acuerdo,listo'
+    ).split(',')
+    if word.strip()
+]
+
+# Resilience of LLM calls (replaces the SDK's own retries). Hedging sends a
+# second request when an attempt is slower than the recent p95: it trades
+# extra provider calls for lower tail latency, so it is opt-in.
+LLM_ATTEMPT_TIMEOUT = float(os.getenv('LLM_ATTEMPT_TIMEOUT', 30))  # seconds
+LLM_RETRY_ATTEMPTS = int(os.getenv('LLM_RETRY_ATTEMPTS', 3))  # total attempts
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', 0.5))  # seconds
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', 4))  # seconds
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'False').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', 95))
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', 1.0))  # seconds
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20))
+LLM_HEDGE_MAX_WORKERS = int(os.getenv('LLM_HEDGE_MAX_WORKERS', 8))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv('LLM_BREAKER_FAILURE_THRESHOLD', 5))
+LLM_BREAKER_RECOVERY_TIMEOUT = float(os.getenv('LLM_BREAKER_RECOVERY_TIMEOUT', 30))  # seconds
+
+# Exact-match LLM response cache (opt-in: with temperature > 0 reusing
+# replies is a product decision)
+LLM_RESPONSE_CACHE_ENABLED = os.getenv('LLM_RESPONSE_CACHE_ENABLED', 'False').lower() == 'true'
+LLM_RESPONSE_CACHE_BACKEND = os.getenv('LLM_RESPONSE_CACHE_BACKEND', 'memory')
+LLM_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('LLM_RESPONSE_CACHE_MAX_ENTRIES', 1000))
+LLM_RESPONSE_CACHE_TTL = int(os.getenv('LLM_RESPONSE_CACHE_TTL', 3600))  # seconds
+
+# Per-user read-through cache of GET /goals and GET /goals/<id>, invalidated
+# when a goal is saved. Invalidation only reaches the workers that share the
+# backend: with several workers use "redis" (or accept up to GOAL_CACHE_TTL
+# of staleness with "memory").
+GOAL_CACHE_ENABLED = os.getenv('GOAL_CACHE_ENABLED', 'False').lower() == 'true'
+GOAL_CACHE_BACKEND = os.getenv('GOAL_CACHE_BACKEND', 'memory')
+GOAL_CACHE_MAX_ENTRIES = int(os.getenv('GOAL_CACHE_MAX_ENTRIES', 10000))
+GOAL_CACHE_TTL = int(os.getenv('GOAL_CACHE_TTL', 300))  # seconds
+
+# Shared cache backend ("redis" in LLM_RESPONSE_CACHE_BACKEND / GOAL_CACHE_BACKEND)
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_REDIS_TIMEOUT = float(os.getenv('CACHE_REDIS_TIMEOUT', 0.5))  # seconds (connect and each command)
+
+# Idempotency-Key handling for POST /chat
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))  # seconds a completed response is kept
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', 150))  # seconds before an unfinished request can be taken over
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 60))  # seconds a duplicate waits for the first request
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv('IDEMPOTENCY_POLL_INTERVAL', 0.25))  # seconds
+
+# Per-session ordering of chat turns. In-process locks are always used;
+# the MongoDB lease also serializes turns across workers/instances. The
+# holder renews the lease every SESSION_LEASE_TTL/3 seconds, so the TTL only
+# bounds how long a crashed worker keeps the session blocked. In 'memory'
+# post-processing mode the lease is held until the turn's writes are applied.
+SESSION_LEASE_ENABLED = os.getenv('SESSION_LEASE_ENABLED', 'False').lower() == 'true'
+SESSION_LEASE_TTL = int(os.getenv('SESSION_LEASE_TTL', 30))  # seconds
+SESSION_LEASE_WAIT_TIMEOUT = float(os.getenv('SESSION_LEASE_WAIT_TIMEOUT', 60))  # seconds
+SESSION_LEASE_POLL_INTERVAL = float(os.getenv('SESSION_LEASE_POLL_INTERVAL', 0.1))  # seconds
+
+# POST /chat/batch: distinct sessions run concurrently, turns of the same
+# session run in order
+CHAT_BATCH_MAX_ITEMS = int(os.getenv('CHAT_BATCH_MAX_ITEMS', 20))
+CHAT_BATCH_MAX_WORKERS = int(os.getenv('CHAT_BATCH_MAX_WORKERS', 4))  # sessions processed at the same time per request
+
+# Writes after the LLM reply (conversation messages, goal, summary) run on a
+# background queue: 'memory' (in-process) or 'outbox' (durable MongoDB
+# outbox, at-least-once delivery across restarts). In 'memory' mode a write
+# that fails POST_PROCESSING_MAX_ATTEMPTS times is dropped and logged, even
+# though the response already returned its goal_id.
+POST_PROCESSING_MODE = os.getenv('POST_PROCESSING_MODE', 'memory').lower()
+POST_PROCESSING_WORKERS = int(os.getenv('POST_PROCESSING_WORKERS', 4))
+POST_PROCESSING_MAX_ATTEMPTS = int(os.getenv('POST_PROCESSING_MAX_ATTEMPTS', 5))
+POST_PROCESSING_RETRY_DELAY = float(os.getenv('POST_PROCESSING_RETRY_DELAY', 0.5))  # seconds
+POST_PROCESSING_WAIT_TIMEOUT = float(os.getenv('POST_PROCESSING_WAIT_TIMEOUT', 10))  # seconds
+OUTBOX_LEASE = int(os.getenv('OUTBOX_LEASE', 300))  # seconds
+OUTBOX_RETRY_AFTER = int(os.getenv('OUTBOX_RETRY_AFTER', 60))  # seconds
+OUTBOX_SWEEP_INTERVAL = float(os.getenv('OUTBOX_SWEEP_INTERVAL', 5))  # seconds
+OUTBOX_MAX_DELIVERIES = int(os.getenv('OUTBOX_MAX_DELIVERIES', 10))  # then the task is marked dead
+
+# Conversation context sent to the LLM
+CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', 6000))  # prompt budget (estimated tokens)
+CONTEXT_MAX_TURNS = int(os.getenv('CONTEXT_MAX_TURNS', 10))  # user/assistant pairs kept verbatim
+CONTEXT_SUMMARY_ENABLED = os.getenv('CONTEXT_SUMMARY_ENABLED', 'True').lower() == 'true'
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv('CONTEXT_SUMMARY_MAX_TOKENS', 400))
+
+# Message storage: 'embedded' (one messages array per conversation) or
+# 'bucketed' (fixed-size message bucket documents, for long sessions).
+# MESSAGE_BUCKET_SIZE must not change once bucketed conversations exist:
+# messages are addressed by position // MESSAGE_BUCKET_SIZE.
+CONVERSATION_STORAGE = os.getenv('CONVERSATION_STORAGE', 'embedded').lower()
+MESSAGE_BUCKET_SIZE = int(os.getenv('MESSAGE_BUCKET_SIZE', 50))  # messages per bucket
+
+# Server started by gunicorn.conf.py: 'sync' (Flask app with sync workers)
+# or 'asgi' (asgi.py with uvicorn workers)
+SERVER_MODE = os.getenv('SERVER_MODE', 'sync').lower()
+
+# ASGI mode: threads used to run blocking MongoDB calls off the event loop
+ASYNC_DB_MAX_WORKERS = int(os.getenv('ASYNC_DB_MAX_WORKERS', 32))
+
+# WebSocket chat (ASGI mode): the JWT is validated once per connection and
+# revocation is rechecked periodically instead of on every turn
+WS_AUTH_RECHECK_INTERVAL = int(os.getenv('WS_AUTH_RECHECK_INTERVAL', 60))  # seconds
+WS_IDLE_TIMEOUT = int(os.getenv('WS_IDLE_TIMEOUT', 600))  # seconds without messages before closing
+WS_STREAM_WORKERS = int(os.getenv('WS_STREAM_WORKERS', 64))  # threads running streamed turns
 
 # MongoDB
 MONGODB_URI = os.getenv('MONGODB_URI')
 MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'financial_goals_db')
+# Shared client (one connection pool per worker process)
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 300000))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 10000))  # waiting for a free pooled connection
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', 0))  # 0 = no timeout
+MONGODB_COMPRESSORS = os.getenv('MONGODB_COMPRESSORS', '')  # e.g. 'zstd,snappy,zlib'; zstd/snappy need extra packages
+MONGODB_WRITE_CONCERN = os.getenv('MONGODB_WRITE_CONCERN', 'majority')  # 'majority' or a number of nodes
+MONGODB_READ_CONCERN = os.getenv('MONGODB_READ_CONCERN', 'local')
+MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', 'primary')
+MONGODB_APP_NAME = os.getenv('MONGODB_APP_NAME', 'financial-agent')
 GOALS_COLLECTION = 'financial_goals'
 CONVERSATIONS_COLLECTION = 'conversations'
 
@@ -0,0 +1,43 @@
+"""
+Configuración de gunicorn
+"""
+import os
+
+from config.settings import LLM_WARMUP_ON_BOOT, SERVER_MODE
+
+# Segundos para drenar la cola de post-procesamiento al parar un worker
+POST_PROCESSING_SHUTDOWN_TIMEOUT = 25
+
+# Aplicación según SERVER_MODE (un módulo pasado en la línea de comandos
+# tiene prioridad)
+SERVER_APPS = {
+    "sync": ("app:app", "sync"),
+    "asgi": ("asgi:application", "uvicorn.workers.UvicornWorker"),
+}
+if SERVER_MODE not in SERVER_APPS:
+    raise ValueError(f"Modo de servidor desconocido: {SERVER_MODE}")
+wsgi_app, worker_class = SERVER_APPS[SERVER_MODE]
+
+
+def post_worker_init(worker):
+    """Precalentar las conexiones del worker antes de atender peticiones"""
+    if LLM_WARMUP_ON_BOOT:
+        from utils.llm_client import warmup_llm_client
+        warmup_llm_client()
+
+
+def worker_exit(server, worker):
+    """Aplicar las escrituras pendientes y cerrar los pools de conexiones del worker"""
+    from api.financial_agent.post_processing import shutdown_post_processing
+    from models.database import close_client
+    from utils.llm_client import close_llm_client
+    shutdown_post_processing(timeout=POST_PROCESSING_SHUTDOWN_TIMEOUT)
+    close_llm_client()
+    close_client()
+
+
+def child_exit(server, worker):
+    """Descartar las métricas en vivo del worker (modo multiproceso de Prometheus)"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,19 +1,19 @@
-from pymongo import MongoClient
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import IndexModel
 
-from config.settings import MONGODB_URI, MONGODB_DATABASE
-
-# Initialize MongoDB client
-client = MongoClient(MONGODB_URI)
-db = client[MONGODB_DATABASE]
+from models.database import db
 
 # Collection para tokens en la lista negra
 TokenBlacklist = db['token_blacklist']
 
-# Crear índices
-TokenBlacklist.create_index([("jti", 1)], unique=True)
-TokenBlacklist.create_index([("expires_at", 1)], expireAfterSeconds=0)  # TTL index para auto-eliminación
+# Índices (se crean con python -m scripts.migrate)
+INDEXES = {
+    TokenBlacklist: [
+        IndexModel([("jti", 1)], unique=True),
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0)  # TTL index para auto-eliminación
+    ]
+}
 
 
 def add_token_to_blacklist(jti, expires_delta):
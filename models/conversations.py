@@ -0,0 +1,415 @@
+"""
+Almacenamiento de los mensajes de las conversaciones
+
+Dos formatos, elegidos con CONVERSATION_STORAGE:
+
+- embedded: todos los mensajes en el array "messages" del documento de
+  la conversación (formato original). Simple, pero el documento crece sin
+  límite hacia los 16 MB de MongoDB.
+- bucketed: el documento de la conversación solo guarda la cabecera
+  (resumen, message_count, last_turn_id) y los mensajes se reparten en
+  documentos de conversation_messages de hasta MESSAGE_BUCKET_SIZE
+  mensajes, con clave (user_id, session_id, seq). Leer la ventana reciente
+  solo trae los últimos buckets, sea cual sea la longitud de la sesión.
+
+El formato bucketed lee también las conversaciones antiguas (con array
+"messages") y las convierte la primera vez que recibe un turno nuevo;
+scripts/migrate_conversations.py convierte todas de una vez.
+"""
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config.settings import CONVERSATION_STORAGE, MESSAGE_BUCKET_SIZE
+from models.database import db
+from models.financial_goals import Conversation
+
+# Buckets de mensajes (CONVERSATION_STORAGE=bucketed)
+ConversationMessages = db['conversation_messages']
+
+# Índices (se crean con python -m scripts.migrate)
+INDEXES = {
+    ConversationMessages: [
+        IndexModel([("user_id", ASCENDING), ("session_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+    ]
+}
+
+BUCKETED = "bucketed"
+
+# Nº total de mensajes, también para documentos sin message_count
+_MESSAGE_COUNT = {
+    "$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]
+}
+
+
+def _new_header(now):
+    """Campos de una conversación nueva"""
+    return {
+        "summary": None,
+        "summarized_count": 0,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+class EmbeddedConversationStore:
+    """Mensajes en el array "messages" del documento de la conversación"""
+
+    def __init__(self, conversations):
+        self.conversations = conversations
+
+    def load_window(self, session_id, user_id, window):
+        """
+        Obtiene (o crea) una conversación con solo los últimos mensajes
+
+        Una única operación crea el documento si no existe y devuelve el
+        resumen, los últimos window mensajes y message_count.
+
+        Args:
+            session_id (str): ID de la sesión
+            user_id (str): ID del usuario
+            window (int): Mensajes recientes a devolver
+
+        Returns:
+            dict: Conversación con messages limitado a la ventana
+        """
+        query = {"session_id": session_id, "user_id": user_id}
+        update = {"$setOnInsert": dict(_new_header(datetime.now()), messages=[])}
+        projection = {
+            "session_id": 1,
+            "user_id": 1,
+            "summary": 1,
+            "summarized_count": 1,
+            "messages": {"$slice": -window},
+            "message_count": _MESSAGE_COUNT
+        }
+
+        try:
+            return self.conversations.find_one_and_update(
+                query, update, projection=projection, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Otra petición la creó a la vez
+            return self.conversations.find_one_and_update(
+                query, update, projection=projection, return_document=ReturnDocument.AFTER
+            )
+
+    def load_header(self, session_id, user_id):
+        """
+        Obtiene el resumen y el número de mensajes de una conversación
+
+        Returns:
+            dict: Cabecera con summary, summarized_count y message_count, o None
+        """
+        return self.conversations.find_one(
+            {"session_id": session_id, "user_id": user_id},
+            {"summary": 1, "summarized_count": 1, "message_count": _MESSAGE_COUNT}
+        )
+
+    def load_messages(self, session_id, user_id, start, end):
+        """
+        Obtiene los mensajes en las posiciones [start, end)
+
+        Returns:
+            list: Mensajes
+        """
+        if end <= start:
+            return []
+        conversation = self.conversations.find_one(
+            {"session_id": session_id, "user_id": user_id},
+            {"messages": {"$slice": [start, end - start]}}
+        )
+        return conversation.get('messages', []) if conversation else []
+
+    def load_conversation(self, session_id, user_id):
+        """
+        Obtiene una conversación con todos sus mensajes
+
+        Returns:
+            dict: Conversación, o None si no existe
+        """
+        return self.conversations.find_one({"session_id": session_id, "user_id": user_id})
+
+    def append_messages(self, session_id, user_id, turn_id, messages):
+        """
+        Añade los mensajes de un turno
+
+        El turn_id guardado en cada mensaje hace que la operación sea
+        idempotente: un turno repetido no encuentra documento y el upsert
+        choca con el índice único (session_id, user_id).
+
+        Args:
+            session_id (str): ID de la sesión
+            user_id (str): ID del usuario
+            turn_id (ObjectId): ID del turno
+            messages (list): Mensaje del usuario y respuesta del asistente
+        """
+        now = datetime.now()
+
+        try:
+            self.conversations.update_one(
+                {"session_id": session_id, "user_id": user_id, "messages.turn_id": {"$ne": turn_id}},
+                {
+                    "$push": {
+                        "messages": {"$each": [dict(message, turn_id=turn_id) for message in messages]}
+                    },
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"created_at": now, "summary": None, "summarized_count": 0}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # El turno ya estaba guardado
+            pass
+
+
+class BucketedConversationStore:
+    """Cabecera en conversations y mensajes repartidos en buckets de tamaño fijo"""
+
+    def __init__(self, conversations, buckets, bucket_size):
+        self.conversations = conversations
+        self.buckets = buckets
+        # Los dos mensajes de un turno van siempre en el mismo bucket
+        self.bucket_size = max(2, bucket_size - bucket_size % 2)
+
+    def load_window(self, session_id, user_id, window):
+        """
+        Obtiene una conversación con solo los últimos mensajes
+
+        Lee la cabecera y después únicamente los buckets que contienen los
+        últimos window mensajes. La cabecera se crea con el primer turno.
+
+        Args:
+            session_id (str): ID de la sesión
+            user_id (str): ID del usuario
+            window (int): Mensajes recientes a devolver
+
+        Returns:
+            dict: Conversación con messages limitado a la ventana
+        """
+        conversation = self.conversations.find_one(
+            {"session_id": session_id, "user_id": user_id},
+            {
+                "session_id": 1,
+                "user_id": 1,
+                "summary": 1,
+                "summarized_count": 1,
+                "messages": {"$slice": -window},
+                "message_count": _MESSAGE_COUNT
+            }
+        )
+        if conversation is None:
+            return dict(_new_header(datetime.now()), session_id=session_id, user_id=user_id, messages=[], message_count=0)
+        if 'messages' in conversation:
+            # Conversación aún sin convertir
+            return conversation
+
+        count = conversation['message_count']
+        conversation['messages'] = self._load_bucket_messages(session_id, user_id, max(0, count - window), count)
+        return conversation
+
+    def load_header(self, session_id, user_id):
+        """
+        Obtiene el resumen y el número de mensajes de una conversación
+
+        Returns:
+            dict: Cabecera con summary, summarized_count y message_count, o None
+        """
+        return self.conversations.find_one(
+            {"session_id": session_id, "user_id": user_id},
+            {"summary": 1, "summarized_count": 1, "message_count": _MESSAGE_COUNT}
+        )
+
+    def load_messages(self, session_id, user_id, start, end):
+        """
+        Obtiene los mensajes en las posiciones [start, end)
+
+        Returns:
+            list: Mensajes
+        """
+        if end <= start:
+            return []
+        conversation = self.conversations.find_one(
+            {"session_id": session_id, "user_id": user_id, "messages": {"$exists": True}},
+            {"messages": {"$slice": [start, end - start]}}
+        )
+        if conversation is not None:
+            return conversation['messages']
+        return self._load_bucket_messages(session_id, user_id, start, end)
+
+    def _load_bucket_messages(self, session_id, user_id, start, end):
+        """Lee de los buckets los mensajes en las posiciones [start, end)"""
+        if end <= start:
+            return []
+        # Un bucket puede tener un mensaje más que bucket_size si la
+        # conversación tenía un número impar de mensajes: cada bucket guarda
+        # la posición de su primer mensaje en "start"
+        buckets = self.buckets.find(
+            {
+                "user_id": user_id,
+                "session_id": session_id,
+                "seq": {"$gte": max(0, (start - 1) // self.bucket_size), "$lte": (end - 1) // self.bucket_size}
+            },
+            {"seq": 1, "start": 1, "messages": 1}
+        ).sort("seq", ASCENDING)
+
+        messages = []
+        for bucket in buckets:
+            first = bucket.get('start', bucket['seq'] * self.bucket_size)
+            for position, message in enumerate(bucket.get('messages', []), first):
+                if start <= position < end:
+                    messages.append(message)
+        return messages
+
+    def load_conversation(self, session_id, user_id):
+        """
+        Obtiene una conversación con todos sus mensajes
+
+        Returns:
+            dict: Conversación, o None si no existe
+        """
+        conversation = self.conversations.find_one({"session_id": session_id, "user_id": user_id})
+        if conversation is None or 'messages' in conversation:
+            return conversation
+
+        buckets = self.buckets.find(
+            {"user_id": user_id, "session_id": session_id},
+            {"messages": 1}
+        ).sort("seq", ASCENDING)
+        conversation['messages'] = [message for bucket in buckets for message in bucket.get('messages', [])]
+        for field in ("message_count", "last_turn_id", "storage"):
+            conversation.pop(field, None)
+        return conversation
+
+    def append_messages(self, session_id, user_id, turn_id, messages):
+        """
+        Añade los mensajes de un turno
+
+        Primero se escriben los mensajes en su bucket y después se avanza
+        la cabecera, de modo que repetir un turno a medias (entrega al menos
+        una vez de la cola) no duplica ni pierde mensajes.
+
+        Args:
+            session_id (str): ID de la sesión
+            user_id (str): ID del usuario
+            turn_id (ObjectId): ID del turno
+            messages (list): Mensaje del usuario y respuesta del asistente
+        """
+        now = datetime.now()
+        header = self.conversations.find_one(
+            {"session_id": session_id, "user_id": user_id},
+            {"session_id": 1, "user_id": 1, "message_count": 1, "last_turn_id": 1, "messages": 1}
+        )
+        if header is not None and 'messages' in header:
+            header = self.convert(header)
+        if header is not None and header.get('last_turn_id') == turn_id:
+            return
+
+        count = header.get('message_count', 0) if header else 0
+        try:
+            self.buckets.update_one(
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "seq": count // self.bucket_size,
+                    "messages.turn_id": {"$ne": turn_id}
+                },
+                {
+                    "$push": {"messages": {"$each": [dict(message, turn_id=turn_id) for message in messages]}},
+                    "$setOnInsert": {"start": count}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Los mensajes ya estaban en el bucket
+            pass
+
+        try:
+            self.conversations.update_one(
+                {"session_id": session_id, "user_id": user_id, "last_turn_id": {"$ne": turn_id}},
+                {
+                    "$inc": {"message_count": len(messages)},
+                    "$set": {"last_turn_id": turn_id, "storage": BUCKETED, "updated_at": now},
+                    "$setOnInsert": {"created_at": now, "summary": None, "summarized_count": 0}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # El turno ya estaba registrado en la cabecera
+            pass
+
+    def convert(self, conversation):
+        """
+        Pasa una conversación con array "messages" al formato por buckets
+
+        Los buckets se escriben con upsert (repetir la conversión no
+        duplica mensajes) y el array solo se elimina si nadie añadió
+        mensajes mientras tanto.
+
+        Args:
+            conversation (dict): Documento con _id, session_id, user_id y messages
+
+        Returns:
+            dict: Cabecera convertida (message_count y last_turn_id), o la
+                conversación releída si cambió durante la conversión
+        """
+        session_id = conversation['session_id']
+        user_id = conversation['user_id']
+        messages = conversation.get('messages', [])
+
+        for start in range(0, len(messages), self.bucket_size):
+            self.buckets.replace_one(
+                {"user_id": user_id, "session_id": session_id, "seq": start // self.bucket_size},
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "seq": start // self.bucket_size,
+                    "start": start,
+                    "messages": messages[start:start + self.bucket_size]
+                },
+                upsert=True
+            )
+
+        last_turn_id = messages[-1].get('turn_id') if messages else None
+        header = self.conversations.find_one_and_update(
+            {"_id": conversation['_id'], "messages": {"$size": len(messages)}},
+            {
+                "$unset": {"messages": ""},
+                "$set": {"message_count": len(messages), "last_turn_id": last_turn_id, "storage": BUCKETED}
+            },
+            projection={"message_count": 1, "last_turn_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if header is None:
+            # Llegaron mensajes nuevos: convertir de nuevo
+            conversation = self.conversations.find_one({"_id": conversation['_id']})
+            if conversation is None or 'messages' not in conversation:
+                return conversation
+            return self.convert(conversation)
+        return header
+
+
+# Formatos según CONVERSATION_STORAGE
+CONVERSATION_STORES = {
+    "embedded": lambda: EmbeddedConversationStore(Conversation),
+    "bucketed": lambda: BucketedConversationStore(Conversation, ConversationMessages, MESSAGE_BUCKET_SIZE)
+}
+
+_store = None
+
+
+def get_conversation_store():
+    """
+    Obtiene el almacenamiento de conversaciones configurado
+
+    Returns:
+        EmbeddedConversationStore o BucketedConversationStore
+    """
+    global _store
+
+    if _store is None:
+        if CONVERSATION_STORAGE not in CONVERSATION_STORES:
+            raise ValueError(f"Formato de conversaciones desconocido: {CONVERSATION_STORAGE}")
+        _store = CONVERSATION_STORES[CONVERSATION_STORAGE]()
+    return _store
@@ -0,0 +1,138 @@
+"""
+Cliente compartido de MongoDB
+
+Cada proceso mantiene un único MongoClient (un solo pool de conexiones y
+un solo conjunto de hilos de monitorización) para todas las colecciones.
+El cliente se crea la primera vez que se usa una colección, no al importar
+los modelos, y se vuelve a crear tras un fork (gunicorn --preload), ya que
+MongoClient no se puede compartir entre procesos.
+"""
+import logging
+import os
+import threading
+
+from pymongo import MongoClient
+
+from config.settings import (
+    MONGODB_URI,
+    MONGODB_DATABASE,
+    MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE,
+    MONGODB_MAX_IDLE_TIME_MS,
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    MONGODB_CONNECT_TIMEOUT_MS,
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    MONGODB_SOCKET_TIMEOUT_MS,
+    MONGODB_COMPRESSORS,
+    MONGODB_WRITE_CONCERN,
+    MONGODB_READ_CONCERN,
+    MONGODB_READ_PREFERENCE,
+    MONGODB_APP_NAME
+)
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _client_options():
+    """Opciones del pool, timeouts y consistencia del cliente"""
+    options = {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGODB_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGODB_SOCKET_TIMEOUT_MS or None,
+        "w": int(MONGODB_WRITE_CONCERN) if MONGODB_WRITE_CONCERN.isdigit() else MONGODB_WRITE_CONCERN,
+        "readConcernLevel": MONGODB_READ_CONCERN,
+        "readPreference": MONGODB_READ_PREFERENCE,
+        "appname": MONGODB_APP_NAME,
+        # Conectar en la primera operación, no al crear el cliente
+        "connect": False
+    }
+    if MONGODB_COMPRESSORS:
+        options["compressors"] = MONGODB_COMPRESSORS
+    return options
+
+
+def get_client():
+    """
+    Obtiene el cliente compartido del proceso, creándolo la primera vez
+
+    Returns:
+        MongoClient: Cliente compartido
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                # El cliente heredado del proceso padre no se cierra: sus
+                # sockets siguen siendo del padre
+                _client = MongoClient(MONGODB_URI, **_client_options())
+                _client_pid = pid
+                logger.info(f"Cliente MongoDB inicializado para el proceso {pid}")
+    return _client
+
+
+def get_database():
+    """
+    Obtiene la base de datos de la aplicación
+
+    Returns:
+        Database: Base de datos MONGODB_DATABASE
+    """
+    return get_client()[MONGODB_DATABASE]
+
+
+def close_client():
+    """
+    Cierra el cliente compartido y libera sus conexiones
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+class LazyCollection:
+    """
+    Referencia a una colección que no crea el cliente hasta que se usa
+
+    Se comporta como una Collection de pymongo: cada acceso a un atributo
+    se delega en la colección del cliente actual del proceso.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def _collection(self):
+        return get_database()[self.name]
+
+    def __getattr__(self, attribute):
+        return getattr(self._collection(), attribute)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+
+class LazyDatabase:
+    """Referencia a la base de datos de la aplicación; db['x'] devuelve una LazyCollection"""
+
+    def __getitem__(self, name):
+        return LazyCollection(name)
+
+    def __getattr__(self, attribute):
+        return getattr(get_database(), attribute)
+
+
+db = LazyDatabase()
+
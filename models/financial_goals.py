@@ -1,26 +1,35 @@
-from pymongo import MongoClient
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel
 
-from config.settings import MONGODB_URI, MONGODB_DATABASE
-
-# Inicializar cliente de MongoDB Atlas
-client = MongoClient(MONGODB_URI)
-db = client[MONGODB_DATABASE]
+from models.database import db
 
 # Colecciones
 FinancialGoal = db['financial_goals']
 Conversation = db['conversations']
 
-# Create indexes
-FinancialGoal.create_index([("user_id", 1)])
-FinancialGoal.create_index([("session_id", 1)])
-FinancialGoal.create_index([("categoria", 1)])
-FinancialGoal.create_index([("estado", 1)])
-FinancialGoal.create_index([("nombre", "text"), ("descripcion", "text")])
-
-Conversation.create_index([("session_id", 1), ("user_id", 1)], unique=True)
-Conversation.create_index([("updated_at", -1)])
+# Índices (se crean con python -m scripts.migrate)
+INDEXES = {
+    FinancialGoal: [
+        # Listado por usuario y paginación por cursor (cubre también las
+        # consultas solo por user_id)
+        IndexModel([("user_id", 1), ("_id", -1)]),
+        IndexModel([("session_id", 1)]),
+        # Filtros de GET /goals, con el mismo orden que el listado
+        IndexModel([("user_id", 1), ("categoria", 1), ("_id", -1)]),
+        IndexModel([("user_id", 1), ("estado", 1), ("_id", -1)]),
+        # Búsqueda de texto por usuario (las consultas $text deben filtrar por user_id)
+        IndexModel(
+            [("user_id", 1), ("nombre", "text"), ("descripcion", "text")],
+            name="user_id_1_goal_text",
+            default_language="spanish"
+        )
+    ],
+    Conversation: [
+        IndexModel([("session_id", 1), ("user_id", 1)], unique=True),
+        IndexModel([("updated_at", -1)])
+    ]
+}
 
 
 class FinancialGoalModel:
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config.settings import IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TIMEOUT
+from models.database import db
+
+# Respuestas registradas por Idempotency-Key
+IdempotencyKey = db['idempotency_keys']
+
+# Índices (se crean con python -m scripts.migrate)
+INDEXES = {
+    IdempotencyKey: [
+        IndexModel([("user_id", 1), ("key", 1)], unique=True),
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0)  # TTL index para auto-eliminación
+    ]
+}
+
+# Estados de una petición
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+def begin_request(user_id, key, request_hash):
+    """
+    Registra el inicio de una petición con Idempotency-Key
+
+    Args:
+        user_id (str): ID del usuario
+        key (str): Valor de la cabecera Idempotency-Key
+        request_hash (str): Hash del cuerpo de la petición
+
+    Returns:
+        tuple: (started, record). started es True si esta petición debe
+            procesarse; si no, record es el registro existente.
+    """
+    now = datetime.now()
+    try:
+        IdempotencyKey.insert_one({
+            "user_id": user_id,
+            "key": key,
+            "request_hash": request_hash,
+            "status": IN_PROGRESS,
+            "created_at": now,
+            "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT),
+            "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL)
+        })
+        return True, None
+    except DuplicateKeyError:
+        pass
+
+    # Tomar el control de una petición abandonada (p. ej. el worker murió)
+    record = IdempotencyKey.find_one_and_update(
+        {
+            "user_id": user_id,
+            "key": key,
+            "request_hash": request_hash,
+            "status": IN_PROGRESS,
+            "locked_until": {"$lt": now}
+        },
+        {"$set": {"locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT)}},
+        return_document=ReturnDocument.AFTER
+    )
+    if record:
+        return True, None
+
+    return False, IdempotencyKey.find_one({"user_id": user_id, "key": key})
+
+
+def complete_request(user_id, key, response, status_code):
+    """
+    Guarda la respuesta de una petición completada
+
+    Args:
+        user_id (str): ID del usuario
+        key (str): Valor de la cabecera Idempotency-Key
+        response (dict): Cuerpo de la respuesta
+        status_code (int): Código HTTP de la respuesta
+    """
+    IdempotencyKey.update_one(
+        {"user_id": user_id, "key": key},
+        {
+            "$set": {
+                "status": COMPLETED,
+                "response": response,
+                "status_code": status_code,
+                "completed_at": datetime.now()
+            },
+            "$unset": {"locked_until": ""}
+        }
+    )
+
+
+def release_request(user_id, key):
+    """
+    Libera una petición que falló para que un reintento pueda procesarla
+
+    Args:
+        user_id (str): ID del usuario
+        key (str): Valor de la cabecera Idempotency-Key
+    """
+    IdempotencyKey.delete_one({"user_id": user_id, "key": key, "status": IN_PROGRESS})
+
+
+def get_request(user_id, key):
+    """
+    Obtiene el registro de una petición
+
+    Args:
+        user_id (str): ID del usuario
+        key (str): Valor de la cabecera Idempotency-Key
+
+    Returns:
+        dict: Registro o None
+    """
+    return IdempotencyKey.find_one({"user_id": user_id, "key": key})
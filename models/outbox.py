@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from pymongo import IndexModel, ReturnDocument
+
+from models.database import db
+
+# Tareas de post-procesamiento pendientes (POST_PROCESSING_MODE=outbox)
+Outbox = db['post_processing_outbox']
+
+# Índices (se crean con python -m scripts.migrate)
+INDEXES = {
+    Outbox: [
+        IndexModel([("key", 1)]),
+        IndexModel([("available_at", 1)])
+    ]
+}
+
+# Estado de las tareas que agotaron sus entregas
+DEAD = "dead"
+
+
+def add_task(kind, key, payload, owner, lease):
+    """
+    Persiste una tarea antes de encolarla
+
+    La tarea queda reservada para owner durante lease segundos; si no se
+    completa en ese tiempo, cualquier proceso puede reclamarla.
+
+    Args:
+        kind (str): Tipo de tarea
+        key (str): Clave de orden
+        payload (dict): Datos de la tarea
+        owner (str): Proceso que la va a ejecutar
+        lease (int): Segundos de reserva
+
+    Returns:
+        ObjectId: ID de la tarea
+    """
+    now = datetime.now()
+    result = Outbox.insert_one({
+        "kind": kind,
+        "key": key,
+        "payload": payload,
+        "owner": owner,
+        "attempts": 1,
+        "available_at": now + timedelta(seconds=lease),
+        "created_at": now
+    })
+    return result.inserted_id
+
+
+def complete_task(task_id):
+    """
+    Elimina una tarea completada
+
+    Args:
+        task_id (ObjectId): ID de la tarea
+    """
+    Outbox.delete_one({"_id": task_id})
+
+
+def retry_task(task_id, delay, max_deliveries=None):
+    """
+    Libera una tarea para que se reintente más tarde
+
+    Args:
+        task_id (ObjectId): ID de la tarea
+        delay (int): Segundos hasta que se pueda reclamar de nuevo
+        max_deliveries (int): Entregas máximas; al alcanzarlas la tarea se
+            marca como muerta en lugar de aplazarse
+
+    Returns:
+        bool: True si se aplazó, False si quedó como muerta
+    """
+    query = {"_id": task_id}
+    if max_deliveries is not None:
+        query["attempts"] = {"$lt": max_deliveries}
+    result = Outbox.update_one(
+        query,
+        {"$set": {"owner": None, "available_at": datetime.now() + timedelta(seconds=delay)}}
+    )
+    if result.matched_count:
+        return True
+    dead_task(task_id)
+    return False
+
+
+def dead_task(task_id):
+    """
+    Marca una tarea como muerta (dead letter)
+
+    Deja de reclamarse (no tiene available_at) y no cuenta como pendiente,
+    pero se conserva en el outbox para revisarla o reencolarla a mano
+    (volviendo a poner available_at y quitando status).
+
+    Args:
+        task_id (ObjectId): ID de la tarea
+    """
+    Outbox.update_one(
+        {"_id": task_id},
+        {
+            "$set": {"status": DEAD, "owner": None, "dead_at": datetime.now()},
+            "$unset": {"available_at": ""}
+        }
+    )
+
+
+def claim_task(owner, lease):
+    """
+    Reclama la tarea disponible más antigua
+
+    Args:
+        owner (str): Proceso que la va a ejecutar
+        lease (int): Segundos de reserva
+
+    Returns:
+        dict: Tarea reclamada, o None si no hay ninguna disponible
+    """
+    now = datetime.now()
+    return Outbox.find_one_and_update(
+        {"available_at": {"$lte": now}},
+        {
+            "$set": {"owner": owner, "available_at": now + timedelta(seconds=lease)},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def count_pending(key):
+    """
+    Cuenta las tareas sin completar de una clave (sin las muertas)
+
+    Args:
+        key (str): Clave de orden
+
+    Returns:
+        int: Número de tareas pendientes
+    """
+    return Outbox.count_documents({"key": key, "status": {"$ne": DEAD}}, limit=1)
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from models.database import db
+
+# Leases que serializan los turnos de una sesión entre workers
+SessionLease = db['session_leases']
+
+# Índices (se crean con python -m scripts.migrate)
+INDEXES = {
+    SessionLease: [
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0)  # TTL index para auto-eliminación
+    ]
+}
+
+
+def acquire_lease(lease_id, owner, ttl):
+    """
+    Intenta adquirir un lease
+
+    Args:
+        lease_id (str): Identificador del recurso (usuario y sesión)
+        owner (str): Identificador único de quien adquiere el lease
+        ttl (int): Segundos tras los cuales el lease se considera abandonado
+
+    Returns:
+        bool: True si el lease quedó adquirido por owner
+    """
+    now = datetime.now()
+    try:
+        SessionLease.update_one(
+            {
+                "_id": lease_id,
+                "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]
+            },
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Otro worker tiene el lease vigente
+        return False
+
+
+def release_lease(lease_id, owner):
+    """
+    Libera un lease si sigue perteneciendo a owner
+
+    Args:
+        lease_id (str): Identificador del recurso
+        owner (str): Identificador de quien adquirió el lease
+    """
+    SessionLease.delete_one({"_id": lease_id, "owner": owner})
+
+
+def renew_lease(lease_id, owner, ttl):
+    """
+    Extiende un lease mientras quien lo tiene sigue trabajando
+
+    Args:
+        lease_id (str): Identificador del recurso
+        owner (str): Identificador de quien adquirió el lease
+        ttl (int): Segundos de validez a partir de ahora
+
+    Returns:
+        bool: False si el lease ya no pertenece a owner
+    """
+    result = SessionLease.update_one(
+        {"_id": lease_id, "owner": owner},
+        {"$set": {"expires_at": datetime.now() + timedelta(seconds=ttl)}}
+    )
+    return result.matched_count == 1
@@ -1,19 +1,19 @@
-from pymongo import MongoClient
 from datetime import datetime
 from bson import ObjectId
+from pymongo import IndexModel
 
-from config.settings import MONGODB_URI, MONGODB_DATABASE
-
-# Initialize MongoDB client
-client = MongoClient(MONGODB_URI)
-db = client[MONGODB_DATABASE]
+from models.database import db
 
 # Collections
 User = db['users']
 
-# Create indexes
-User.create_index([("email", 1)], unique=True)
-User.create_index([("role", 1)])
+# Indexes (created with python -m scripts.migrate)
+INDEXES = {
+    User: [
+        IndexModel([("email", 1)], unique=True),
+        IndexModel([("role", 1)])
+    ]
+}
 
 
 class UserModel:
@@ -0,0 +1,169 @@
+"""
+Comprueba con explain() que las consultas de GET /goals usan índices
+
+Construye cada forma de consulta del listado (filtros, búsqueda y
+paginación por cursor) con el mismo código que el servicio y falla si el
+plan elegido recorre la colección entera (COLLSCAN) o necesita ordenar en
+memoria (SORT). Solo se admite ordenar en memoria por relevancia
+(textScore), que ningún índice puede dar y que se aplica únicamente a los
+documentos encontrados por el índice de texto; una búsqueda con cursor
+obtiene primero los _id encontrados y lee la página en orden de _id.
+
+Se ejecuta contra la base de datos configurada, después de
+python -m scripts.migrate (p. ej. en CI o antes de desplegar):
+
+    python -m scripts.check_goal_queries
+    python -m scripts.check_goal_queries --user-id 42
+"""
+import argparse
+import sys
+
+from bson.objectid import ObjectId
+
+from api.financial_agent.services import FinancialAgentService
+from models.financial_goals import FinancialGoal
+from utils.pagination import keyset_filter
+
+# (nombre, filtros, paginación por cursor)
+QUERY_SHAPES = [
+    ("listado", {}, False),
+    ("listado, página siguiente (cursor)", {}, True),
+    ("categoría", {"category": "viajes"}, False),
+    ("estado", {"status": "pendiente"}, False),
+    ("categoría y estado", {"category": "viajes", "status": "pendiente"}, False),
+    ("categoría, página siguiente (cursor)", {"category": "viajes"}, True),
+    ("búsqueda", {"search": "viaje"}, False),
+    ("búsqueda, página siguiente (cursor)", {"search": "viaje"}, True),
+]
+
+
+def _plan_nodes(plan):
+    """Recorre los nodos de un plan de ejecución"""
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            yield node
+        pending.extend(node.get("inputStages", []))
+        for key in ("inputStage", "queryPlan", "outerStage", "innerStage"):
+            if key in node:
+                pending.append(node[key])
+
+
+def plan_stages(plan):
+    """
+    Lista las etapas de un plan de ejecución
+
+    Args:
+        plan (dict): winningPlan de explain() (formato clásico o SBE)
+
+    Returns:
+        list: Nombres de las etapas
+    """
+    return [node["stage"] for node in _plan_nodes(plan)]
+
+
+def plan_problems(plan):
+    """
+    Problemas de rendimiento de un plan
+
+    Args:
+        plan (dict): winningPlan de explain()
+
+    Returns:
+        list: Descripción de cada problema
+    """
+    problems = []
+    nodes = list(_plan_nodes(plan))
+    if any(node["stage"] == "COLLSCAN" for node in nodes):
+        problems.append("recorre la colección entera (COLLSCAN)")
+    for node in nodes:
+        if node["stage"] != "SORT":
+            continue
+        # Solo el orden por relevancia ($meta) no puede venir de un índice
+        pattern = list(node.get("sortPattern", {}).values())
+        if not pattern or not isinstance(pattern[0], dict):
+            problems.append(f"ordena en memoria (SORT {node.get('sortPattern')})")
+    return problems
+
+
+def goal_list_queries(user_id, filters, use_cursor, per_page=10):
+    """
+    Construye las consultas de una página del listado de metas con el mismo
+    código que el servicio (FinancialAgentService._goals_find)
+
+    Args:
+        user_id (str): ID del usuario
+        filters (dict): Filtros category, status y search
+        use_cursor (bool): Consulta de una página siguiente por cursor
+        per_page (int): Tamaño de página
+
+    Returns:
+        list: Consultas (step, filter, sort, projection, limit): la de la
+            página y, antes, la de los _id encontrados si el servicio la hace
+    """
+    query, sort, projection, ids_query = FinancialAgentService._goals_find(user_id, filters, use_cursor)
+    queries = []
+    if ids_query is not None:
+        queries.append({"step": "ids", "filter": ids_query, "projection": {"_id": 1}})
+        query = dict(query, _id={"$in": [ObjectId() for _ in range(per_page)]})
+    if use_cursor:
+        query = dict(query, **keyset_filter(sort, [ObjectId() for _ in sort]))
+    queries.append({
+        "step": "page",
+        "filter": query,
+        "sort": sort,
+        "projection": projection,
+        "limit": per_page + 1
+    })
+    return queries
+
+
+def explain_shape(user_id, filters, use_cursor, per_page=10):
+    """
+    Obtiene los planes de una forma de consulta del listado
+
+    Returns:
+        list: (paso, winningPlan) de cada consulta
+    """
+    plans = []
+    for query in goal_list_queries(user_id, filters, use_cursor, per_page):
+        cursor = FinancialGoal.find(query["filter"], query.get("projection"))
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        if query.get("limit"):
+            cursor = cursor.limit(query["limit"])
+        plans.append((query["step"], cursor.explain()["queryPlanner"]["winningPlan"]))
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprueba los planes de las consultas de GET /goals")
+    parser.add_argument("--user-id", help="Usuario de las consultas (por defecto, el de una meta existente)")
+    args = parser.parse_args()
+
+    user_id = args.user_id
+    if user_id is None:
+        sample = FinancialGoal.find_one({}, {"user_id": 1})
+        user_id = sample["user_id"] if sample else "explain-check"
+
+    failures = 0
+    for name, filters, use_cursor in QUERY_SHAPES:
+        for step, plan in explain_shape(user_id, filters, use_cursor):
+            label = name if step == "page" else f"{name} ({step})"
+            problems = plan_problems(plan)
+            status = "FALLO" if problems else "ok"
+            print(f"{status:<6} {label:<46} {' <- '.join(plan_stages(plan))}")
+            for problem in problems:
+                print(f"       {problem}")
+            failures += bool(problems)
+
+    if failures:
+        print(f"{failures} consultas sin un índice adecuado; revisa INDEXES en models/financial_goals.py")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
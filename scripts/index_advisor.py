@@ -0,0 +1,440 @@
+"""
+Asesor de índices: explica las consultas de los servicios sobre datos de prueba
+
+Crea una base de datos temporal con los índices declarados (INDEXES) y un
+conjunto de datos generado (varios usuarios con metas, conversaciones y
+buckets de mensajes), ejecuta cada forma de consulta que emiten los
+servicios con explain("executionStats") y muestra, para cada una, los
+documentos devueltos frente a los examinados, las claves de índice
+recorridas, el tiempo y las etapas del plan.
+
+Marca las consultas que recorren la colección entera (COLLSCAN), ordenan en
+memoria (SORT), examinan demasiados documentos por cada uno devuelto o
+tardan más de --slow-ms, y propone un índice compuesto para cada una
+(igualdad, orden y rango, en ese orden). Sale con código 1 si hay alguna,
+así que puede ejecutarse en CI antes de desplegar:
+
+    python -m scripts.index_advisor
+    python -m scripts.index_advisor --users 500 --goals-per-user 200 --keep
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from bson.son import SON
+
+from config.settings import MESSAGE_BUCKET_SIZE, MONGODB_DATABASE
+from models.database import get_client
+from scripts.check_goal_queries import QUERY_SHAPES, goal_list_queries, plan_problems, plan_stages
+from scripts.migrate import declared_indexes
+
+CATEGORIES = ["viajes", "vivienda", "educación", "vehículo", "emergencias", "retiro", "otros"]
+STATES = ["pendiente", "en_progreso", "completada", "cancelada"]
+GOAL_NAMES = [
+    ("Viaje a Cancún", "Ahorro para vuelos, hotel, comidas y actividades"),
+    ("Cuota inicial de apartamento", "Ahorro para la cuota inicial de un apartamento propio"),
+    ("Maestría", "Matrícula y gastos de una maestría en el exterior"),
+    ("Carro nuevo", "Ahorro para comprar un vehículo familiar"),
+    ("Fondo de emergencias", "Seis meses de gastos fijos para imprevistos"),
+    ("Pensión voluntaria", "Aportes mensuales para complementar la pensión"),
+]
+MESSAGE = "Quiero ahorrar para un viaje de unos 6 millones en 8 meses."
+
+
+def create_database(client, name):
+    """
+    Crea (vacía) la base de datos temporal con los índices declarados
+
+    Args:
+        client (MongoClient): Cliente de MongoDB
+        name (str): Nombre de la base de datos; se elimina si ya existe
+
+    Returns:
+        Database: Base de datos creada
+    """
+    client.drop_database(name)
+    database = client[name]
+    for collection, indexes in declared_indexes():
+        database[collection.name].create_indexes(indexes)
+    return database
+
+
+def seed(database, users, goals_per_user, sessions_per_user, messages_per_session, bucket_size):
+    """
+    Genera los datos de prueba
+
+    Returns:
+        dict: Valores de ejemplo para las consultas (user_id, session_id, goal_id...)
+    """
+    rng = random.Random(42)
+    now = datetime.now()
+    sample = None
+
+    for number in range(users):
+        user_id = str(ObjectId())
+        goals = []
+        for position in range(goals_per_user):
+            nombre, descripcion = rng.choice(GOAL_NAMES)
+            goals.append({
+                "_id": ObjectId(),
+                "nombre": nombre,
+                "valor": float(rng.randrange(1, 100) * 100000),
+                "tiempo": f"{rng.randrange(3, 60)} meses",
+                "descripcion": descripcion,
+                "categoria": rng.choice(CATEGORIES),
+                "estado": rng.choice(STATES),
+                "fecha_creacion": (now - timedelta(hours=position)).isoformat(),
+                "session_id": f"session-{number}-{position % max(1, sessions_per_user)}",
+                "user_id": user_id
+            })
+        if goals:
+            database["financial_goals"].insert_many(goals)
+
+        conversations = []
+        buckets = []
+        for session in range(sessions_per_user):
+            session_id = f"session-{number}-{session}"
+            messages = [
+                {"role": "user" if index % 2 == 0 else "assistant", "content": MESSAGE, "timestamp": now}
+                for index in range(messages_per_session)
+            ]
+            conversations.append({
+                "session_id": session_id,
+                "user_id": user_id,
+                "messages": messages,
+                "created_at": now,
+                "updated_at": now - timedelta(minutes=rng.randrange(0, 10000))
+            })
+            for seq, start in enumerate(range(0, messages_per_session, bucket_size)):
+                buckets.append({
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "seq": seq,
+                    "start": start,
+                    "messages": messages[start:start + bucket_size]
+                })
+        if conversations:
+            database["conversations"].insert_many(conversations)
+        if buckets:
+            database["conversation_messages"].insert_many(buckets)
+
+        database["users"].insert_one({
+            "name": f"Usuario {number}",
+            "email": f"usuario{number}@example.com",
+            "role": "user",
+            "created_at": now
+        })
+        database["idempotency_keys"].insert_one({
+            "user_id": user_id,
+            "key": str(ObjectId()),
+            "status": "completed",
+            "expires_at": now + timedelta(days=1)
+        })
+        database["token_blacklist"].insert_one({
+            "jti": str(ObjectId()),
+            "expires_at": now + timedelta(days=1)
+        })
+
+        if number == users // 2:
+            sample = {
+                "user_id": user_id,
+                "session_id": conversations[0]["session_id"] if conversations else "session",
+                "goal_id": goals[0]["_id"] if goals else ObjectId(),
+                "email": f"usuario{number}@example.com"
+            }
+
+    database["post_processing_outbox"].insert_many([
+        {
+            "kind": "save_turn",
+            "key": f"user-{index}",
+            "payload": {},
+            "owner": "advisor",
+            "attempts": 1,
+            "available_at": now + timedelta(seconds=rng.randrange(-600, 600)),
+            "created_at": now
+        }
+        for index in range(max(1, users))
+    ])
+
+    return sample
+
+
+def query_shapes(sample, per_page=10):
+    """
+    Formas de consulta que emiten los servicios
+
+    Args:
+        sample (dict): Valores de ejemplo de seed()
+        per_page (int): Tamaño de página del listado de metas
+
+    Returns:
+        list: Consultas (name, collection, filter, sort, projection, limit, count)
+    """
+    user_id = sample["user_id"]
+    session_id = sample["session_id"]
+    shapes = []
+
+    for name, filters, use_cursor in QUERY_SHAPES:
+        for query in goal_list_queries(user_id, filters, use_cursor, per_page):
+            step = query.pop("step")
+            shapes.append(dict(
+                query,
+                name=f"metas: {name}" if step == "page" else f"metas: {name} ({step})",
+                collection="financial_goals"
+            ))
+            if step == "page" and not use_cursor:
+                shapes.append({
+                    "name": f"metas: {name} (total)",
+                    "collection": "financial_goals",
+                    "filter": query["filter"],
+                    "count": True
+                })
+
+    shapes.extend([
+        {
+            "name": "metas: detalle",
+            "collection": "financial_goals",
+            "filter": {"_id": sample["goal_id"], "user_id": user_id},
+            "limit": 1
+        },
+        {
+            "name": "conversaciones: carga de la sesión",
+            "collection": "conversations",
+            "filter": {"session_id": session_id, "user_id": user_id},
+            "limit": 1
+        },
+        {
+            "name": "conversaciones: buckets de la ventana",
+            "collection": "conversation_messages",
+            "filter": {"user_id": user_id, "session_id": session_id, "seq": {"$gte": 0, "$lte": 1}},
+            "sort": [("seq", 1)]
+        },
+        {
+            "name": "usuarios: login por email",
+            "collection": "users",
+            "filter": {"email": sample["email"]},
+            "limit": 1
+        },
+        {
+            "name": "tokens revocados: comprobación de jti",
+            "collection": "token_blacklist",
+            "filter": {"jti": str(ObjectId())},
+            "limit": 1
+        },
+        {
+            "name": "idempotencia: registro de la petición",
+            "collection": "idempotency_keys",
+            "filter": {"user_id": user_id, "key": str(ObjectId())},
+            "limit": 1
+        },
+        {
+            "name": "outbox: reclamar tarea",
+            "collection": "post_processing_outbox",
+            "filter": {"available_at": {"$lte": datetime.now()}},
+            "sort": [("available_at", 1)],
+            "limit": 1
+        },
+        {
+            "name": "outbox: tareas pendientes de una clave",
+            "collection": "post_processing_outbox",
+            "filter": {"key": "user-0", "status": {"$ne": "dead"}},
+            "count": True
+        },
+    ])
+    return shapes
+
+
+def explain(database, shape):
+    """
+    Ejecuta explain("executionStats") de una consulta
+
+    Returns:
+        dict: Resultado de explain
+    """
+    if shape.get("count"):
+        command = SON([("count", shape["collection"]), ("query", shape["filter"])])
+    else:
+        command = SON([("find", shape["collection"]), ("filter", shape["filter"])])
+        if shape.get("sort"):
+            command["sort"] = SON(shape["sort"])
+        if shape.get("projection"):
+            command["projection"] = shape["projection"]
+        if shape.get("limit"):
+            command["limit"] = shape["limit"]
+    return database.command("explain", command, verbosity="executionStats")
+
+
+def propose_index(query, sort):
+    """
+    Propone un índice compuesto para una consulta (igualdad, orden, rango)
+
+    Args:
+        query (dict): Filtro
+        sort (list): Orden [(campo, dirección)]
+
+    Returns:
+        list: Clave del índice [(campo, dirección)], o None si no aplica
+            (búsquedas $text, que necesitan un índice de texto)
+    """
+    if '$text' in query:
+        return None
+
+    equality = []
+    ranges = []
+    for field, condition in query.items():
+        if field.startswith('$'):
+            # $or/$and de la paginación por cursor: son condiciones sobre
+            # los campos del orden, que ya entran en la clave
+            continue
+        operators = condition.keys() if isinstance(condition, dict) else []
+        if any(operator.startswith('$') for operator in operators) and not {'$eq', '$in'} & set(operators):
+            ranges.append(field)
+        else:
+            equality.append(field)
+
+    keys = [(field, 1) for field in equality]
+    for field, direction in sort or []:
+        if isinstance(direction, int) and field not in dict(keys):
+            keys.append((field, direction))
+    for field in ranges:
+        if field not in dict(keys):
+            keys.append((field, 1))
+    return keys
+
+
+def covering_index(indexes, keys):
+    """
+    Busca un índice existente cuya clave empiece por keys
+
+    Args:
+        indexes (dict): index_information() de la colección
+        keys (list): Clave propuesta
+
+    Returns:
+        str: Nombre del índice, o None
+    """
+    for name, info in indexes.items():
+        if list(info["key"])[:len(keys)] == keys:
+            return name
+    return None
+
+
+def analyze(database, shape, max_ratio, slow_ms):
+    """
+    Explica una consulta y evalúa su plan
+
+    Returns:
+        dict: Estadísticas, etapas, problemas y propuesta de índice
+    """
+    result = explain(database, shape)
+    stats = result.get("executionStats", {})
+    plan = result["queryPlanner"]["winningPlan"]
+    stages = plan_stages(plan)
+
+    returned = stats.get("nReturned", 0)
+    docs_examined = stats.get("totalDocsExamined", 0)
+    millis = stats.get("executionTimeMillis", 0)
+
+    problems = plan_problems(plan)
+    # El conteo no devuelve documentos: solo importa que no los lea
+    expected = returned if not shape.get("count") else 0
+    if docs_examined > max_ratio * max(expected, 1):
+        problems.append(f"examina {docs_examined} documentos para devolver {returned}")
+    if millis > slow_ms:
+        problems.append(f"lenta ({millis} ms)")
+
+    proposal = None
+    if problems:
+        keys = propose_index(shape["filter"], shape.get("sort"))
+        if keys:
+            existing = covering_index(database[shape["collection"]].index_information(), keys)
+            proposal = {"keys": keys, "existing": existing}
+
+    return {
+        "shape": shape,
+        "returned": returned,
+        "docs_examined": docs_examined,
+        "keys_examined": stats.get("totalKeysExamined", 0),
+        "millis": millis,
+        "stages": stages,
+        "problems": problems,
+        "proposal": proposal
+    }
+
+
+def print_report(results):
+    """Muestra el informe, con las consultas problemáticas al final"""
+    print(f"{'':<6} {'consulta':<52} {'devueltos':>9} {'docs':>7} {'claves':>7} {'ms':>5}  plan")
+    for result in sorted(results, key=lambda result: (bool(result["problems"]), result["millis"])):
+        status = "FALLO" if result["problems"] else "ok"
+        print(
+            f"{status:<6} {result['shape']['name']:<52} {result['returned']:>9} "
+            f"{result['docs_examined']:>7} {result['keys_examined']:>7} {result['millis']:>5}  "
+            f"{' <- '.join(result['stages'])}"
+        )
+
+    flagged = [result for result in results if result["problems"]]
+    if not flagged:
+        return
+
+    print("\nÍndices propuestos:")
+    for result in flagged:
+        shape = result["shape"]
+        print(f"- {shape['name']}: {'; '.join(result['problems'])}")
+        proposal = result["proposal"]
+        if proposal is None:
+            print("    sin propuesta (revisar el índice de texto o la forma de la consulta)")
+        elif proposal["existing"]:
+            print(f"    el índice {proposal['existing']} ya tiene esa clave: revisar por qué el planificador no lo elige")
+        else:
+            print(f"    {shape['collection']}: IndexModel({proposal['keys']!r})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explica las consultas de los servicios y propone índices")
+    parser.add_argument("--database", default="financial_agent_index_advisor", help="Base de datos temporal")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--goals-per-user", type=int, default=50)
+    parser.add_argument("--sessions-per-user", type=int, default=3)
+    parser.add_argument("--messages-per-session", type=int, default=40)
+    parser.add_argument("--bucket-size", type=int, default=MESSAGE_BUCKET_SIZE)
+    parser.add_argument("--max-ratio", type=float, default=10,
+                        help="Máximo de documentos examinados por documento devuelto")
+    parser.add_argument("--slow-ms", type=int, default=100, help="Umbral de consulta lenta")
+    parser.add_argument("--keep", action="store_true", help="No eliminar la base de datos al terminar")
+    args = parser.parse_args()
+
+    if args.users < 1:
+        parser.error("--users debe ser al menos 1")
+    if args.database == MONGODB_DATABASE:
+        parser.error("--database no puede ser la base de datos de la aplicación: se elimina al empezar")
+
+    client = get_client()
+    try:
+        database = create_database(client, args.database)
+
+        started = time.perf_counter()
+        sample = seed(
+            database, args.users, args.goals_per_user, args.sessions_per_user,
+            args.messages_per_session, args.bucket_size
+        )
+        print(f"Datos generados en {time.perf_counter() - started:.1f}s ({args.users} usuarios)\n")
+
+        results = [
+            analyze(database, shape, args.max_ratio, args.slow_ms)
+            for shape in query_shapes(sample)
+        ]
+        print_report(results)
+    finally:
+        if not args.keep:
+            client.drop_database(args.database)
+
+    if any(result["problems"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
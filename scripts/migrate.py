@@ -0,0 +1,191 @@
+"""
+Migración del esquema de MongoDB: crea y reconcilia los índices
+
+Los modelos solo declaran sus índices (INDEXES); importar la aplicación no
+hace ninguna llamada a MongoDB. Este comando compara los índices declarados
+con los existentes y:
+
+- crea los que faltan,
+- cambia el TTL (expireAfterSeconds) con collMod sin reconstruir el índice,
+- reconstruye los que tienen otras opciones distintas (clave, unique...),
+- informa de los índices que no están declarados (y los elimina con
+  --drop-unknown).
+
+Debe ejecutarse en cada despliegue, antes de arrancar los workers:
+
+    python -m scripts.migrate
+    python -m scripts.migrate --dry-run
+    python -m scripts.migrate --drop-unknown
+"""
+import argparse
+import logging
+
+from models import blacklist, conversations, financial_goals, idempotency, outbox, session_leases, users
+
+logger = logging.getLogger(__name__)
+
+# Módulos de modelos con índices declarados
+MODEL_MODULES = [users, blacklist, financial_goals, conversations, idempotency, outbox, session_leases]
+
+# Opciones que se comparan entre el índice declarado y el existente
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "weights", "default_language")
+
+
+def declared_indexes():
+    """
+    Reúne los índices declarados por los modelos
+
+    Returns:
+        list: Tuplas (collection, [IndexModel])
+    """
+    return [
+        (collection, indexes)
+        for module in MODEL_MODULES
+        for collection, indexes in module.INDEXES.items()
+    ]
+
+
+def _is_text(info):
+    """Indica si un índice existente es de texto"""
+    return "_fts" in dict(info["key"])
+
+
+def _is_text_document(document):
+    """Indica si un índice declarado es de texto"""
+    return any(direction == "text" for direction in document["key"].values())
+
+
+def _same_key(existing, document):
+    """Compara la clave de un índice existente con la declarada"""
+    declared = list(document["key"].items())
+    if _is_text_document(document):
+        # Los campos de texto se guardan como _fts/_ftsx y se comparan a
+        # través de weights; el resto de la clave (prefijo) sí se compara
+        prefix = [(field, direction) for field, direction in declared if direction != "text"]
+        stored = [(field, direction) for field, direction in existing["key"] if field not in ("_fts", "_ftsx")]
+        return _is_text(existing) and stored == prefix
+    return list(existing["key"]) == declared
+
+
+def _same_options(existing, document):
+    """Compara las opciones (salvo el TTL) de un índice existente con las declaradas"""
+    for option in _COMPARED_OPTIONS:
+        declared = document.get(option)
+        if option == "weights" and declared is None and "weights" in existing:
+            # Índice de texto sin pesos declarados: todos los campos pesan 1
+            declared = {field: 1 for field, direction in document["key"].items() if direction == "text"}
+        if option == "default_language" and declared is None:
+            continue
+        if existing.get(option) != declared:
+            # unique=False equivale a no indicarlo
+            if not existing.get(option) and not declared:
+                continue
+            return False
+    return True
+
+
+def reconcile_collection(collection, indexes, dry_run=False, drop_unknown=False):
+    """
+    Reconcilia los índices de una colección
+
+    Args:
+        collection: Colección (LazyCollection)
+        indexes (list): IndexModel declarados
+        dry_run (bool): Solo informa de los cambios
+        drop_unknown (bool): Elimina los índices no declarados
+
+    Returns:
+        list: Acciones realizadas (o previstas con dry_run)
+    """
+    existing = collection.index_information()
+    actions = []
+    declared_names = {index.document["name"] for index in indexes}
+
+    for index in indexes:
+        document = index.document
+        name = document["name"]
+        current = existing.get(name)
+
+        if current is None:
+            # Solo puede haber un índice de texto por colección
+            replaced = [
+                other for other, info in existing.items()
+                if _is_text(info) and _is_text_document(document) and other not in declared_names
+            ]
+            for other in replaced:
+                actions.append(f"{collection.name}: eliminar {other} (reemplazado por {name})")
+                if not dry_run:
+                    collection.drop_index(other)
+                del existing[other]
+            actions.append(f"{collection.name}: crear {name}")
+            if not dry_run:
+                collection.create_indexes([index])
+            continue
+
+        if not _same_key(current, document) or not _same_options(current, document):
+            actions.append(f"{collection.name}: reconstruir {name}")
+            if not dry_run:
+                collection.drop_index(name)
+                collection.create_indexes([index])
+            continue
+
+        ttl = document.get("expireAfterSeconds")
+        if current.get("expireAfterSeconds") != ttl:
+            actions.append(f"{collection.name}: cambiar TTL de {name} a {ttl}")
+            if not dry_run:
+                if ttl is None:
+                    collection.drop_index(name)
+                    collection.create_indexes([index])
+                else:
+                    collection.database.command(
+                        "collMod",
+                        collection.name,
+                        index={"name": name, "expireAfterSeconds": ttl}
+                    )
+
+    for name in existing:
+        if name == "_id_" or name in declared_names:
+            continue
+        if drop_unknown:
+            actions.append(f"{collection.name}: eliminar {name}")
+            if not dry_run:
+                collection.drop_index(name)
+        else:
+            actions.append(f"{collection.name}: índice no declarado {name} (usar --drop-unknown para eliminarlo)")
+
+    return actions
+
+
+def migrate(dry_run=False, drop_unknown=False):
+    """
+    Reconcilia los índices de todas las colecciones
+
+    Args:
+        dry_run (bool): Solo informa de los cambios
+        drop_unknown (bool): Elimina los índices no declarados
+
+    Returns:
+        list: Acciones realizadas (o previstas con dry_run)
+    """
+    actions = []
+    for collection, indexes in declared_indexes():
+        actions.extend(reconcile_collection(collection, indexes, dry_run, drop_unknown))
+    return actions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea y reconcilia los índices de MongoDB")
+    parser.add_argument("--dry-run", action="store_true", help="Mostrar los cambios sin aplicarlos")
+    parser.add_argument("--drop-unknown", action="store_true", help="Eliminar los índices no declarados")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    actions = migrate(dry_run=args.dry_run, drop_unknown=args.drop_unknown)
+    for action in actions:
+        print(action)
+    if not actions:
+        print("Los índices ya están al día")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Convierte las conversaciones entre los formatos de CONVERSATION_STORAGE
+
+    python -m scripts.migrate_conversations                  # embedded -> bucketed
+    python -m scripts.migrate_conversations --dry-run
+    python -m scripts.migrate_conversations --to embedded    # volver atrás
+
+Se puede ejecutar con el servicio en marcha y repetir sin riesgo:
+
+- embedded -> bucketed: los buckets se escriben con upsert y el array
+  "messages" solo se elimina si no cambió durante la conversión. Conviene
+  activar CONVERSATION_STORAGE=bucketed antes, ya que ese formato lee y
+  convierte por sí mismo las conversaciones que aún no se migraron.
+- bucketed -> embedded: requiere volver antes a CONVERSATION_STORAGE=embedded
+  y parar los workers con el formato bucketed, que seguirían escribiendo
+  en los buckets.
+
+Los buckets tienen siempre MESSAGE_BUCKET_SIZE mensajes, el mismo tamaño
+con el que los servicios añaden y leen mensajes.
+"""
+import argparse
+import time
+
+from config.settings import MESSAGE_BUCKET_SIZE
+from models.conversations import BUCKETED, BucketedConversationStore, ConversationMessages
+from models.financial_goals import Conversation
+
+
+def to_bucketed(store, dry_run=False, limit=0):
+    """
+    Convierte las conversaciones con array "messages" al formato por buckets
+
+    Returns:
+        tuple: (conversaciones, mensajes)
+    """
+    conversations = messages = 0
+    cursor = Conversation.find({"messages": {"$exists": True}}, batch_size=100).limit(limit)
+    for conversation in cursor:
+        conversations += 1
+        messages += len(conversation.get('messages', []))
+        if not dry_run:
+            store.convert(conversation)
+    return conversations, messages
+
+
+def to_embedded(store, dry_run=False, limit=0):
+    """
+    Devuelve las conversaciones por buckets al array "messages"
+
+    Returns:
+        tuple: (conversaciones, mensajes)
+    """
+    conversations = messages = 0
+    cursor = Conversation.find({"storage": BUCKETED}, {"session_id": 1, "user_id": 1}).limit(limit)
+    for header in cursor:
+        conversation = store.load_conversation(header['session_id'], header['user_id'])
+        if conversation is None or 'messages' not in conversation:
+            continue
+        conversations += 1
+        messages += len(conversation['messages'])
+        if dry_run:
+            continue
+
+        result = Conversation.update_one(
+            {"_id": header['_id'], "storage": BUCKETED, "message_count": len(conversation['messages'])},
+            {
+                "$set": {"messages": conversation['messages']},
+                "$unset": {"message_count": "", "last_turn_id": "", "storage": ""}
+            }
+        )
+        if result.modified_count:
+            ConversationMessages.delete_many({"user_id": header['user_id'], "session_id": header['session_id']})
+        else:
+            print(f"Conversación {header['_id']} modificada durante la migración; vuelve a ejecutar el comando")
+    return conversations, messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra las conversaciones entre formatos de almacenamiento")
+    parser.add_argument("--to", choices=["bucketed", "embedded"], default="bucketed")
+    parser.add_argument("--limit", type=int, default=0, help="Máximo de conversaciones (0 = todas)")
+    parser.add_argument("--dry-run", action="store_true", help="Contar sin modificar nada")
+    args = parser.parse_args()
+
+    # Siempre el tamaño de los servicios: el store calcula el bucket de cada
+    # mensaje con MESSAGE_BUCKET_SIZE, y otro tamaño descolocaría los mensajes
+    store = BucketedConversationStore(Conversation, ConversationMessages, MESSAGE_BUCKET_SIZE)
+    migrate = to_bucketed if args.to == "bucketed" else to_embedded
+
+    started = time.perf_counter()
+    conversations, messages = migrate(store, dry_run=args.dry_run, limit=args.limit)
+    action = "Se migrarían" if args.dry_run else "Migradas"
+    print(
+        f"{action} {conversations} conversaciones ({messages} mensajes) a {args.to} "
+        f"en {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
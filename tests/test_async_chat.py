@@ -0,0 +1,24 @@
+import asyncio
+import threading
+
+from api.financial_agent import services
+from api.financial_agent.services import FinancialAgentService
+
+
+def test_response_cache_lookup_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def cached_response(params):
+        threads.append(threading.current_thread())
+        return "respuesta", False, None
+
+    monkeypatch.setattr(services, "get_cached_response", cached_response)
+    conversation = {"session_id": "session", "user_id": "user", "messages": []}
+
+    async def call():
+        return threading.current_thread(), await FinancialAgentService._call_deepseek_async("hola", conversation)
+
+    loop_thread, result = asyncio.run(call())
+
+    assert result == ("respuesta", False, None)
+    assert threads and threads[0] is not loop_thread
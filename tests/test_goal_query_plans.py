@@ -0,0 +1,72 @@
+"""
+Planes de las consultas de GET /goals: ninguna forma debe recorrer la
+colección entera ni ordenar en memoria.
+
+Usa la misma base de datos de prueba que scripts/index_advisor.py (índices
+declarados y datos generados). Necesita un MongoDB accesible en MONGODB_URI;
+si no lo hay se omiten.
+"""
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from config.settings import MONGODB_URI
+from scripts.check_goal_queries import QUERY_SHAPES, goal_list_queries, plan_problems, plan_stages
+from scripts.index_advisor import create_database, explain, seed
+
+TEST_DATABASE = "financial_agent_test_goal_queries"
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"MongoDB no disponible: {e}")
+
+    database = create_database(client, TEST_DATABASE)
+    sample = seed(database, users=20, goals_per_user=30, sessions_per_user=1,
+                  messages_per_session=4, bucket_size=50)
+    yield database, sample
+    client.drop_database(TEST_DATABASE)
+    client.close()
+
+
+@pytest.mark.parametrize(
+    "filters,use_cursor",
+    [(filters, use_cursor) for _, filters, use_cursor in QUERY_SHAPES],
+    ids=[name for name, _, _ in QUERY_SHAPES]
+)
+def test_goal_query_uses_index(seeded, filters, use_cursor):
+    database, sample = seeded
+    for query in goal_list_queries(sample["user_id"], filters, use_cursor):
+        result = explain(database, dict(query, collection="financial_goals"))
+
+        plan = result["queryPlanner"]["winningPlan"]
+        assert plan_problems(plan) == [], f"{query['step']}: {' <- '.join(plan_stages(plan))}"
+
+
+def test_plan_problems_allows_only_relevance_sort():
+    text_sort = {
+        "stage": "SORT",
+        "sortPattern": {"score": {"$meta": "textScore"}, "_id": -1},
+        "inputStage": {"stage": "TEXT_MATCH", "inputStage": {"stage": "FETCH"}}
+    }
+    id_sort = dict(text_sort, sortPattern={"_id": -1})
+
+    assert plan_problems(text_sort) == []
+    assert plan_problems(id_sort) == ["ordena en memoria (SORT {'_id': -1})"]
+    assert plan_problems({"stage": "LIMIT", "inputStage": {"stage": "COLLSCAN"}}) == [
+        "recorre la colección entera (COLLSCAN)"
+    ]
+
+
+def test_cursor_search_pages_in_id_order_over_matching_ids():
+    queries = goal_list_queries("user-1", {"search": "viaje"}, True)
+
+    assert [query["step"] for query in queries] == ["ids", "page"]
+    assert "$text" in queries[0]["filter"] and "sort" not in queries[0]
+    assert "$text" not in queries[1]["filter"] and "$in" in queries[1]["filter"]["_id"]
+    assert queries[1]["sort"] == [("_id", -1)]
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from utils.resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+
+
+def _bad_request():
+    request = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+    response = httpx.Response(400, request=request)
+    return openai.BadRequestError("bad request", response=response, body=None)
+
+
+def _half_open_policy():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return ResiliencePolicy(attempts=1, breaker=breaker)
+
+
+def test_non_retryable_error_in_half_open_releases_probe():
+    policy = _half_open_policy()
+
+    def fail(timeout):
+        raise _bad_request()
+
+    with pytest.raises(openai.BadRequestError):
+        policy.call(fail)
+
+    # La siguiente llamada vuelve a ser la de prueba y cierra el circuito
+    assert policy.call(lambda timeout: "ok") == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_error_in_half_open_releases_probe_async():
+    policy = _half_open_policy()
+
+    async def fail(timeout):
+        raise _bad_request()
+
+    async def succeed(timeout):
+        return "ok"
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(policy.call_async(fail))
+
+    assert asyncio.run(policy.call_async(succeed)) == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_in_flight_rejects_other_calls():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_hedge_delay_uses_latencies_of_the_same_call_kind():
+    policy = ResiliencePolicy(hedge_enabled=True, hedge_min_delay=0, hedge_min_samples=3)
+
+    for _ in range(3):
+        policy.call(lambda timeout: "opened", hedge=False, latency_key="strong:stream_open")
+    assert policy._hedge_delay(policy._latencies("strong:completion")) is None
+
+    def slow(timeout):
+        time.sleep(0.02)
+        return "ok"
+
+    for _ in range(3):
+        policy.call(slow, latency_key="strong:completion")
+    assert policy._hedge_delay(policy._latencies("strong:completion")) >= 0.02
+    assert policy.hedges == 0
+    assert set(policy.stats()["latency_p95"]) == {"strong:stream_open", "strong:completion"}
@@ -0,0 +1,74 @@
+import time
+
+from api.financial_agent import post_processing, session_lock
+
+
+def test_heartbeat_renews_lease_until_stopped(monkeypatch):
+    renewals = []
+
+    def renew(lease_id, owner, ttl):
+        renewals.append((lease_id, owner, ttl))
+        return True
+
+    monkeypatch.setattr(session_lock, "renew_lease", renew)
+    heartbeat = session_lock.LeaseHeartbeat("user:session", "owner", ttl=0.03)
+    time.sleep(0.1)
+    heartbeat.stop()
+    renewed = len(renewals)
+
+    assert renewed >= 2
+    assert renewals[0] == ("user:session", "owner", 0.03)
+    time.sleep(0.05)
+    assert len(renewals) == renewed
+
+
+def test_heartbeat_stops_when_lease_is_lost(monkeypatch):
+    renewals = []
+
+    def renew(lease_id, owner, ttl):
+        renewals.append(owner)
+        return False
+
+    monkeypatch.setattr(session_lock, "renew_lease", renew)
+    heartbeat = session_lock.LeaseHeartbeat("user:session", "owner", ttl=0.03)
+    time.sleep(0.1)
+
+    assert renewals == ["owner"]
+    assert not heartbeat._thread.is_alive()
+
+
+class _Heartbeat:
+    def __init__(self, events):
+        self.events = events
+
+    def stop(self):
+        self.events.append("heartbeat stopped")
+
+
+def test_memory_mode_releases_lease_after_turn_writes(monkeypatch):
+    events = []
+
+    def save(payload):
+        time.sleep(0.05)
+        events.append("turn saved")
+
+    monkeypatch.setattr(session_lock, "POST_PROCESSING_MODE", "memory")
+    monkeypatch.setattr(session_lock, "release_lease", lambda lease_id, owner: events.append("released"))
+    post_processing.register_handler("test_save", save)
+
+    post_processing.submit_task("test_save", {}, "user-lease")
+    session_lock._end_turn("user-lease", "user-lease:session", "owner", _Heartbeat(events))
+    assert events == []
+
+    post_processing.wait_for_user("user-lease")
+    assert events == ["turn saved", "heartbeat stopped", "released"]
+
+
+def test_outbox_mode_releases_lease_immediately(monkeypatch):
+    events = []
+
+    monkeypatch.setattr(session_lock, "POST_PROCESSING_MODE", "outbox")
+    monkeypatch.setattr(session_lock, "release_lease", lambda lease_id, owner: events.append("released"))
+
+    session_lock._end_turn("user-lease", "user-lease:session", "owner", _Heartbeat(events))
+    assert events == ["heartbeat stopped", "released"]
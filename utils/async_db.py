@@ -0,0 +1,48 @@
+"""
+Acceso a MongoDB desde código asíncrono
+
+pymongo es bloqueante, así que en modo ASGI las operaciones se ejecutan
+en un pool de hilos dedicado para no bloquear el event loop. Lo mismo vale
+para las cachés, cuyo backend puede ser remoto (Redis). Las llamadas
+a MongoDB son cortas; lo que debe escalar a cientos de peticiones
+simultáneas son las llamadas al LLM, que ya son asíncronas.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import ASYNC_DB_MAX_WORKERS
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Obtiene (o crea) el pool de hilos para MongoDB"""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=ASYNC_DB_MAX_WORKERS,
+                    thread_name_prefix="mongo"
+                )
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Ejecuta una función bloqueante de acceso a datos sin bloquear el event loop
+
+    Args:
+        func (callable): Función a ejecutar
+        *args: Argumentos posicionales
+        **kwargs: Argumentos con nombre
+
+    Returns:
+        Resultado de la función
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
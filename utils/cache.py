@@ -0,0 +1,198 @@
+"""
+Backends de caché con expulsión LRU y expiración por TTL
+
+CacheBackend define la interfaz; InMemoryCache es la implementación en
+proceso y RedisCache la compartida entre workers e instancias. Otro backend
+solo necesita implementar get/set/delete/clear y registrarse en
+CACHE_BACKENDS.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from bson import json_util
+
+from config.settings import CACHE_REDIS_URL, CACHE_REDIS_TIMEOUT
+
+
+class CacheBackend:
+    """Interfaz común de los backends de caché"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Obtiene un valor
+
+        Args:
+            key (str): Clave
+
+        Returns:
+            Valor almacenado o None si no existe o expiró
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """
+        Guarda un valor
+
+        Args:
+            key (str): Clave
+            value: Valor
+            ttl (float): Segundos de vida (None usa el TTL por defecto)
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Elimina una clave"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Elimina todas las claves"""
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Contadores de uso de la caché
+
+        Returns:
+            dict: hits, misses, evictions, expirations y hit_ratio
+        """
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    def _count(self, counter, amount=1):
+        """Incrementa un contador de forma segura entre hilos"""
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+
+class InMemoryCache(CacheBackend):
+    """Caché en proceso con tamaño máximo (LRU) y TTL"""
+
+    def __init__(self, max_entries=1000, ttl=3600):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+                self._count("expirations")
+            if entry is None:
+                self._count("misses")
+                return None
+            self._entries.move_to_end(key)
+        self._count("hits")
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._count("evictions")
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """
+    Caché compartida en Redis
+
+    Los valores se serializan como Extended JSON (admite datetime y
+    ObjectId, y no ejecuta código al leer, a diferencia de pickle). El TTL
+    lo aplica Redis; el tamaño lo limita la política de memoria del servidor
+    (maxmemory con allkeys-lru), por lo que max_entries no se usa. Todas las
+    cachés de la aplicación comparten el prefijo de claves, y clear() las
+    vacía todas. Las operaciones fallan (redis.RedisError) tras timeout
+    segundos si Redis no responde; los usuarios de la caché deben tratar
+    ese error como un fallo de caché.
+
+    Necesita el paquete redis.
+    """
+
+    def __init__(self, max_entries=None, ttl=3600, url=None, prefix="financial-agent:",
+                 timeout=CACHE_REDIS_TIMEOUT):
+        super().__init__()
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        # Un Redis bloqueado no debe retener los hilos de las peticiones
+        self._client = redis.Redis.from_url(
+            url or CACHE_REDIS_URL,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout
+        )
+
+    def get(self, key):
+        payload = self._client.get(self.prefix + key)
+        if payload is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json_util.loads(payload)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._client.set(self.prefix + key, json_util.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + "*", count=500):
+            self._client.delete(key)
+
+
+# Backends disponibles por nombre (configurables desde settings)
+CACHE_BACKENDS = {
+    "memory": InMemoryCache,
+    "redis": RedisCache
+}
+
+
+def create_cache_backend(name, **options):
+    """
+    Crea un backend de caché por nombre
+
+    Args:
+        name (str): Nombre del backend registrado en CACHE_BACKENDS
+        **options: Opciones del backend (max_entries, ttl, ...)
+
+    Returns:
+        CacheBackend: Backend creado
+    """
+    if name not in CACHE_BACKENDS:
+        raise ValueError(f"Backend de caché desconocido: {name}")
+    return CACHE_BACKENDS[name](**options)
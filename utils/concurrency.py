@@ -0,0 +1,163 @@
+"""
+Primitivas de concurrencia en proceso
+
+- KeyedLock / AsyncKeyedLock: exclusión mutua por clave, en orden de llegada.
+- SingleFlight / AsyncSingleFlight: las llamadas idénticas que coinciden en
+  el tiempo se resuelven con una sola ejecución y comparten el resultado.
+"""
+import asyncio
+import copy
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+
+class KeyedLock:
+    """Lock por clave que atiende a los hilos en orden de llegada (FIFO)"""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._entries = {}
+
+    @contextmanager
+    def hold(self, key):
+        """
+        Adquiere el lock de una clave
+
+        Args:
+            key (hashable): Clave a serializar
+        """
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"condition": threading.Condition(self._mutex), "next": 0, "serving": 0}
+                self._entries[key] = entry
+            ticket = entry["next"]
+            entry["next"] += 1
+            while entry["serving"] != ticket:
+                entry["condition"].wait()
+
+        try:
+            yield
+        finally:
+            with self._mutex:
+                entry["serving"] += 1
+                if entry["serving"] == entry["next"]:
+                    # Nadie más espera: liberar la entrada
+                    del self._entries[key]
+                else:
+                    entry["condition"].notify_all()
+
+
+class AsyncKeyedLock:
+    """Lock por clave para corrutinas (asyncio.Lock ya es FIFO)"""
+
+    def __init__(self):
+        self._entries = {}
+
+    @asynccontextmanager
+    async def hold(self, key):
+        """
+        Adquiere el lock de una clave
+
+        Args:
+            key (hashable): Clave a serializar
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = {"lock": asyncio.Lock(), "users": 0}
+        entry["users"] += 1
+        try:
+            async with entry["lock"]:
+                yield
+        finally:
+            entry["users"] -= 1
+            if entry["users"] == 0:
+                del self._entries[key]
+
+
+class _Call:
+    """Llamada en curso compartida por SingleFlight"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Agrupa llamadas idénticas simultáneas en una sola ejecución"""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """
+        Ejecuta func, o espera el resultado de una ejecución en curso con la misma clave
+
+        Args:
+            key (hashable): Identificador de la llamada
+            func (callable): Función sin argumentos
+
+        Returns:
+            Resultado de func (una copia para cada llamador: el resultado
+            compartido no se modifica mientras otros lo copian)
+        """
+        with self._mutex:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = func()
+            return copy.deepcopy(call.result)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._mutex:
+                del self._calls[key]
+            call.event.set()
+
+
+class AsyncSingleFlight:
+    """Variante de SingleFlight para corrutinas"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        """
+        Ejecuta la corrutina func(), o espera una ejecución en curso con la misma clave
+
+        Args:
+            key (hashable): Identificador de la llamada
+            func (callable): Función sin argumentos que devuelve una corrutina
+
+        Returns:
+            Resultado de func (una copia para cada llamador)
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            return copy.deepcopy(await asyncio.shield(future))
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+            future.set_result(result)
+            return copy.deepcopy(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # Evitar el aviso de excepción no recuperada si nadie esperaba
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
@@ -0,0 +1,155 @@
+"""
+Caché de lectura de las metas financieras por usuario
+
+Guarda el detalle de cada meta y cada página del listado (con sus filtros y
+paginación) de un usuario. Las claves incluyen una generación por usuario
+("goals:<user_id>:gen"), y guardar una meta elimina esa generación: las
+entradas anteriores dejan de ser alcanzables y expiran o salen por LRU, sin
+tener que buscarlas una a una (algo que un backend compartido no permite de
+forma eficiente).
+
+La generación es un valor aleatorio y se lee antes de consultar MongoDB, de
+modo que una lectura que empezó antes de una escritura guarda su resultado
+bajo una generación ya invalidada y nunca se sirve. Si la generación se
+pierde (TTL o expulsión) se crea otra nueva, con el mismo efecto que una
+invalidación.
+
+Está desactivada por defecto (GOAL_CACHE_ENABLED). Con varios workers el
+backend debe ser compartido (GOAL_CACHE_BACKEND=redis) para que la
+invalidación llegue a todos.
+
+Un fallo del backend (p. ej. Redis caído) nunca hace fallar la petición:
+las lecturas van directamente a MongoDB y las invalidaciones se omiten
+(las entradas caducan con GOAL_CACHE_TTL).
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import uuid
+
+from config.settings import (
+    GOAL_CACHE_ENABLED,
+    GOAL_CACHE_BACKEND,
+    GOAL_CACHE_MAX_ENTRIES,
+    GOAL_CACHE_TTL
+)
+from utils.cache import create_cache_backend
+from utils.metrics import observe_goal_cache_invalidation, observe_goal_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_goal_cache():
+    """
+    Obtiene la caché de metas del proceso
+
+    Returns:
+        CacheBackend: Caché configurada, o None si está desactivada
+    """
+    global _cache
+
+    if not GOAL_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache_backend(
+                    GOAL_CACHE_BACKEND,
+                    max_entries=GOAL_CACHE_MAX_ENTRIES,
+                    ttl=GOAL_CACHE_TTL
+                )
+    return _cache
+
+
+def _generation_key(user_id):
+    return f"goals:{user_id}:gen"
+
+
+def _generation(cache, user_id):
+    """Generación actual de las metas de un usuario (la crea si no existe)"""
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.set(key, generation)
+    return generation
+
+
+def build_list_key(params):
+    """
+    Calcula la clave de una página del listado
+
+    Args:
+        params (dict): Paginación y filtros de la consulta
+
+    Returns:
+        str: Hash de los parámetros
+    """
+    serialized = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def cached_goal_read(kind, user_id, key, loader):
+    """
+    Lee un valor de la caché o lo carga de MongoDB y lo guarda
+
+    Args:
+        kind (str): Tipo de lectura (detail, list)
+        user_id (str): ID del usuario
+        key (str): Clave de la lectura dentro del usuario
+        loader (callable): Función que carga el valor; None no se guarda
+
+    Returns:
+        Valor leído
+    """
+    cache = get_goal_cache()
+    if cache is None:
+        return loader()
+
+    try:
+        cache_key = f"goals:{user_id}:{_generation(cache, user_id)}:{kind}:{key}"
+        cached = cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Caché de metas no disponible, leyendo de MongoDB: {str(e)}")
+        return loader()
+
+    observe_goal_cache_lookup(kind, cached is not None)
+    if cached is not None:
+        # El llamador puede modificar el resultado; devolver una copia
+        return copy.deepcopy(cached)
+
+    value = loader()
+    if value is not None:
+        try:
+            cache.set(cache_key, copy.deepcopy(value))
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en la caché de metas: {str(e)}")
+    return value
+
+
+def invalidate_user_goals(user_id):
+    """
+    Invalida todas las lecturas en caché de las metas de un usuario
+
+    Se llama después de escribir en MongoDB. Si el backend falla solo se
+    registra el error: las entradas del usuario caducan con GOAL_CACHE_TTL.
+
+    Args:
+        user_id (str): ID del usuario
+    """
+    cache = get_goal_cache()
+    if cache is None:
+        return
+    try:
+        cache.delete(_generation_key(user_id))
+    except Exception as e:
+        # La escritura en MongoDB ya está hecha: no reintentar la tarea por esto
+        logger.warning(f"No se pudo invalidar la caché de metas del usuario {user_id}: {str(e)}")
+        return
+    observe_goal_cache_invalidation()
+    logger.debug(f"Caché de metas del usuario {user_id} invalidada")
@@ -0,0 +1,225 @@
+"""
+Extracción del bloque META_FINANCIERA_JSON de las respuestas del modelo
+
+Recorre el texto una sola vez: localiza el marcador, salta lo que haya
+entre el marcador y la primera llave (p. ej. ```json) y balancea llaves
+respetando cadenas JSON, de modo que llaves dentro de cadenas u objetos
+anidados no cortan el JSON antes de tiempo. El coste es lineal incluso
+con respuestas largas sin llave de cierre.
+
+GoalStreamExtractor funciona de forma incremental sobre un stream de
+tokens y devuelve el texto que se puede mostrar al usuario a medida que
+llega; extract_financial_goal es la variante para un texto completo.
+"""
+import json
+import re
+
+GOAL_MARKER = "META_FINANCIERA_JSON:"
+
+# Caracteres relevantes para balancear llaves dentro del JSON
+_JSON_SPECIAL = re.compile(r'[{}"\\]')
+# Caracteres que se saltan entre el JSON y el texto posterior
+_SUFFIX_CHARS = ' \t\r\n`'
+# Líneas vacías que quedan al eliminar el bloque JSON
+_BLANK_LINES = re.compile(r'\n\s*\n')
+
+# Estados del extractor
+_TEXT = 0      # Texto normal, buscando el marcador
+_PREFIX = 1    # Después del marcador, buscando la llave de apertura
+_JSON = 2      # Dentro del objeto JSON
+_SUFFIX = 3    # Después del JSON, saltando espacios y cierre de ```
+_TAIL = 4      # Texto posterior al bloque JSON
+
+
+class GoalStreamExtractor:
+    """
+    Extractor incremental de la meta financiera
+
+    Uso:
+        extractor = GoalStreamExtractor()
+        for chunk in stream:
+            visible = extractor.feed(chunk)
+        visible = extractor.finish()
+        extractor.goal, extractor.cleaned_text
+    """
+
+    def __init__(self):
+        self._state = _TEXT
+        self._raw = []
+        self._visible = []
+        # Posible inicio parcial del marcador retenido entre fragmentos
+        self._pending = ''
+        self._json = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._suffix_newline = False
+        self._finished = False
+        self.goal = None
+        self.cleaned_text = None
+
+    @property
+    def marker_found(self):
+        """True si ya apareció el marcador en el stream"""
+        return self._state != _TEXT
+
+    def feed(self, chunk):
+        """
+        Procesa un fragmento del stream
+
+        Args:
+            chunk (str): Fragmento de texto
+
+        Returns:
+            str: Texto que se puede mostrar al usuario
+        """
+        if not chunk:
+            return ''
+        self._raw.append(chunk)
+
+        visible = []
+        text = chunk
+        while text:
+            if self._state == _TEXT:
+                text = self._feed_text(text, visible)
+            elif self._state == _PREFIX:
+                text = self._feed_prefix(text)
+            elif self._state == _JSON:
+                text = self._feed_json(text)
+            elif self._state == _SUFFIX:
+                text = self._feed_suffix(text)
+            else:
+                visible.append(text)
+                text = ''
+
+        result = ''.join(visible)
+        self._visible.append(result)
+        return result
+
+    def finish(self):
+        """
+        Finaliza el stream y calcula la meta y el texto limpio
+
+        Returns:
+            str: Texto retenido que aún no se había mostrado
+        """
+        if self._finished:
+            return ''
+        self._finished = True
+
+        remaining = ''
+        if self._state == _TEXT and self._pending:
+            remaining = self._pending
+            self._pending = ''
+            self._visible.append(remaining)
+
+        raw_text = ''.join(self._raw)
+        if self.goal is not None:
+            cleaned = ''.join(self._visible)
+            self.cleaned_text = _BLANK_LINES.sub('\n\n', cleaned).strip()
+        else:
+            self.cleaned_text = raw_text
+
+        return remaining
+
+    def _feed_text(self, text, visible):
+        """Busca el marcador reteniendo un posible inicio parcial"""
+        text = self._pending + text
+        self._pending = ''
+
+        index = text.find(GOAL_MARKER)
+        if index >= 0:
+            visible.append(text[:index])
+            self._state = _PREFIX
+            return text[index + len(GOAL_MARKER):]
+
+        # Retener el sufijo más largo que pueda ser el inicio del marcador
+        for size in range(min(len(GOAL_MARKER) - 1, len(text)), 0, -1):
+            if GOAL_MARKER.startswith(text[-size:]):
+                self._pending = text[-size:]
+                text = text[:-size]
+                break
+
+        visible.append(text)
+        return ''
+
+    def _feed_prefix(self, text):
+        """Salta lo que haya entre el marcador y la llave de apertura"""
+        index = text.find('{')
+        if index < 0:
+            return ''
+        self._state = _JSON
+        self._depth = 0
+        return text[index:]
+
+    def _feed_json(self, text):
+        """Balancea llaves hasta cerrar el objeto JSON"""
+        skip_until = 0
+        if self._escape:
+            # El carácter escapado quedó al inicio de este fragmento
+            self._escape = False
+            skip_until = 1
+
+        for match in _JSON_SPECIAL.finditer(text):
+            position = match.start()
+            if position < skip_until:
+                continue
+            char = match.group()
+
+            if self._in_string:
+                if char == '\\':
+                    if position + 1 >= len(text):
+                        self._escape = True
+                    skip_until = position + 2
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._json.append(text[:position + 1])
+                    self._close_json()
+                    return text[position + 1:]
+
+        self._json.append(text)
+        return ''
+
+    def _close_json(self):
+        """Intenta interpretar el objeto JSON completo"""
+        self._state = _SUFFIX
+        try:
+            goal = json.loads(''.join(self._json))
+        except json.JSONDecodeError:
+            goal = None
+        self.goal = goal if isinstance(goal, dict) else None
+
+    def _feed_suffix(self, text):
+        """Salta espacios y el cierre de bloque de código tras el JSON"""
+        stripped = text.lstrip(_SUFFIX_CHARS)
+        if '\n' in text[:len(text) - len(stripped)]:
+            self._suffix_newline = True
+        if not stripped:
+            return ''
+        self._state = _TAIL
+        # Separar el texto posterior del anterior al marcador
+        return ('\n' if self._suffix_newline else ' ') + stripped
+
+
+def extract_financial_goal(text):
+    """
+    Extrae la meta financiera de una respuesta completa
+
+    Args:
+        text (str): Respuesta del modelo
+
+    Returns:
+        tuple: (financial_goal, cleaned_text). financial_goal es None si no
+            hay un JSON válido; en ese caso cleaned_text es el texto original.
+    """
+    extractor = GoalStreamExtractor()
+    extractor.feed(text or '')
+    extractor.finish()
+    return extractor.goal, extractor.cleaned_text
@@ -0,0 +1,82 @@
+"""
+Backends LLM compatibles con la API de OpenAI
+
+Un backend define el endpoint, la API key y el modelo que usa el agente.
+Se selecciona con LLM_BACKEND:
+
+- deepseek: la API de Deepseek (por defecto).
+- fake: servidor local de benchmarks/fake_llm_server.py, para medir el
+  throughput del servicio sin depender del proveedor.
+- openai_compatible: cualquier otro servidor compatible (vLLM, Ollama, ...)
+  configurado con LLM_BASE_URL, LLM_API_KEY y LLM_MODEL.
+
+Para añadir un proveedor basta con registrarlo en LLM_BACKENDS.
+"""
+import threading
+
+from config.settings import (
+    LLM_BACKEND,
+    DEEPSEEK_API_KEY,
+    DEEPSEEK_BASE_URL,
+    DEEPSEEK_MODEL,
+    FAKE_LLM_BASE_URL,
+    FAKE_LLM_MODEL,
+    LLM_BASE_URL,
+    LLM_API_KEY,
+    LLM_MODEL
+)
+
+
+class LLMBackend:
+    """Endpoint compatible con OpenAI al que se envían las peticiones"""
+
+    def __init__(self, name, base_url, api_key, model):
+        self.name = name
+        self.base_url = base_url
+        # El SDK exige una API key aunque el servidor no la valide
+        self.api_key = api_key or "not-needed"
+        self.model = model
+
+    def __repr__(self):
+        return f"LLMBackend(name={self.name!r}, base_url={self.base_url!r}, model={self.model!r})"
+
+
+LLM_BACKENDS = {
+    "deepseek": lambda: LLMBackend("deepseek", DEEPSEEK_BASE_URL, DEEPSEEK_API_KEY, DEEPSEEK_MODEL),
+    "fake": lambda: LLMBackend("fake", FAKE_LLM_BASE_URL, None, FAKE_LLM_MODEL),
+    "openai_compatible": lambda: LLMBackend("openai_compatible", LLM_BASE_URL, LLM_API_KEY, LLM_MODEL)
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_llm_backend(name):
+    """
+    Crea un backend LLM por nombre
+
+    Args:
+        name (str): Nombre del backend registrado en LLM_BACKENDS
+
+    Returns:
+        LLMBackend: Backend creado
+    """
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Backend LLM desconocido: {name}")
+    return LLM_BACKENDS[name]()
+
+
+def get_llm_backend():
+    """
+    Obtiene el backend configurado con LLM_BACKEND
+
+    Returns:
+        LLMBackend: Backend del proceso
+    """
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_llm_backend(LLM_BACKEND)
+    return _backend
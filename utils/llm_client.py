@@ -0,0 +1,150 @@
+"""
+Cliente compartido para el backend LLM (compatible con OpenAI)
+
+Cada proceso mantiene un único cliente con su pool de conexiones HTTP,
+de modo que las conexiones TLS se reutilizan entre turnos de chat.
+"""
+import logging
+import os
+import threading
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from config.settings import (
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_MAX_RETRIES
+)
+from utils.llm_backends import get_llm_backend
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+_async_client = None
+_async_client_pid = None
+
+
+def _pool_limits():
+    """Límites del pool de conexiones HTTP"""
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeouts():
+    """Timeouts de las peticiones HTTP"""
+    return httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+def _create_client():
+    """
+    Crea un cliente OpenAI con un pool de conexiones configurado
+
+    Returns:
+        OpenAI: Cliente configurado para el backend de LLM_BACKEND
+    """
+    backend = get_llm_backend()
+    http_client = httpx.Client(limits=_pool_limits(), timeout=_timeouts())
+    return OpenAI(
+        api_key=backend.api_key,
+        base_url=backend.base_url,
+        max_retries=LLM_MAX_RETRIES,
+        http_client=http_client
+    )
+
+
+def get_llm_client():
+    """
+    Obtiene el cliente compartido del proceso, creándolo la primera vez
+
+    El cliente se vuelve a crear si el proceso cambió (fork de gunicorn),
+    ya que las conexiones abiertas no se pueden compartir entre procesos.
+
+    Returns:
+        OpenAI: Cliente compartido
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = _create_client()
+                _client_pid = pid
+                logger.info(f"Cliente LLM ({get_llm_backend().name}) inicializado para el proceso {pid}")
+    return _client
+
+
+def get_async_llm_client():
+    """
+    Obtiene el cliente asíncrono compartido del proceso (modo ASGI)
+
+    Debe usarse siempre desde el mismo event loop, que en un worker ASGI
+    es único por proceso.
+
+    Returns:
+        AsyncOpenAI: Cliente asíncrono compartido
+    """
+    global _async_client, _async_client_pid
+
+    pid = os.getpid()
+    if _async_client is None or _async_client_pid != pid:
+        backend = get_llm_backend()
+        http_client = httpx.AsyncClient(limits=_pool_limits(), timeout=_timeouts())
+        _async_client = AsyncOpenAI(
+            api_key=backend.api_key,
+            base_url=backend.base_url,
+            max_retries=LLM_MAX_RETRIES,
+            http_client=http_client
+        )
+        _async_client_pid = pid
+        logger.info(f"Cliente LLM asíncrono inicializado para el proceso {pid}")
+    return _async_client
+
+
+async def close_async_llm_client():
+    """
+    Cierra el cliente asíncrono compartido y libera sus conexiones
+    """
+    global _async_client, _async_client_pid
+
+    if _async_client is not None and _async_client_pid == os.getpid():
+        await _async_client.close()
+    _async_client = None
+    _async_client_pid = None
+
+
+def close_llm_client():
+    """
+    Cierra el cliente compartido y libera sus conexiones
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def warmup_llm_client():
+    """
+    Abre por adelantado una conexión con el proveedor
+
+    Realiza una petición ligera (listado de modelos) para que el primer
+    turno de chat no pague el handshake TLS. Los errores solo se registran.
+    """
+    try:
+        get_llm_client().models.list()
+        logger.info("Conexión con el proveedor LLM precalentada")
+    except Exception as e:
+        logger.warning(f"No se pudo precalentar el cliente LLM: {str(e)}")
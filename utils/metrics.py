@@ -0,0 +1,252 @@
+"""
+Métricas Prometheus del servicio
+
+- Llamadas al LLM: latencia total, tiempo hasta el primer token (streaming),
+  tokens de prompt y de respuesta y coste estimado, por modelo, ruta (fast,
+  strong, summary), modo (sync, async, stream) y resultado (goal, reply,
+  parse_failure, error, cancelled).
+- Latencia de las peticiones HTTP por endpoint.
+- Contadores de la caché de respuestas y de la capa de resiliencia
+  (reintentos, hedging, circuit breaker).
+- Aciertos, fallos e invalidaciones de la caché de metas, por tipo de
+  lectura (detail, list).
+
+Con varios workers de gunicorn se debe definir PROMETHEUS_MULTIPROC_DIR
+(un directorio vacío al arrancar) para agregar las métricas de todos los
+procesos. En ese modo los contadores de la caché de respuestas y de la
+resiliencia no se exportan, ya que viven en memoria de cada worker (los de
+la caché de metas sí; su proporción de aciertos se calcula con rate()).
+"""
+import os
+import threading
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from utils.resilience import get_llm_policy
+from utils.response_cache import get_response_cache
+
+LLM_REQUESTS = Counter(
+    "llm_requests",
+    "Llamadas al LLM",
+    ["model", "route", "mode", "outcome"]
+)
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "Duración total de las llamadas al LLM (incluye reintentos)",
+    ["model", "route", "mode", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60, 120)
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Tiempo hasta el primer fragmento de la respuesta en streaming",
+    ["model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 30)
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens",
+    "Tokens de prompt por llamada",
+    ["model"],
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000)
+)
+LLM_COMPLETION_TOKENS = Histogram(
+    "llm_completion_tokens",
+    "Tokens generados por llamada",
+    ["model"],
+    buckets=(25, 50, 100, 200, 400, 800, 1500, 3000)
+)
+LLM_COST = Counter(
+    "llm_cost_usd",
+    "Coste estimado de las llamadas al LLM en USD",
+    ["model", "route"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP por endpoint",
+    ["endpoint", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+GOAL_CACHE_LOOKUPS = Counter(
+    "goal_cache_lookups",
+    "Lecturas de la caché de metas",
+    ["kind", "result"]
+)
+GOAL_CACHE_INVALIDATIONS = Counter(
+    "goal_cache_invalidations",
+    "Invalidaciones de la caché de metas de un usuario al guardar una meta"
+)
+
+# Aciertos y lecturas de la caché de metas del proceso, por tipo
+_goal_cache_stats = {}
+_goal_cache_lock = threading.Lock()
+
+# Valor numérico de cada estado del circuit breaker
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class LLMCall:
+    """
+    Registra las métricas de una llamada al LLM
+
+    Uso:
+        with LLMCall(model, "sync", route) as call:
+            response = ...
+            call.record_usage(response.usage)
+            call.outcome = "goal"
+
+    route es un objeto con name y cost(usage) (ver routing.Route) o None.
+
+    Si el bloque lanza una excepción el resultado es "error" (o "cancelled"
+    si el cliente cerró el stream).
+    """
+
+    def __init__(self, model, mode, route=None):
+        self.model = model
+        self.mode = mode
+        self.route = route
+        self.route_name = route.name if route is not None else "default"
+        self.outcome = "reply"
+        self._started = None
+        self._first_token = False
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is GeneratorExit:
+            self.outcome = "cancelled"
+        elif exc_type is not None:
+            self.outcome = "error"
+        LLM_REQUESTS.labels(self.model, self.route_name, self.mode, self.outcome).inc()
+        LLM_LATENCY.labels(self.model, self.route_name, self.mode, self.outcome).observe(
+            time.perf_counter() - self._started
+        )
+        return False
+
+    def first_token(self):
+        """Registra la llegada del primer fragmento del stream"""
+        if not self._first_token:
+            self._first_token = True
+            LLM_TIME_TO_FIRST_TOKEN.labels(self.model).observe(time.perf_counter() - self._started)
+
+    def record_usage(self, usage):
+        """
+        Registra el consumo de tokens
+
+        Args:
+            usage: response.usage del SDK (puede ser None)
+        """
+        if usage is None:
+            return
+        if usage.prompt_tokens is not None:
+            LLM_PROMPT_TOKENS.labels(self.model).observe(usage.prompt_tokens)
+        if usage.completion_tokens is not None:
+            LLM_COMPLETION_TOKENS.labels(self.model).observe(usage.completion_tokens)
+        if self.route is not None:
+            LLM_COST.labels(self.model, self.route_name).inc(self.route.cost(usage))
+
+
+def observe_http_request(endpoint, method, status, seconds):
+    """Registra la duración de una petición HTTP"""
+    HTTP_LATENCY.labels(endpoint or "unmatched", method, str(status)).observe(seconds)
+
+
+def observe_goal_cache_lookup(kind, hit):
+    """
+    Registra una lectura de la caché de metas
+
+    Args:
+        kind (str): Tipo de lectura (detail, list)
+        hit (bool): El valor estaba en caché
+    """
+    GOAL_CACHE_LOOKUPS.labels(kind, "hit" if hit else "miss").inc()
+    with _goal_cache_lock:
+        stats = _goal_cache_stats.setdefault(kind, [0, 0])
+        stats[0] += hit
+        stats[1] += 1
+
+
+def observe_goal_cache_invalidation():
+    """Registra la invalidación de las metas de un usuario"""
+    GOAL_CACHE_INVALIDATIONS.inc()
+
+
+class StatsCollector:
+    """Exporta los contadores de las cachés y de la resiliencia"""
+
+    def collect(self):
+        cache = get_response_cache()
+        if cache is not None:
+            stats = cache.stats()
+            for name in ("hits", "misses", "evictions", "expirations"):
+                yield CounterMetricFamily(
+                    f"llm_response_cache_{name}",
+                    f"Caché de respuestas del LLM: {name}",
+                    value=stats[name]
+                )
+            yield GaugeMetricFamily(
+                "llm_response_cache_hit_ratio",
+                "Proporción de aciertos de la caché de respuestas",
+                value=stats["hit_ratio"]
+            )
+
+        with _goal_cache_lock:
+            goal_stats = {kind: list(stats) for kind, stats in _goal_cache_stats.items()}
+        if goal_stats:
+            ratio = GaugeMetricFamily(
+                "goal_cache_hit_ratio",
+                "Proporción de aciertos de la caché de metas",
+                labels=["kind"]
+            )
+            for kind, (hits, lookups) in sorted(goal_stats.items()):
+                ratio.add_metric([kind], hits / lookups if lookups else 0.0)
+            yield ratio
+
+        stats = get_llm_policy().stats()
+        for name in ("calls", "attempts", "retries", "timeouts", "errors", "hedges", "hedge_wins"):
+            yield CounterMetricFamily(
+                f"llm_resilience_{name}",
+                f"Capa de resiliencia del LLM: {name}",
+                value=stats[name]
+            )
+        breaker = stats["breaker"]
+        yield GaugeMetricFamily(
+            "llm_circuit_breaker_state",
+            "Estado del circuit breaker (0 closed, 1 half_open, 2 open)",
+            value=_BREAKER_STATES[breaker["state"]]
+        )
+        for name in ("opened", "rejected"):
+            yield CounterMetricFamily(
+                f"llm_circuit_breaker_{name}",
+                f"Circuit breaker del LLM: {name}",
+                value=breaker[name]
+            )
+
+
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    REGISTRY.register(StatsCollector())
+
+
+def render_metrics():
+    """
+    Serializa las métricas en formato de texto de Prometheus
+
+    Returns:
+        tuple: (payload, content_type)
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,72 @@
+"""
+Paginación por cursor (keyset)
+
+En lugar de saltar (skip) los documentos de las páginas anteriores, cada
+página continúa desde la clave de orden del último documento devuelto, de
+modo que el coste de una página no depende de su profundidad. El cursor
+que recibe el cliente es opaco: codifica esa clave en base64.
+"""
+import base64
+
+from bson import json_util
+from bson.errors import BSONError
+
+
+def encode_cursor(values):
+    """
+    Codifica la clave de orden del último documento de una página
+
+    Args:
+        values (list): Valores de los campos de orden (admite ObjectId y datetime)
+
+    Returns:
+        str: Cursor opaco
+    """
+    payload = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """
+    Decodifica un cursor generado por encode_cursor
+
+    Args:
+        cursor (str): Cursor recibido del cliente
+        size (int): Número de campos de orden esperados
+
+    Returns:
+        list: Valores de los campos de orden
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError, BSONError) as e:
+        raise ValueError("Cursor inválido") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Cursor inválido")
+    return values
+
+
+def keyset_filter(sort, values):
+    """
+    Construye el filtro de los documentos posteriores a un cursor
+
+    Para un orden (a desc, b desc) y la clave (x, y) del último documento:
+    {$or: [{a: {$lt: x}}, {a: x, b: {$lt: y}}]}
+
+    Args:
+        sort (list): Campos de orden [(campo, 1 | -1), ...]; el último debe ser único
+        values (list): Clave de orden del último documento devuelto
+
+    Returns:
+        dict: Filtro de MongoDB
+    """
+    clauses = []
+    for position, (field, direction) in enumerate(sort):
+        clause = {previous: values[index] for index, (previous, _) in enumerate(sort[:position])}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[position]}
+        clauses.append(clause)
+    return {"$or": clauses}
@@ -1,12 +1,16 @@
 """
 Prompt templates for the OpenAI API
+
+The system prompts are static so that every request shares the same prefix
+and can hit the provider-side prompt cache. Volatile data such as the
+current date goes into a small message right before the user message
+(see render_date_context).
 """
+from functools import lru_cache
 
 SYSTEM_PROMPT = """
 Eres un asistente financiero especializado en ayudar a los usuarios a establecer metas financieras claras y específicas. Tu objetivo es guiar al usuario a través de una conversación natural para obtener toda la información necesaria para crear una meta financiera completa.
 
-IMPORTANTE: Hoy es {{CURRENT_DATE}}. Usa esta fecha como referencia.
-
 INSTRUCCIONES:
 1. Inicia la conversación presentándote y preguntando al usuario qué meta financiera quiere establecer.
 2. Guía la conversación para obtener la siguiente información:
@@ -43,6 +47,49 @@ Recuerda mantener una conversación amigable y natural, evitando sonar robótico
 """
 
 
+# Variante para AGENT_GOAL_MODE=tool: la meta se registra con una llamada a
+# función, así que el prompt no necesita reglas de formato del JSON
+SYSTEM_PROMPT_TOOLS = """
+Eres un asistente financiero especializado en ayudar a los usuarios a establecer metas financieras claras y específicas. Tu objetivo es guiar al usuario a través de una conversación natural para obtener toda la información necesaria para crear una meta financiera completa.
+
+INSTRUCCIONES:
+1. Inicia la conversación presentándote y preguntando al usuario qué meta financiera quiere establecer.
+2. Guía la conversación para obtener: nombre de la meta, valor objetivo, tiempo/plazo, descripción y, si es posible, una categoría (ahorro, inversión, deuda, vivienda, educación, viaje, etc.).
+3. Haz las preguntas de forma natural y fluida, no todas a la vez.
+4. Cuando tengas toda la información, o cuando el usuario confirme que está correcta ("gracias", "eso es todo", "confirmo", etc.), llama a la función registrar_meta_financiera con los datos de la meta. Nunca omitas esta llamada cuando el usuario confirme.
+
+Recuerda mantener una conversación amigable y natural, evitando sonar robótico o como si estuvieras siguiendo un guión.
+"""
+
+
+GOAL_INVALID_PROMPT = """
+Me faltan algunos datos para registrar tu meta financiera. ¿Podrías confirmarme el nombre, el valor objetivo, el plazo y una breve descripción?
+"""
+
+
+DATE_CONTEXT_PROMPT = "IMPORTANTE: Hoy es {current_date}. Usa esta fecha como referencia."
+
+
+CONVERSATION_SUMMARY_PROMPT = """
+Resumen de la parte anterior de esta conversación (los mensajes originales ya no se incluyen):
+
+{summary}
+"""
+
+
+SUMMARY_UPDATE_PROMPT = """
+Mantienes un resumen breve de una conversación entre un usuario y un asistente financiero que le ayuda a definir una meta financiera.
+
+Resumen actual:
+{summary}
+
+Nuevos mensajes a incorporar:
+{messages}
+
+Escribe el resumen actualizado en español, en un máximo de 10 líneas. Conserva todos los datos concretos de la meta (nombre, valor, plazo, descripción, categoría), las decisiones y correcciones del usuario y las preguntas pendientes. No agregues información que no esté en la conversación. Responde solo con el resumen.
+"""
+
+
 USER_CONFIRM_GOAL_PROMPT = """
 He recopilado la siguiente información sobre tu meta financiera:
 
@@ -85,4 +132,33 @@ Aquí hay algunas categorías populares para metas financieras:
 - Salud: Para gastos médicos o bienestar
 
 ¿Cuál de estas categorías se ajusta mejor a tu meta?
-"""
\ No newline at end of file
+"""
+
+
+@lru_cache(maxsize=None)
+def render_system_prompt(goal_mode="text"):
+    """
+    Render the static system prompt (once per process and mode)
+
+    Args:
+        goal_mode (str): 'text' or 'tool' (see AGENT_GOAL_MODE)
+
+    Returns:
+        str: System prompt
+    """
+    prompt = SYSTEM_PROMPT_TOOLS if goal_mode == "tool" else SYSTEM_PROMPT
+    return prompt.strip()
+
+
+@lru_cache(maxsize=4)
+def render_date_context(current_date):
+    """
+    Render the trailing date message (memoized per day)
+
+    Args:
+        current_date (str): Date formatted as dd/mm/YYYY
+
+    Returns:
+        str: Date context message
+    """
+    return DATE_CONTEXT_PROMPT.format(current_date=current_date)
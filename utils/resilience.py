@@ -0,0 +1,454 @@
+"""
+Capa de resiliencia para las llamadas al LLM
+
+- Deadline por intento (timeout de la petición HTTP).
+- Reintentos con backoff exponencial y jitter para errores transitorios.
+- Hedging opcional: si un intento tarda más que el percentil configurado de
+  las latencias recientes del mismo tipo de llamada (latency_key: ruta y
+  tipo, p. ej. "strong:completion"), se lanza una segunda petición y gana la
+  primera que responde.
+- Circuit breaker: tras varios fallos seguidos deja de llamar al proveedor
+  durante un tiempo y falla de inmediato.
+
+Cada pieza expone contadores a través de stats().
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+from config.settings import (
+    LLM_ATTEMPT_TIMEOUT,
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_MAX_WORKERS,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RECOVERY_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# Errores del proveedor que vale la pena reintentar
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError
+)
+
+
+class CircuitOpenError(Exception):
+    """El circuit breaker está abierto: el proveedor se considera no disponible"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados (closed, open, half_open)
+
+    Tras failure_threshold fallos consecutivos pasa a open y rechaza las
+    llamadas durante recovery_timeout segundos; después deja pasar una
+    llamada de prueba (half_open) que decide si vuelve a closed u open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def state(self):
+        """Estado actual del breaker"""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self):
+        """
+        Comprueba si se puede realizar una llamada
+
+        Raises:
+            CircuitOpenError: Si el breaker está abierto
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError("El proveedor LLM no está disponible temporalmente")
+
+    def record_success(self):
+        """Registra una llamada correcta"""
+        with self._lock:
+            self.successes += 1
+            self._consecutive_failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """
+        Libera la llamada de prueba sin decidir el estado
+
+        Se usa cuando la llamada termina con un error que no indica si el
+        proveedor está disponible (p. ej. una petición inválida o una
+        cancelación); la siguiente llamada hará de prueba.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Registra un fallo del proveedor"""
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.opened += 1
+                    logger.warning("Circuit breaker del LLM abierto")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self):
+        """
+        Returns:
+            dict: Estado y contadores del breaker
+        """
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "successes": self.successes,
+                "failures": self.failures
+            }
+
+
+class LatencyTracker:
+    """Ventana de latencias recientes para calcular percentiles"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        """Registra una latencia"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent, min_samples=1):
+        """
+        Calcula un percentil de la ventana
+
+        Args:
+            percent (float): Percentil (0-100)
+            min_samples (int): Muestras mínimas para devolver un valor
+
+        Returns:
+            float: Latencia en segundos, o None si no hay suficientes muestras
+        """
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+
+class ResiliencePolicy:
+    """
+    Ejecuta una llamada al LLM con deadline, reintentos, hedging y circuit breaker
+
+    La función recibida acepta el timeout del intento y realiza una única
+    petición (sin reintentos propios del cliente). Las latencias se guardan
+    por latency_key: mezclar completions de rutas distintas con aperturas de
+    stream (que solo miden hasta las cabeceras) falsearía el retraso del
+    hedging.
+    """
+
+    def __init__(self, attempt_timeout=30, attempts=3, base_delay=0.5, max_delay=4,
+                 hedge_enabled=False, hedge_percentile=95, hedge_min_delay=1.0,
+                 hedge_min_samples=20, hedge_max_workers=8, breaker=None):
+        self.attempt_timeout = attempt_timeout
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_workers = hedge_max_workers
+        self.breaker = breaker or CircuitBreaker()
+        # latency_key -> LatencyTracker
+        self.latencies = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts_made = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def call(self, func, hedge=True, latency_key="default"):
+        """
+        Ejecuta func con la política de resiliencia
+
+        Args:
+            func (callable): func(timeout) -> resultado
+            hedge (bool): Permite hedging para esta llamada
+            latency_key (str): Tipo de llamada cuyas latencias se comparan
+
+        Returns:
+            Resultado de func
+        """
+        self._count("calls")
+        latencies = self._latencies(latency_key)
+        for attempt in range(1, self.attempts + 1):
+            self.breaker.allow()
+            try:
+                if hedge and self.hedge_enabled:
+                    result = self._hedged_attempt(func, latencies)
+                else:
+                    result = self._timed_attempt(func, latencies)
+                self.breaker.record_success()
+                return result
+            except RETRYABLE_ERRORS as e:
+                self._record_error(e)
+                if attempt == self.attempts:
+                    raise
+                self._count("retries")
+                delay = self._backoff(attempt)
+                logger.warning(f"Reintentando llamada al LLM en {delay:.2f}s ({type(e).__name__})")
+                time.sleep(delay)
+            except BaseException:
+                # Error no reintentable: no debe dejar el breaker sin prueba
+                self.breaker.release_probe()
+                raise
+
+    async def call_async(self, func, latency_key="default"):
+        """
+        Variante asíncrona de call
+
+        Args:
+            func (callable): func(timeout) -> corrutina con el resultado
+            latency_key (str): Tipo de llamada cuyas latencias se comparan
+
+        Returns:
+            Resultado de func
+        """
+        self._count("calls")
+        latencies = self._latencies(latency_key)
+        for attempt in range(1, self.attempts + 1):
+            self.breaker.allow()
+            try:
+                if self.hedge_enabled:
+                    result = await self._hedged_attempt_async(func, latencies)
+                else:
+                    result = await self._timed_attempt_async(func, latencies)
+                self.breaker.record_success()
+                return result
+            except RETRYABLE_ERRORS as e:
+                self._record_error(e)
+                if attempt == self.attempts:
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self._backoff(attempt))
+            except BaseException:
+                # Incluye la cancelación de la tarea (CancelledError)
+                self.breaker.release_probe()
+                raise
+
+    def stats(self):
+        """
+        Returns:
+            dict: Contadores de la política y del circuit breaker
+        """
+        with self._lock:
+            counters = {
+                "calls": self.calls,
+                "attempts": self.attempts_made,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins
+            }
+            trackers = dict(self.latencies)
+        counters["breaker"] = self.breaker.stats()
+        counters["latency_p95"] = {
+            key: tracker.percentile(95) for key, tracker in sorted(trackers.items())
+        }
+        return counters
+
+    def _latencies(self, latency_key):
+        """Ventana de latencias de un tipo de llamada"""
+        with self._lock:
+            tracker = self.latencies.get(latency_key)
+            if tracker is None:
+                tracker = self.latencies[latency_key] = LatencyTracker()
+            return tracker
+
+    def _timed_attempt(self, func, latencies):
+        self._count("attempts_made")
+        started = time.monotonic()
+        result = func(self.attempt_timeout)
+        latencies.add(time.monotonic() - started)
+        return result
+
+    async def _timed_attempt_async(self, func, latencies):
+        self._count("attempts_made")
+        started = time.monotonic()
+        result = await func(self.attempt_timeout)
+        latencies.add(time.monotonic() - started)
+        return result
+
+    def _hedge_delay(self, latencies):
+        """Espera antes de lanzar la petición de respaldo"""
+        delay = latencies.percentile(self.hedge_percentile, self.hedge_min_samples)
+        if delay is None:
+            return None
+        return max(self.hedge_min_delay, delay)
+
+    def _hedged_attempt(self, func, latencies):
+        delay = self._hedge_delay(latencies)
+        if delay is None:
+            return self._timed_attempt(func, latencies)
+
+        executor = self._get_executor()
+        primary = executor.submit(self._timed_attempt, func, latencies)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        backup = executor.submit(self._timed_attempt, func, latencies)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _hedged_attempt_async(self, func, latencies):
+        delay = self._hedge_delay(latencies)
+        if delay is None:
+            return await self._timed_attempt_async(func, latencies)
+
+        primary = asyncio.ensure_future(self._timed_attempt_async(func, latencies))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        backup = asyncio.ensure_future(self._timed_attempt_async(func, latencies))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            self._count("hedge_wins")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _backoff(self, attempt):
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _record_error(self, error):
+        self.breaker.record_failure()
+        if isinstance(error, openai.APITimeoutError):
+            self._count("timeouts")
+        else:
+            self._count("errors")
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.hedge_max_workers,
+                        thread_name_prefix="llm-hedge"
+                    )
+        return self._executor
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_llm_policy():
+    """
+    Obtiene la política de resiliencia del proceso para las llamadas al LLM
+
+    Returns:
+        ResiliencePolicy: Política configurada desde settings
+    """
+    global _policy
+
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = ResiliencePolicy(
+                    attempt_timeout=LLM_ATTEMPT_TIMEOUT,
+                    attempts=LLM_RETRY_ATTEMPTS,
+                    base_delay=LLM_RETRY_BASE_DELAY,
+                    max_delay=LLM_RETRY_MAX_DELAY,
+                    hedge_enabled=LLM_HEDGE_ENABLED,
+                    hedge_percentile=LLM_HEDGE_PERCENTILE,
+                    hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+                    hedge_min_samples=LLM_HEDGE_MIN_SAMPLES,
+                    hedge_max_workers=LLM_HEDGE_MAX_WORKERS,
+                    breaker=CircuitBreaker(
+                        failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+                        recovery_timeout=LLM_BREAKER_RECOVERY_TIMEOUT
+                    )
+                )
+    return _policy
@@ -0,0 +1,121 @@
+"""
+Caché de respuestas del LLM por coincidencia exacta
+
+La clave es un hash del modelo, el prompt completo (system prompt renderizado
+e historial normalizado) y los parámetros de muestreo, de modo que solo se
+reutiliza una respuesta cuando la petición al proveedor sería idéntica.
+Con temperature > 0 reutilizar respuestas es una decisión de producto, por
+eso la caché está desactivada por defecto (LLM_RESPONSE_CACHE_ENABLED).
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+
+from config.settings import (
+    LLM_RESPONSE_CACHE_ENABLED,
+    LLM_RESPONSE_CACHE_BACKEND,
+    LLM_RESPONSE_CACHE_MAX_ENTRIES,
+    LLM_RESPONSE_CACHE_TTL
+)
+from utils.cache import create_cache_backend
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de la petición que forman parte de la clave
+_KEY_PARAMS = ("model", "temperature", "max_tokens", "top_p", "tools")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Obtiene la caché de respuestas del proceso
+
+    Returns:
+        CacheBackend: Caché configurada, o None si está desactivada
+    """
+    global _cache
+
+    if not LLM_RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache_backend(
+                    LLM_RESPONSE_CACHE_BACKEND,
+                    max_entries=LLM_RESPONSE_CACHE_MAX_ENTRIES,
+                    ttl=LLM_RESPONSE_CACHE_TTL
+                )
+    return _cache
+
+
+def _normalize_content(content):
+    """Normaliza espacios y mayúsculas de un mensaje"""
+    return " ".join((content or "").split()).casefold()
+
+
+def build_cache_key(params):
+    """
+    Calcula la clave de caché de una petición de chat completion
+
+    Args:
+        params (dict): Parámetros de client.chat.completions.create
+
+    Returns:
+        str: Hash SHA-256 de la petición normalizada
+    """
+    payload = {name: params.get(name) for name in _KEY_PARAMS}
+    payload["messages"] = [
+        [message.get("role"), _normalize_content(message.get("content"))]
+        for message in params.get("messages", [])
+    ]
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def get_cached_response(params):
+    """
+    Busca una respuesta en caché
+
+    Args:
+        params (dict): Parámetros de la petición
+
+    Returns:
+        tuple: (ai_response, is_goal_complete, financial_goal) o None
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return None
+
+    try:
+        cached = cache.get(build_cache_key(params))
+    except Exception as e:
+        # Un backend caído (p. ej. Redis) equivale a un fallo de caché
+        logger.warning(f"Caché de respuestas no disponible: {str(e)}")
+        return None
+    if cached is None:
+        return None
+
+    logger.info("Respuesta obtenida de la caché de respuestas")
+    # La meta se modifica al guardarla; devolver una copia
+    return copy.deepcopy(cached)
+
+
+def store_response(params, result):
+    """
+    Guarda una respuesta en caché
+
+    Args:
+        params (dict): Parámetros de la petición
+        result (tuple): (ai_response, is_goal_complete, financial_goal)
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(build_cache_key(params), copy.deepcopy(result))
+    except Exception as e:
+        logger.warning(f"No se pudo guardar en la caché de respuestas: {str(e)}")
@@ -0,0 +1,33 @@
+"""
+Helpers para respuestas Server-Sent Events (SSE)
+"""
+import json
+
+
+def format_sse_event(event, data):
+    """
+    Serializa un evento en formato SSE
+
+    Args:
+        event (str): Nombre del evento
+        data (dict): Datos del evento (se serializan como JSON)
+
+    Returns:
+        str: Evento listo para escribir en el stream
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_stream(events):
+    """
+    Convierte un iterable de tuplas (event, data) en un stream SSE
+
+    Args:
+        events (iterable): Iterable de tuplas (event, data)
+
+    Yields:
+        str: Eventos serializados
+    """
+    for event, data in events:
+        yield format_sse_event(event, data)
@@ -0,0 +1,316 @@
+"""
+Colas de tareas en segundo plano con orden FIFO por clave
+
+Las tareas con la misma clave se ejecutan una detrás de otra en el orden
+en que se enviaron; las de claves distintas se reparten entre los hilos
+del pool. Cada tarea se reintenta con backoff exponencial si su handler
+lanza una excepción, por lo que los handlers deben ser idempotentes.
+
+- TaskQueue: pool de hilos en proceso. Las tareas pendientes se pierden si
+  el proceso muere.
+- OutboxQueue: persiste cada tarea en un outbox antes de encolarla y la
+  borra al completarse. Un hilo de barrido recupera las tareas de procesos
+  caídos o que agotaron sus reintentos (entrega al menos una vez), hasta
+  max_deliveries entregas; después quedan como muertas en el outbox.
+"""
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    """Tarea encolada"""
+
+    __slots__ = ("kind", "payload", "key", "task_id")
+
+    def __init__(self, kind, payload, key, task_id=None):
+        self.kind = kind
+        self.payload = payload
+        self.key = key
+        self.task_id = task_id
+
+
+class TaskQueue:
+    """Cola en proceso con orden FIFO por clave"""
+
+    def __init__(self, handlers=None, workers=4, max_attempts=5, retry_delay=0.5, name="tasks"):
+        self._handlers = dict(handlers or {})
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.name = name
+        # Clave -> tareas pendientes; la primera es la que se está ejecutando
+        self._pending = {}
+        self._ready = queue.Queue()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self.submitted = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, kind, handler):
+        """
+        Registra el handler de un tipo de tarea
+
+        Args:
+            kind (str): Tipo de tarea
+            handler (callable): handler(payload); debe ser idempotente
+        """
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload, key):
+        """
+        Encola una tarea
+
+        Args:
+            kind (str): Tipo de tarea registrado
+            payload (dict): Datos de la tarea
+            key (str): Clave de orden (las tareas de una clave no se solapan)
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de tarea desconocido: {kind}")
+        self._enqueue(Task(kind, payload, key))
+
+    def wait(self, key, timeout=None):
+        """
+        Espera a que no queden tareas pendientes de una clave
+
+        Args:
+            key (str): Clave
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            bool: True si la clave quedó libre
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: key not in self._pending, timeout)
+
+    def shutdown(self, timeout=None):
+        """
+        Espera a que se vacíe la cola y detiene los hilos
+
+        Args:
+            timeout (float): Segundos máximos de espera
+        """
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            drained = self._cond.wait_for(lambda: not self._pending, timeout)
+        if not drained:
+            logger.warning(f"Cola {self.name}: quedan tareas pendientes al cerrar")
+        for _ in self._threads:
+            self._ready.put(None)
+        self._threads = []
+        self._pid = None
+
+    def stats(self):
+        """
+        Returns:
+            dict: Contadores de la cola
+        """
+        with self._cond:
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "retried": self.retried,
+                "failed": self.failed,
+                "pending_keys": len(self._pending)
+            }
+
+    def _enqueue(self, task):
+        self._ensure_workers()
+        with self._cond:
+            self.submitted += 1
+            tasks = self._pending.get(task.key)
+            if tasks is None:
+                self._pending[task.key] = deque([task])
+                self._ready.put(task.key)
+            else:
+                tasks.append(task)
+
+    def _ensure_workers(self):
+        """Arranca los hilos; tras un fork se descarta el estado del padre"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._cond:
+            if self._pid == pid:
+                return
+            self._pending = {}
+            self._ready = queue.Queue()
+            self._threads = []
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"{self.name}-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._pid = pid
+            self._on_start()
+
+    def _work(self):
+        while True:
+            key = self._ready.get()
+            if key is None:
+                return
+            with self._cond:
+                task = self._pending[key][0]
+
+            try:
+                self._run(task)
+            except Exception as e:
+                logger.error(f"Cola {self.name}: error procesando la tarea {task.kind}: {str(e)}")
+
+            with self._cond:
+                tasks = self._pending[key]
+                tasks.popleft()
+                if tasks:
+                    self._ready.put(key)
+                else:
+                    del self._pending[key]
+                self._cond.notify_all()
+
+    def _run(self, task):
+        """Ejecuta una tarea con reintentos"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._handlers[task.kind](task.payload)
+            except Exception as e:
+                logger.error(f"Cola {self.name}: error en la tarea {task.kind} (intento {attempt}): {str(e)}")
+                if attempt < self.max_attempts:
+                    with self._cond:
+                        self.retried += 1
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            else:
+                with self._cond:
+                    self.completed += 1
+                self._on_success(task)
+                return
+
+        with self._cond:
+            self.failed += 1
+        self._on_failure(task)
+
+    def _on_start(self):
+        """Se llama al arrancar los hilos del proceso"""
+
+    def _on_success(self, task):
+        """Se llama cuando una tarea termina correctamente"""
+
+    def _on_failure(self, task):
+        """Se llama cuando una tarea agota sus reintentos"""
+        logger.error(f"Cola {self.name}: tarea {task.kind} descartada tras {self.max_attempts} intentos")
+
+
+class OutboxQueue(TaskQueue):
+    """
+    Cola con outbox persistente
+
+    store es un objeto con las operaciones del outbox (ver models/outbox.py):
+    add_task, complete_task, retry_task, claim_task y count_pending.
+
+    Una tarea que agota sus reintentos se aplaza en el outbox y deja de
+    bloquear su clave, así que solo conserva el orden respecto a las tareas
+    que se envíen después de recuperarla. Tras max_deliveries entregas
+    (incluidas las de procesos que murieron ejecutándola) se marca como
+    muerta: deja de reintentarse y de contar como pendiente en wait().
+    """
+
+    def __init__(self, store, handlers=None, lease=300, retry_after=60, sweep_interval=5,
+                 wait_poll_interval=0.05, max_deliveries=10, **options):
+        super().__init__(handlers=handlers, **options)
+        self.store = store
+        self.lease = lease
+        self.retry_after = retry_after
+        self.sweep_interval = sweep_interval
+        self.wait_poll_interval = wait_poll_interval
+        self.max_deliveries = max(1, max_deliveries)
+        self.owner = None
+        self.recovered = 0
+        self.dead = 0
+
+    def submit(self, kind, payload, key):
+        """Persiste la tarea en el outbox y la encola"""
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de tarea desconocido: {kind}")
+        self._ensure_workers()
+        task_id = self.store.add_task(kind, key, payload, self.owner, self.lease)
+        self._enqueue(Task(kind, payload, key, task_id))
+
+    def wait(self, key, timeout=None):
+        """
+        Espera a las tareas de la clave de este proceso y de los demás
+
+        Returns:
+            bool: True si la clave quedó libre
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not super().wait(key, timeout):
+            return False
+        while self.store.count_pending(key):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.wait_poll_interval)
+        return True
+
+    def stats(self):
+        counters = super().stats()
+        counters["recovered"] = self.recovered
+        counters["dead"] = self.dead
+        return counters
+
+    def _on_start(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        thread = threading.Thread(target=self._sweep, name=f"{self.name}-sweeper", daemon=True)
+        thread.start()
+
+    def _on_success(self, task):
+        self.store.complete_task(task.task_id)
+
+    def _on_failure(self, task):
+        # Queda en el outbox para que el barrido la reintente más tarde
+        if self.store.retry_task(task.task_id, self.retry_after, self.max_deliveries):
+            logger.error(f"Cola {self.name}: tarea {task.kind} aplazada tras {self.max_attempts} intentos")
+        else:
+            self._mark_dead(task)
+
+    def _mark_dead(self, task):
+        with self._cond:
+            self.dead += 1
+        logger.error(
+            f"Cola {self.name}: tarea {task.kind} ({task.task_id}) marcada como muerta "
+            f"tras {self.max_deliveries} entregas"
+        )
+
+    def _sweep(self):
+        """Recupera tareas abandonadas o aplazadas"""
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.sweep_interval)
+            try:
+                while True:
+                    document = self.store.claim_task(self.owner, self.lease)
+                    if document is None:
+                        break
+                    task = Task(document["kind"], document["payload"], document["key"], document["_id"])
+                    if document.get("attempts", 0) > self.max_deliveries:
+                        # Los procesos que la ejecutaban murieron (p. ej. sin memoria)
+                        self.store.dead_task(task.task_id)
+                        self._mark_dead(task)
+                        continue
+                    with self._cond:
+                        self.recovered += 1
+                    self._enqueue(task)
+            except Exception as e:
+                logger.error(f"Cola {self.name}: error recuperando tareas del outbox: {str(e)}")